@@ -0,0 +1,166 @@
+"""Shared in-memory cache with one byte budget for all segments.
+
+Each segment (dictionaries, definitions) keeps its own keys, but sizes are accounted
+together and eviction picks across segments with GreedyDual-Size: an entry's priority
+is the clock value at its last use plus cost / size, so large entries that are cheap
+to rebuild go first, and entries with equal cost per byte fall back to plain LRU.
+All operations run on the event loop thread.
+"""
+import heapq
+import itertools
+import sys
+
+from .config import CACHE_MEMORY_BUDGET_MB
+from .metrics import CACHE_EVICTIONS, register_collector
+
+
+def approx_size(value) -> int:
+    """Rough deep size of plain containers of strings and numbers, in bytes."""
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(approx_size(key) + approx_size(item) for key, item in value.items())
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "size", "cost", "priority", "stamp")
+
+    def __init__(self, value, size: int, cost: float):
+        self.value = value
+        self.size = size
+        self.cost = cost
+        self.priority = 0.0
+        self.stamp = 0
+
+
+class CacheSegment:
+    def __init__(self, manager: "CacheManager", name: str):
+        self.manager = manager
+        self.name = name
+        self._entries: dict = {}
+        self.nbytes = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def keys(self):
+        return list(self._entries)
+
+    def peek(self, key):
+        """Value without counting it as a use."""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self.manager._touch(self, key, entry)
+        return entry.value
+
+    def put(self, key, value, size: int | None = None, cost: float = 1.0) -> bool:
+        """Stores the value; False if it alone does not fit into the budget and was not cached."""
+        size = max(1, approx_size(key) + (approx_size(value) if size is None else size))
+        self.pop(key)
+        if size > self.manager.budget:
+            self.rejected += 1
+            return False
+        entry = _Entry(value, size, cost)
+        self._entries[key] = entry
+        self.nbytes += size
+        self.manager.used += size
+        self.manager._touch(self, key, entry)
+        self.manager._enforce_budget()
+        return key in self._entries
+
+    def update_size(self, key, size: int) -> None:
+        """Re-accounts an entry whose value grew in place; may evict it or others to fit the budget."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        size = max(1, approx_size(key) + size)
+        self.nbytes += size - entry.size
+        self.manager.used += size - entry.size
+        entry.size = size
+        self.manager._touch(self, key, entry)
+        self.manager._enforce_budget()
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self.nbytes -= entry.size
+        self.manager.used -= entry.size
+        return entry.value
+
+    def clear(self) -> None:
+        self.manager.used -= self.nbytes
+        self.nbytes = 0
+        self._entries.clear()
+
+
+class CacheManager:
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.used = 0
+        self.segments: dict[str, CacheSegment] = {}
+        self._clock = 0.0
+        # (priority, stamp, segment, key); устаревшие записи отбрасываются при извлечении
+        self._heap: list[tuple[float, int, CacheSegment, object]] = []
+        self._stamps = itertools.count()
+
+    def segment(self, name: str) -> CacheSegment:
+        segment = self.segments.get(name)
+        if segment is None:
+            segment = self.segments[name] = CacheSegment(self, name)
+        return segment
+
+    def _touch(self, segment: CacheSegment, key, entry: _Entry) -> None:
+        entry.priority = self._clock + entry.cost / entry.size
+        entry.stamp = next(self._stamps)
+        heapq.heappush(self._heap, (entry.priority, entry.stamp, segment, key))
+        if len(self._heap) > 2 * self._live_entries() + 64:
+            self._compact()
+
+    def _live_entries(self) -> int:
+        return sum(len(segment) for segment in self.segments.values())
+
+    def _compact(self) -> None:
+        self._heap = [
+            item for item in self._heap
+            if (entry := item[2]._entries.get(item[3])) is not None and entry.stamp == item[1]
+        ]
+        heapq.heapify(self._heap)
+
+    def _enforce_budget(self) -> None:
+        while self.used > self.budget and self._heap:
+            priority, stamp, segment, key = heapq.heappop(self._heap)
+            entry = segment._entries.get(key)
+            if entry is None or entry.stamp != stamp:
+                continue
+            # Часы GreedyDual: новые записи стартуют не ниже приоритета вытесненной
+            self._clock = priority
+            segment.pop(key)
+            segment.evictions += 1
+            CACHE_EVICTIONS.inc(cache=segment.name)
+
+    def metric_samples(self):
+        yield "alias_cache_budget_bytes", "gauge", "Memory budget shared by the in-memory caches", {}, self.budget
+        for name, segment in self.segments.items():
+            yield "alias_cache_bytes", "gauge", "Approximate bytes held by a cache", {"cache": name}, segment.nbytes
+            yield "alias_cache_entries", "gauge", "Entries held by a cache", {"cache": name}, len(segment)
+            yield "alias_cache_rejected_total", "counter", "Entries too large for the cache budget", {"cache": name}, segment.rejected
+
+
+cache_manager = CacheManager(int(CACHE_MEMORY_BUDGET_MB * 1024 * 1024))
+register_collector(cache_manager.metric_samples)
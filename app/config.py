@@ -8,13 +8,102 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN not found in .env file or environment!")
 
+# Свой сервер Bot API (например, локальный telegram-bot-api), по умолчанию api.telegram.org
+BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL", "")
+
+# Режим работы: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Сколько апдейтов обрабатывать параллельно (апдейты одного пользователя — всегда по порядку)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "16"))
+# Число процессов-воркеров: апдейты распределяются по ним по user_id (1 — всё в одном процессе)
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+# Номер воркера выставляет главный процесс; -1 — не воркер
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "-1"))
+
 # Пути к файлам и папкам
 DICT_PATH = os.getenv("DICT_PATH", "dictionaries/")
 USER_DATA_FILE = os.getenv("USER_DATA_FILE", "user_data.json")
+DATA_DIR = os.getenv("DATA_DIR", os.path.dirname(USER_DATA_FILE) or "data")
+DICT_INDEX_PATH = os.getenv("DICT_INDEX_PATH", os.path.join(DATA_DIR, "dict_index"))
+# Максимальный размер словаря, загружаемого через /dict_upload (МБ)
+DICT_UPLOAD_MAX_MB = float(os.getenv("DICT_UPLOAD_MAX_MB", "10"))
+# Как часто пересматривать папку словарей (секунды, 0 — только при загрузке и /addword)
+DICT_WATCH_INTERVAL = float(os.getenv("DICT_WATCH_INTERVAL", "5"))
+# Наборы из нескольких словарей с весами (JSON: {"название": {"словарь.txt": вес, ...}})
+DICT_MIXES_FILE = os.getenv("DICT_MIXES_FILE", os.path.join(DICT_PATH, "mixes.json"))
+
+# Хранилище состояния пользователей
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite").lower()
+STATE_DB_FILE = os.getenv("STATE_DB_FILE", os.path.join(DATA_DIR, "user_state.db"))
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "2.0"))
+# Общий Redis-совместимый сервер для STATE_BACKEND/DEFINITION_BACKEND=redis
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_PREFIX = os.getenv("REDIS_PREFIX", "alias:")
+# Как часто проверять, не поменяли ли словари другие воркеры (секунды, 0 — не проверять)
+CACHE_SYNC_INTERVAL = float(os.getenv("CACHE_SYNC_INTERVAL", "1.0"))
+# Сколько секунд воркер верит своей копии настроек пользователя, прежде чем перечитать её из хранилища
+USER_STATE_TTL = float(os.getenv("USER_STATE_TTL", "5.0"))
+
+# Кэш определений из Викисловаря (TTL в секундах): sqlite на диске или общий redis
+DEFINITION_BACKEND = os.getenv("DEFINITION_BACKEND", STATE_BACKEND).lower()
+DEFINITION_DB_FILE = os.getenv("DEFINITION_DB_FILE", os.path.join(DATA_DIR, "definitions.db"))
+DEFINITION_TTL = float(os.getenv("DEFINITION_TTL", str(30 * 24 * 3600)))
+DEFINITION_NEGATIVE_TTL = float(os.getenv("DEFINITION_NEGATIVE_TTL", str(24 * 3600)))
+# Офлайн-индекс определений, собранный из дампа Викисловаря (python -m app.offline_index)
+OFFLINE_DEFINITIONS_FILE = os.getenv("OFFLINE_DEFINITIONS_FILE", os.path.join(DATA_DIR, "offline_definitions.idx"))
+
+# Общий бюджет памяти кэшей словарей и определений (МиБ); лимит контейнера в docker-compose.yml — 256M
+CACHE_MEMORY_BUDGET_MB = float(os.getenv("CACHE_MEMORY_BUDGET_MB", "64"))
 
 # Настройки поведения
 DEFAULT_LANG = os.getenv("DEFAULT_LANG", "ru")
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# deck — слова без повторов, пока колода не кончится; random — независимый случайный выбор
+WORD_DRAW_MODE = os.getenv("WORD_DRAW_MODE", "deck").lower()
+
+# Пул HTTP-соединений для запросов к Викисловарю
+HTTP_MAX_CONCURRENCY = int(os.getenv("HTTP_MAX_CONCURRENCY", "16"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "8"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# Защита запросов к Викисловарю: после скольких сбоев подряд хост пропускается и на сколько секунд,
+# дублировать ли запрос, который отвечает дольше p95
+WIKTIONARY_BREAKER_FAILURES = int(os.getenv("WIKTIONARY_BREAKER_FAILURES", "5"))
+WIKTIONARY_BREAKER_COOLDOWN = float(os.getenv("WIKTIONARY_BREAKER_COOLDOWN", "30"))
+WIKTIONARY_HEDGE = os.getenv("WIKTIONARY_HEDGE", "1").lower() not in ("0", "false", "no", "off")
+
+# Инлайн-режим (@bot в чатах): сколько слов в ответе и сколько секунд помнить ответ на запрос
+INLINE_RESULTS = min(50, int(os.getenv("INLINE_RESULTS", "20")))
+INLINE_CACHE_TTL = float(os.getenv("INLINE_CACHE_TTL", "30"))
+
+# Предзагрузка определений для следующих слов пользователя
+PREFETCH_MAX_DEPTH = int(os.getenv("PREFETCH_MAX_DEPTH", "5"))
+PREFETCH_HORIZON = float(os.getenv("PREFETCH_HORIZON", "30"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+PREFETCH_QUEUE_SIZE = int(os.getenv("PREFETCH_QUEUE_SIZE", "100"))
+
+# Фоновые правки сообщений с определениями
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "4"))
+BACKGROUND_QUEUE_SIZE = int(os.getenv("BACKGROUND_QUEUE_SIZE", "200"))
+
+# Ограничение исходящих запросов к Bot API
+RATE_LIMIT_OVERALL = float(os.getenv("RATE_LIMIT_OVERALL", "30"))
+RATE_LIMIT_PRIVATE_PER_SECOND = float(os.getenv("RATE_LIMIT_PRIVATE_PER_SECOND", "1"))
+RATE_LIMIT_GROUP_PER_MINUTE = float(os.getenv("RATE_LIMIT_GROUP_PER_MINUTE", "20"))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "2"))
+
+# Эндпоинт метрик в формате Prometheus (0 — выключен); у воркеров порт METRICS_PORT + номер воркера
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Профилирование по команде /profile: максимальная длительность и порог «медленного» колбэка (секунды)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+SLOW_CALLBACK_THRESHOLD = float(os.getenv("SLOW_CALLBACK_THRESHOLD", "0.1"))
 
 # Список ID админов
 admin_ids_str = os.getenv("ADMIN_IDS", "")
@@ -25,6 +114,8 @@ logging.basicConfig(
     level=getattr(logging, LOG_LEVEL, logging.INFO)
 )
 logger = logging.getLogger(__name__)
+# httpx пишет каждый запрос на INFO — для пула к Викисловарю это слишком шумно
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 def is_admin(user_id: int) -> bool:
     if not ADMIN_IDS:
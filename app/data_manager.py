@@ -1,89 +1,212 @@
 import os
-import json
+import time
 import asyncio
 import random
-from collections import OrderedDict
-import aiofiles
-from .config import USER_DATA_FILE, DICT_PATH, logger
+from collections import OrderedDict, deque
+from .config import (USER_DATA_FILE, DICT_PATH, DICT_INDEX_PATH, STATE_BACKEND, STATE_DB_FILE,
+                     STATE_FLUSH_INTERVAL, WORD_DRAW_MODE, REDIS_URL, REDIS_PREFIX, BOT_WORKERS,
+                     WORKER_INDEX, CACHE_SYNC_INTERVAL, USER_STATE_TTL, logger)
+from .deck import new_deck_seed, permute, derive_seed, uniform
+from .dict_index import DictionaryIndex, load_index
+from .dict_ingest import normalize_word, dedupe_key
+from .word_filter import WordBuckets
+from .cache import cache_manager
+from . import dict_registry
+from .mixes import AliasTable, Mix, is_mix, get_mix, mixes_with
+from .metrics import CACHE_HITS, CACHE_MISSES, SAVE_DURATION, SAVED_USERS, register_collector
+from .storage import create_user_state_backend, import_legacy_json
 
-# Кэш для слов
-MAX_WORDS_CACHE_SIZE = 20
-WORDS_CACHE: OrderedDict[str, list[str]] = OrderedDict()
+# Кэш словарей: filename -> DictionaryIndex, в общем бюджете памяти с определениями
+WORDS_CACHE = cache_manager.segment("words")
 _save_lock = asyncio.Lock()
 _words_cache_lock = asyncio.Lock()
+_append_lock = asyncio.Lock()
 
+# Состояние пользователей: в памяти, на диск пишем через write-behind
+user_language: dict[int, str] = {}
+user_selected_dict: dict[int, str] = {}
+user_deck: dict[int, list[int]] = {}  # [seed, position]; для набора словарей см. _mix_deck
+user_word_filter: dict[int, list] = {}  # [минимум букв, максимум букв или 0, только одиночные слова]
+USER_FIELDS: dict[str, dict] = {
+    "language": user_language,
+    "selected_dict": user_selected_dict,
+    "deck": user_deck,
+    "word_filter": user_word_filter,
+}
+_state_backend = create_user_state_backend(STATE_BACKEND, STATE_DB_FILE, REDIS_URL, REDIS_PREFIX)
+_dirty_users: set[int] = set()
+# Пользователи, чья запись в хранилище ещё идёт: перечитывать их оттуда рано
+_flushing_users: set[int] = set()
+# Когда настройки пользователя последний раз читали из хранилища (только при нескольких воркерах)
+_state_loaded_at: OrderedDict[int, float] = OrderedDict()
+# Через сколько секунд без апдейтов чужой пользователь выгружается из памяти воркера
+IDLE_USER_EVICTION = 600.0
+_flush_handle: asyncio.TimerHandle | None = None
+_flush_tasks: set[asyncio.Task] = set()
+# Заранее вытянутые слова в режиме random: user_id -> (словарь, очередь слов)
+_upcoming_words: dict[int, tuple[str, deque]] = {}
+# Версии общих данных, которые видел этот процесс, и фоновая сверка с хранилищем
+_known_versions: dict[str, int] = {}
+# (набор, фильтр) -> (версии словарей набора, таблица выбора словаря с учётом фильтра)
+_filtered_mix_tables: dict[tuple[str, tuple], tuple[tuple, AliasTable | None]] = {}
+_cache_sync_task: asyncio.Task | None = None
 
-async def _cache_words(filename: str, words: list[str]) -> list[str]:
+
+async def _cache_words(filename: str, words: DictionaryIndex, load_seconds: float) -> DictionaryIndex:
     async with _words_cache_lock:
         cached_words = WORDS_CACHE.get(filename)
-        if cached_words is not None:
-            WORDS_CACHE.move_to_end(filename)
+        if cached_words is not None and cached_words.source_mtime_ns == words.source_mtime_ns:
             return cached_words
 
-        WORDS_CACHE[filename] = words
-        while len(WORDS_CACHE) > MAX_WORDS_CACHE_SIZE:
-            WORDS_CACHE.popitem(last=False)
+        # Цена записи — сколько стоило её загрузить: дешёвые в пересборке словари вытесняются первыми
+        WORDS_CACHE.put(filename, words, size=words.nbytes, cost=load_seconds)
         return words
 
+def owns_user(user_id: int) -> bool:
+    # Домашний воркер пользователя — тот, куда приходит его личный чат (id чата = user_id)
+    return WORKER_INDEX < 0 or user_id % BOT_WORKERS == WORKER_INDEX
+
+def _apply_user_state(user_id: int, state: dict) -> None:
+    for field, values in USER_FIELDS.items():
+        if field in state:
+            values[user_id] = state[field]
+        else:
+            values.pop(user_id, None)
+
 def load_data():
-    try:
-        if not os.path.exists(USER_DATA_FILE):
-            # Если файла нет вообще, возвращаем пустые данные
-            return {}, {}
-        with open(USER_DATA_FILE, 'r') as f:
-            data = json.load(f)
-            # Приведение ключей (ID пользователей) к int
-            user_language = {int(k): v for k, v in data.get("user_language", {}).items()}
-            user_selected_dict = {int(k): v for k, v in data.get("user_selected_dict", {}).items()}
-            return user_language, user_selected_dict
-    except (FileNotFoundError, json.JSONDecodeError, IsADirectoryError):
-        # Если это папка (ошибка докера) или файл пуст/отсутствует
-        logger.warning(f"Data file {USER_DATA_FILE} is missing, empty, or a directory. Starting fresh.")
-        return {}, {}
-
-async def save_data(lang_data, dict_data):
+    if WORKER_INDEX <= 0:
+        import_legacy_json(_state_backend, USER_DATA_FILE)
+    # Заранее поднимаем только своих пользователей; остальных читаем из хранилища по первому апдейту
+    for user_id, state in _state_backend.load_all().items():
+        if owns_user(user_id):
+            _apply_user_state(user_id, state)
+
+async def refresh_user_state(user_id: int) -> None:
+    """With several workers, re-reads the user's state from the backend once USER_STATE_TTL has passed.
+
+    The user's group chats can be served by other workers, which write their changes
+    back through the backend, so no worker trusts its copy for longer than the TTL.
+    Users this worker does not own are dropped from memory after a while without updates.
+    """
+    if WORKER_INDEX < 0:
+        return
+    now = time.monotonic()
+    loaded_at = _state_loaded_at.get(user_id)
+    # Несохранённые изменения новее того, что лежит в хранилище, — их не перетираем
+    if (loaded_at is not None and now - loaded_at < USER_STATE_TTL) or user_id in _dirty_users | _flushing_users:
+        return
+    state = await asyncio.to_thread(_state_backend.load_user, user_id)
+    if user_id in _dirty_users | _flushing_users:
+        return
+    _apply_user_state(user_id, state or {})
+    _state_loaded_at[user_id] = now
+    _state_loaded_at.move_to_end(user_id)
+    _evict_idle_users(now)
+
+def _evict_idle_users(now: float) -> None:
+    while _state_loaded_at:
+        user_id, loaded_at = next(iter(_state_loaded_at.items()))
+        if now - loaded_at < IDLE_USER_EVICTION:
+            break
+        del _state_loaded_at[user_id]
+        if not owns_user(user_id) and user_id not in _dirty_users | _flushing_users:
+            _apply_user_state(user_id, {})
+            _upcoming_words.pop(user_id, None)
+
+
+def _snapshot_user(user_id: int) -> dict:
+    return {field: values[user_id] for field, values in USER_FIELDS.items() if user_id in values}
+
+
+def save_user(user_id: int) -> None:
+    # Пишем только изменённых пользователей, пачкой по таймеру
+    global _flush_handle
+    _dirty_users.add(user_id)
+    if _flush_handle is None:
+        _flush_handle = asyncio.get_running_loop().call_later(STATE_FLUSH_INTERVAL, _schedule_flush)
+
+
+def _schedule_flush() -> None:
+    global _flush_handle
+    _flush_handle = None
+    task = asyncio.create_task(save_data())
+    _flush_tasks.add(task)
+    task.add_done_callback(_on_flush_done)
+
+
+def _on_flush_done(task: asyncio.Task) -> None:
+    _flush_tasks.discard(task)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        logger.error(f"Failed to save user data: {task.exception()}")
+
+
+async def save_data():
     async with _save_lock:
-        # Если вдруг на хосте папка с таким именем (косяк докера)
-        if os.path.isdir(USER_DATA_FILE):
-            logger.error(f"FATAL: {USER_DATA_FILE} is a directory! Data NOT saved. Please delete the directory on host.")
+        if not _dirty_users:
             return
+        user_ids = list(_dirty_users)
+        _dirty_users.clear()
+        _flushing_users.update(user_ids)
+        rows = {user_id: _snapshot_user(user_id) for user_id in user_ids}
+        try:
+            with SAVE_DURATION.time():
+                await asyncio.to_thread(_state_backend.write_users, rows)
+            SAVED_USERS.inc(len(rows))
+        except Exception:
+            # Вернём пользователей в очередь, чтобы не потерять изменения
+            _dirty_users.update(user_ids)
+            raise
+        finally:
+            _flushing_users.difference_update(user_ids)
 
-        # Создаем копии для потокобезопасности
-        lang_copy = {str(k): v for k, v in lang_data.items()}
-        dict_copy = {str(k): v for k, v in dict_data.items()}
-        
-        def _save():
-            directory = os.path.dirname(os.path.abspath(USER_DATA_FILE))
-            if directory:
-                os.makedirs(directory, exist_ok=True)
-            with open(USER_DATA_FILE, 'w') as f:
-                json.dump({"user_language": lang_copy, "user_selected_dict": dict_copy}, f, indent=4)
-        
-        await asyncio.to_thread(_save)
+
+async def close_data():
+    global _flush_handle
+    await stop_cache_sync()
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+    await save_data()
+    _state_backend.close()
 
 async def get_available_dictionaries():
-    if not os.path.exists(DICT_PATH):
-        os.makedirs(DICT_PATH)
-    # Используем run_in_executor для листинга директории
-    files = await asyncio.to_thread(os.listdir, DICT_PATH)
-    return sorted([f for f in files if f.endswith('.txt')])
+    # Список держит реестр в памяти и обновляет сам, без listdir на каждое нажатие
+    return await dict_registry.available()
+
+def dictionary_index_path(filename: str) -> str:
+    return os.path.join(DICT_INDEX_PATH, f"{filename}.idx")
+
+def _load_dictionary(file_path: str, filename: str) -> DictionaryIndex:
+    words = load_index(file_path, dictionary_index_path(filename))
+    # Корзины для фильтров собираем сразу: потом выбор слова по фильтру не трогает весь словарь
+    words.buckets = WordBuckets(words)
+    return words
 
 async def get_words_from_dict(filename: str, count: int = 0):
     try:
+        file_path = os.path.join(DICT_PATH, filename)
         async with _words_cache_lock:
             words = WORDS_CACHE.get(filename)
-            if words is not None:
-                WORDS_CACHE.move_to_end(filename)
+
+        # Файл словаря поменяли на диске — индекс нужно пересобрать. Правки видит фоновый
+        # пересмотр папки (dict_registry), так что на каждое слово stat не делаем; к диску идём,
+        # только если реестр и индекс расходятся — например, реестр ещё не заметил новый файл
+        info = dict_registry.info(filename)
+        if (words is not None and info is not None
+                and (info.mtime_ns, info.size) != (words.source_mtime_ns, words.source_size)
+                and not words.matches_source(os.stat(file_path))):
+            words = None
 
         if words is None:
-            file_path = os.path.join(DICT_PATH, filename)
-            async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                words = []
-                async for line in f:
-                    stripped = line.strip()
-                    if stripped:
-                        words.append(stripped)
-            words = await _cache_words(filename, words)
+            CACHE_MISSES.inc(cache="words")
+            started = time.perf_counter()
+            words = await asyncio.to_thread(_load_dictionary, file_path, filename)
+            words = await _cache_words(filename, words, time.perf_counter() - started)
+            dict_registry.record_word_count(filename, words.source_mtime_ns, len(words))
+        else:
+            CACHE_HITS.inc(cache="words")
 
         if count == 0:
             return words
@@ -91,10 +214,269 @@ async def get_words_from_dict(filename: str, count: int = 0):
     except FileNotFoundError:
         return []
 
+def _current_deck(user_id: int, size: int) -> tuple[int, int]:
+    deck = user_deck.get(user_id)
+    seed, position = deck if deck is not None and len(deck) == 2 else (None, 0)
+    if seed is None or position >= size:
+        # Колода закончилась — тасуем заново
+        seed, position = new_deck_seed(), 0
+        user_deck[user_id] = [seed, position]
+        save_user(user_id)
+    return seed, position
+
+def _filtered(user_id: int, words):
+    """The user's filtered view of a loaded dictionary (the dictionary itself without a filter)."""
+    word_filter = user_word_filter.get(user_id)
+    if not word_filter or not isinstance(words, DictionaryIndex) or words.buckets is None:
+        return words
+    return words.buckets.view(word_filter)
+
+async def draw_word(user_id: int, filename: str) -> str | None:
+    if is_mix(filename):
+        return await _draw_from_mix(user_id, filename)
+    words = _filtered(user_id, await get_words_from_dict(filename))
+    if not words:
+        return None
+    if WORD_DRAW_MODE != "deck":
+        upcoming = _upcoming_words.get(user_id)
+        if upcoming and upcoming[0] == filename and upcoming[1]:
+            return upcoming[1].popleft()
+        return words[random.randrange(len(words))]
+
+    seed, position = _current_deck(user_id, len(words))
+    word = words[permute(position, len(words), seed)]
+    user_deck[user_id] = [seed, position + 1]
+    save_user(user_id)
+    return word
+
+async def peek_next_words(user_id: int, filename: str, count: int) -> list[str]:
+    """The words draw_word will return next for this user, without consuming them."""
+    if is_mix(filename):
+        return await _peek_mix(user_id, filename, count)
+    words = _filtered(user_id, await get_words_from_dict(filename))
+    if not words or count <= 0:
+        return []
+    if WORD_DRAW_MODE != "deck":
+        upcoming = _upcoming_words.get(user_id)
+        if upcoming is None or upcoming[0] != filename:
+            upcoming = _upcoming_words[user_id] = (filename, deque())
+        while len(upcoming[1]) < count:
+            upcoming[1].append(words[random.randrange(len(words))])
+        return list(upcoming[1])[:count]
+
+    seed, position = _current_deck(user_id, len(words))
+    end = min(position + count, len(words))
+    return [words[permute(index, len(words), seed)] for index in range(position, end)]
+
+async def _mix_table(user_id: int, mix: Mix | None):
+    if mix is None:
+        return None
+    table = mix.table()
+    if table is None:
+        # Реестр мог ещё не просканировать папку словарей
+        await dict_registry.available()
+        table = mix.table()
+    word_filter = user_word_filter.get(user_id)
+    if table is None or not word_filter:
+        return table
+    # С фильтром выбираем только из словарей, где после него остались слова;
+    # таблица пересобирается, когда меняется версия любого словаря набора
+    key = (mix.name, tuple(word_filter))
+    versions = tuple(info.version if (info := dict_registry.info(member)) else -1 for member in mix.members)
+    cached = _filtered_mix_tables.get(key)
+    if cached is None or cached[0] != versions:
+        sizes = [len(_filtered(user_id, await get_words_from_dict(member))) for member in mix.members]
+        cached = _filtered_mix_tables[key] = (versions, mix.filtered_table(sizes))
+    return cached[1]
+
+def _mix_deck(user_id: int, mix: Mix) -> list[int]:
+    # [seed, сколько слов вытянуто, позиция в колоде каждого словаря набора]
+    deck = user_deck.get(user_id)
+    if deck is None or len(deck) != len(mix.members) + 2:
+        deck = user_deck[user_id] = [new_deck_seed(), 0] + [0] * len(mix.members)
+        save_user(user_id)
+    return deck
+
+async def _mix_word(user_id: int, mix: Mix, member: int, seed: int | None, position: int) -> str | None:
+    words = _filtered(user_id, await get_words_from_dict(mix.members[member]))
+    if not words:
+        return None
+    if seed is None:
+        return words[random.randrange(len(words))]
+    # Словарь набора идёт своей колодой; каждый новый круг — новая перестановка
+    cycle, offset = divmod(position, len(words))
+    return words[permute(offset, len(words), derive_seed(seed, member, cycle))]
+
+async def _draw_from_mix(user_id: int, selection: str) -> str | None:
+    mix = get_mix(selection)
+    table = await _mix_table(user_id, mix)
+    if table is None:
+        return None
+    if WORD_DRAW_MODE != "deck":
+        upcoming = _upcoming_words.get(user_id)
+        if upcoming and upcoming[0] == selection and upcoming[1]:
+            return upcoming[1].popleft()
+        return await _mix_word(user_id, mix, table.sample(random.random()), None, 0)
+
+    deck = _mix_deck(user_id, mix)
+    seed, draws = deck[0], deck[1]
+    member = table.sample(uniform(seed, draws))
+    position = deck[2 + member]
+    deck[1] += 1
+    deck[2 + member] += 1
+    save_user(user_id)
+    return await _mix_word(user_id, mix, member, seed, position)
+
+async def _peek_mix(user_id: int, selection: str, count: int) -> list[str]:
+    mix = get_mix(selection)
+    table = await _mix_table(user_id, mix)
+    if table is None or count <= 0:
+        return []
+    if WORD_DRAW_MODE != "deck":
+        upcoming = _upcoming_words.get(user_id)
+        if upcoming is None or upcoming[0] != selection:
+            upcoming = _upcoming_words[user_id] = (selection, deque())
+        while len(upcoming[1]) < count:
+            word = await _mix_word(user_id, mix, table.sample(random.random()), None, 0)
+            if word is None:
+                break
+            upcoming[1].append(word)
+        return list(upcoming[1])[:count]
+
+    # Повторяем будущие вытягивания на копии позиций — состояние пользователя не меняется
+    deck = _mix_deck(user_id, mix)
+    seed, draws, positions = deck[0], deck[1], deck[2:]
+    upcoming_words = []
+    for step in range(count):
+        member = table.sample(uniform(seed, draws + step))
+        word = await _mix_word(user_id, mix, member, seed, positions[member])
+        positions[member] += 1
+        if word is not None:
+            upcoming_words.append(word)
+    return upcoming_words
+
+def reset_deck(user_id: int) -> None:
+    _upcoming_words.pop(user_id, None)
+    if user_deck.pop(user_id, None) is not None:
+        save_user(user_id)
+
 def clear_cache(filename: str = None):
     if filename:
-        WORDS_CACHE.pop(filename, None)
+        WORDS_CACHE.pop(filename)
+        stale = {filename, *mixes_with(filename)}
+        for user_id in [uid for uid, (name, _) in _upcoming_words.items() if name in stale]:
+            del _upcoming_words[user_id]
         return
     WORDS_CACHE.clear()
+    _upcoming_words.clear()
+
+def _dictionary_version_key(filename: str) -> str:
+    return f"dict:{filename}"
+
+async def _publish_dictionary_change(filename: str) -> None:
+    key = _dictionary_version_key(filename)
+    try:
+        _known_versions[key] = await asyncio.to_thread(_state_backend.bump_version, key)
+    except Exception as exc:
+        logger.error(f"Failed to publish invalidation of {filename}: {exc}")
+
+async def invalidate_dictionary(filename: str) -> None:
+    """Drops the cached dictionary here and tells the other workers to drop theirs."""
+    clear_cache(filename)
+    await dict_registry.refresh()
+    await _publish_dictionary_change(filename)
+
+def _append_to_file(file_path: str, words: list[str]) -> os.stat_result:
+    with open(file_path, 'a', encoding='utf-8') as f:
+        f.write("".join(f"\n{word}" for word in words))
+    return os.stat(file_path)
+
+async def add_words(filename: str, words: list[str]) -> tuple[list[str], int]:
+    """Appends the words that are not in the dictionary yet; returns (added, skipped count).
+
+    The cached index is extended in place, so the cost is O(new words) apart from
+    building the duplicate check set once per loaded dictionary; the set counts
+    towards the index's size in the words cache.
+    """
+    async with _append_lock:
+        index = await get_words_from_dict(filename)
+        if not isinstance(index, DictionaryIndex):
+            return [], len(words)
+        if index.word_keys is None:
+            await asyncio.to_thread(lambda: index.set_word_keys({dedupe_key(word) for word in index}))
+            # Ключи дублей и дописанные слова — тоже память кэша словарей
+            WORDS_CACHE.update_size(filename, index.nbytes)
+
+        added = []
+        for word in words:
+            word = normalize_word(word)
+            key = dedupe_key(word)
+            if word and key not in index.word_keys:
+                index.add_word_key(key)
+                added.append(word)
+        if not added:
+            return [], len(words)
+
+        stat = await asyncio.to_thread(_append_to_file, os.path.join(DICT_PATH, filename), added)
+        index.extend(added, stat)
+        dict_registry.record_append(filename, stat, len(index))
+        WORDS_CACHE.update_size(filename, index.nbytes)
+        # Выбранные вперёд слова знают старый размер словаря
+        stale = {filename, *mixes_with(filename)}
+        for user_id in [uid for uid, (name, _) in _upcoming_words.items() if name in stale]:
+            del _upcoming_words[user_id]
+    await _publish_dictionary_change(filename)
+    return added, len(words) - len(added)
+
+async def sync_shared_versions() -> None:
+    versions = await asyncio.to_thread(_state_backend.read_versions)
+    dictionaries_changed = False
+    for key, version in versions.items():
+        if _known_versions.get(key) == version:
+            continue
+        if key.startswith("dict:"):
+            filename = key.removeprefix("dict:")
+            logger.info(f"Dictionary {filename} changed in another worker, dropping cache.")
+            clear_cache(filename)
+            dictionaries_changed = True
+        _known_versions[key] = version
+    if dictionaries_changed:
+        await dict_registry.refresh()
+
+async def _cache_sync_loop() -> None:
+    while True:
+        await asyncio.sleep(CACHE_SYNC_INTERVAL)
+        try:
+            await sync_shared_versions()
+        except Exception as exc:
+            logger.warning(f"Cache sync failed: {exc}")
+
+async def start_cache_sync() -> None:
+    global _cache_sync_task
+    if CACHE_SYNC_INTERVAL <= 0 or _cache_sync_task is not None:
+        return
+    # При старте кэши пусты — только запоминаем текущие версии
+    _known_versions.update(await asyncio.to_thread(_state_backend.read_versions))
+    _cache_sync_task = asyncio.create_task(_cache_sync_loop())
+
+async def stop_cache_sync() -> None:
+    global _cache_sync_task
+    if _cache_sync_task is not None:
+        _cache_sync_task.cancel()
+        await asyncio.gather(_cache_sync_task, return_exceptions=True)
+        _cache_sync_task = None
+
+def _on_dictionaries_changed(changed: set[str], listing_changed: bool) -> None:
+    # Файл поправили прямо на диске — кэшированный индекс и вытянутые вперёд слова устарели
+    for filename in changed:
+        clear_cache(filename)
+
+dict_registry.add_listener(_on_dictionaries_changed)
+
+def _metric_samples():
+    yield "alias_users_loaded", "gauge", "Users with state in this process", {}, len(user_language.keys() | user_selected_dict.keys())
+    yield "alias_state_dirty_users", "gauge", "Users waiting to be flushed to the state backend", {}, len(_dirty_users)
+
+register_collector(_metric_samples)
 
-user_language, user_selected_dict = load_data()
+load_data()
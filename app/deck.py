@@ -0,0 +1,50 @@
+import random
+
+# Колода без повторов: позиция в колоде отображается в индекс слова
+# через Feistel-перестановку с cycle-walking. Состояние — только (seed, position).
+_ROUNDS = 4
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(value: int) -> int:
+    # splitmix64 finalizer
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+def new_deck_seed() -> int:
+    return random.getrandbits(63)
+
+
+def derive_seed(seed: int, *parts: int) -> int:
+    """Independent deck seed for a part of a combined deck (mix member, reshuffle round)."""
+    for part in parts:
+        seed = _mix(seed ^ (part * 0x9E3779B97F4A7C15 & _MASK64))
+    return seed >> 1
+
+
+def uniform(seed: int, counter: int) -> float:
+    """Deterministic number in [0, 1) for the counter-th draw of a deck."""
+    return (_mix(seed ^ _mix(counter)) >> 11) / (1 << 53)
+
+
+def permute(position: int, size: int, seed: int) -> int:
+    if not 0 <= position < size:
+        raise IndexError("deck position out of range")
+    if size == 1:
+        return 0
+
+    half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+    half_mask = (1 << half_bits) - 1
+    value = position
+    while True:
+        left, right = value >> half_bits, value & half_mask
+        for round_index in range(_ROUNDS):
+            round_key = _mix(seed ^ (round_index << 59) ^ right)
+            left, right = right, left ^ (round_key & half_mask)
+        value = (left << half_bits) | right
+        # Домен Feistel-сети — степень двойки, гуляем по циклу, пока не попадём в [0, size)
+        if value < size:
+            return value
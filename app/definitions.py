@@ -0,0 +1,417 @@
+import asyncio
+import time
+from urllib.parse import quote_plus, urlsplit
+
+from .config import (DEFINITION_BACKEND, DEFINITION_DB_FILE, DEFINITION_TTL, DEFINITION_NEGATIVE_TTL,
+                     OFFLINE_DEFINITIONS_FILE, REDIS_URL, REDIS_PREFIX, WIKTIONARY_BREAKER_FAILURES,
+                     WIKTIONARY_BREAKER_COOLDOWN, WIKTIONARY_HEDGE, logger)
+from .offline_index import OfflineDefinitionIndex, refresh_offline_index
+from .storage import create_definition_backend
+from .cache import cache_manager
+from .http_client import get_json
+from .resilience import CircuitOpenError, HostGuard
+from .metrics import CACHE_HITS, CACHE_MISSES, WIKTIONARY_LATENCY, WIKTIONARY_RESPONSES, register_collector
+from .wiktionary import (_extract_ru_definitions, _extract_en_definitions,
+                         ru_definitions_from_wikitext, en_definitions_from_wikitext)
+
+WIKTIONARY_USER_AGENT = "AliasTelegramBot/1.0 (https://github.com/renkagod/Alias)"
+# Верхняя граница таймаута; рабочий подстраивается под задержки хоста
+DEFINITION_TIMEOUT = 2.5
+# Доля запросов, которые можно продублировать
+WIKTIONARY_HEDGE_RATIO = 0.1
+# MediaWiki принимает до 50 заголовков в одном action=query
+WIKTIONARY_BATCH_SIZE = 50
+# Сколько последних определений поднимать из хранилища при старте
+WARM_DEFINITION_ENTRIES = 500
+# Цена промаха для бюджета кэша: примерно поход в хранилище или Викисловарь, секунды
+DEFINITION_RELOAD_COST = 0.05
+DEFINITION_FAILURE_TTL = 60.0
+# (lang, word) -> (definitions, expires_at), в общем бюджете памяти со словарями
+DEFINITION_CACHE = cache_manager.segment("definitions")
+_definition_cache_lock = asyncio.Lock()
+_definition_store = create_definition_backend(DEFINITION_BACKEND, DEFINITION_DB_FILE, REDIS_URL, REDIS_PREFIX)
+_inflight_definitions: dict[tuple[str, str], asyncio.Future] = {}
+_host_guards: dict[str, HostGuard] = {}
+OFFLINE_INDEX_RECHECK_INTERVAL = 60.0
+_offline_index: OfflineDefinitionIndex | None = None
+_offline_index_checked_at = float("-inf")
+DEFINITION_STATS = {
+    "upstream_calls": 0,
+    "disk_hits": 0,
+    "offline_hits": 0,
+    "coalesced_requests": 0,
+    "upstream_calls_saved": 0,
+}
+
+
+def _host_guard(host: str) -> HostGuard:
+    guard = _host_guards.get(host)
+    if guard is None:
+        guard = _host_guards[host] = HostGuard(
+            host, DEFINITION_TIMEOUT, WIKTIONARY_BREAKER_FAILURES, WIKTIONARY_BREAKER_COOLDOWN,
+            WIKTIONARY_HEDGE, WIKTIONARY_HEDGE_RATIO,
+        )
+    return guard
+
+
+async def _http_get_json(url: str) -> tuple[int | None, dict | None]:
+    host = urlsplit(url).hostname
+    lang = host.split(".", 1)[0]
+    headers = {"User-Agent": WIKTIONARY_USER_AGENT}
+    try:
+        with WIKTIONARY_LATENCY.time(lang=lang):
+            status, payload = await _host_guard(host).call(lambda timeout: get_json(url, timeout, headers=headers))
+    except CircuitOpenError:
+        WIKTIONARY_RESPONSES.inc(lang=lang, status="circuit_open")
+        return None, None
+    WIKTIONARY_RESPONSES.inc(lang=lang, status=status or "error")
+    return status, payload
+
+
+def _definition_ttl(definitions: list[str]) -> float:
+    return DEFINITION_TTL if definitions else DEFINITION_NEGATIVE_TTL
+
+
+async def _get_cached_definitions(cache_key: tuple[str, str]) -> list[str] | None:
+    async with _definition_cache_lock:
+        entry = DEFINITION_CACHE.get(cache_key)
+        if entry is None:
+            CACHE_MISSES.inc(cache="definitions")
+            return None
+        definitions, expires_at = entry
+        if expires_at <= time.time():
+            DEFINITION_CACHE.pop(cache_key)
+            CACHE_MISSES.inc(cache="definitions")
+            return None
+        CACHE_HITS.inc(cache="definitions")
+        return definitions
+
+
+def peek_cached_definitions(word: str, lang: str) -> list[str] | None:
+    """Non-blocking LRU lookup: the definitions if they are already known, None otherwise."""
+    entry = DEFINITION_CACHE.peek((lang, word.strip().lower()))
+    # Отдельная метка: доля слов, показанных сразу со спойлером, — это эффективность предзагрузки
+    if entry is None or entry[1] <= time.time():
+        CACHE_MISSES.inc(cache="definitions_inline")
+        return None
+    CACHE_HITS.inc(cache="definitions_inline")
+    return entry[0]
+
+
+async def _remember_definitions(cache_key: tuple[str, str], definitions: list[str], ttl: float) -> None:
+    async with _definition_cache_lock:
+        DEFINITION_CACHE.put(cache_key, (definitions, time.time() + ttl), cost=DEFINITION_RELOAD_COST)
+
+
+async def _fetch_definitions_upstream(normalized_word: str, lang: str) -> tuple[list[str], int, bool]:
+    candidates = [normalized_word]
+    if normalized_word:
+        candidates.append(normalized_word.capitalize())
+
+    definitions: list[str] = []
+    upstream_calls = 0
+    answered = False
+
+    if lang == "ru":
+        # Оба варианта написания запрашиваем сразу, приоритет — у строчного
+        candidates = list(dict.fromkeys(candidates))
+        upstream_calls = len(candidates)
+        responses = await asyncio.gather(*(
+            _http_get_json(
+                "https://ru.wiktionary.org/w/api.php"
+                f"?action=query&prop=extracts&titles={quote_plus(candidate)}&format=json"
+            )
+            for candidate in candidates
+        ))
+        for status, payload in responses:
+            answered = answered or status is not None
+            if status != 200 or not payload:
+                continue
+
+            page = next(iter(payload.get("query", {}).get("pages", {}).values()), {})
+            extract_html = page.get("extract", "")
+            definitions = _extract_ru_definitions(extract_html, normalized_word)
+            if definitions:
+                break
+    else:
+        for candidate in candidates:
+            url = f"https://en.wiktionary.org/api/rest_v1/page/definition/{quote_plus(candidate)}"
+            upstream_calls += 1
+            status, payload = await _http_get_json(url)
+            answered = answered or status is not None
+            if status != 200 or not payload:
+                continue
+            definitions = _extract_en_definitions(payload, normalized_word)
+            if definitions:
+                break
+
+    DEFINITION_STATS["upstream_calls"] += upstream_calls
+    return definitions, upstream_calls, answered
+
+
+def _get_offline_definitions(lang: str, word: str) -> list[str] | None:
+    global _offline_index, _offline_index_checked_at
+    # Индекс могут пересобрать, пока бот работает — проверяем файл не чаще раза в минуту
+    now = time.monotonic()
+    if now - _offline_index_checked_at >= OFFLINE_INDEX_RECHECK_INTERVAL:
+        _offline_index_checked_at = now
+        _offline_index = refresh_offline_index(OFFLINE_DEFINITIONS_FILE, _offline_index)
+    if _offline_index is None:
+        return None
+    return _offline_index.get(lang, word)
+
+
+async def _load_local_definitions(lang: str, words: list[str]) -> dict[str, list[str]]:
+    try:
+        stored = await asyncio.to_thread(_definition_store.get_many, lang, words)
+    except Exception as exc:
+        logger.error(f"Failed to read definition cache: {exc}")
+        stored = {}
+
+    found: dict[str, list[str]] = {}
+    now = time.time()
+    for word in words:
+        entry = stored.get(word)
+        if entry is not None:
+            definitions, fetched_at = entry
+            ttl = fetched_at + _definition_ttl(definitions) - now
+            if ttl > 0:
+                DEFINITION_STATS["disk_hits"] += 1
+                await _remember_definitions((lang, word), definitions, ttl)
+                found[word] = definitions
+                continue
+
+        offline_definitions = _get_offline_definitions(lang, word)
+        if offline_definitions:
+            DEFINITION_STATS["offline_hits"] += 1
+            await _remember_definitions((lang, word), offline_definitions, DEFINITION_TTL)
+            found[word] = offline_definitions
+    return found
+
+
+async def _save_fetched_definitions(lang: str, fetched: dict[str, tuple[list[str], bool]]) -> None:
+    answered = {word: definitions for word, (definitions, ok) in fetched.items() if ok}
+    try:
+        await asyncio.to_thread(_definition_store.put_many, lang, answered, time.time())
+    except Exception as exc:
+        logger.error(f"Failed to write definition cache: {exc}")
+    for word, (definitions, ok) in fetched.items():
+        # Викисловарь не ответил — не запоминаем это надолго и не пишем на диск
+        ttl = _definition_ttl(definitions) if ok else DEFINITION_FAILURE_TTL
+        await _remember_definitions((lang, word), definitions, ttl)
+
+
+async def _load_definitions(normalized_word: str, lang: str) -> tuple[list[str], int]:
+    local = await _load_local_definitions(lang, [normalized_word])
+    if normalized_word in local:
+        return local[normalized_word], 0
+
+    definitions, upstream_calls, answered = await _fetch_definitions_upstream(normalized_word, lang)
+    await _save_fetched_definitions(lang, {normalized_word: (definitions, answered)})
+    return definitions, upstream_calls
+
+
+def _revisions_url(lang: str, titles: list[str]) -> str:
+    return (
+        f"https://{lang}.wiktionary.org/w/api.php"
+        "?action=query&prop=revisions&rvprop=content&rvslots=main&redirects=1"
+        f"&format=json&formatversion=2&titles={quote_plus('|'.join(titles))}"
+    )
+
+
+async def _query_wikitext(lang: str, titles: list[str]) -> tuple[dict[str, str], bool]:
+    status, payload = await _http_get_json(_revisions_url(lang, titles))
+    if status != 200 or not payload:
+        return {}, status is not None
+
+    query = payload.get("query", {})
+    # Викисловарь может нормализовать заголовок или пойти по редиректу — сводим обратно к запрошенному
+    aliases = {item["from"]: item["to"] for item in query.get("normalized", []) + query.get("redirects", [])}
+    pages = {page.get("title"): page for page in query.get("pages", [])}
+
+    wikitext: dict[str, str] = {}
+    for title in titles:
+        resolved, seen = title, set()
+        while resolved in aliases and resolved not in seen:
+            seen.add(resolved)
+            resolved = aliases[resolved]
+        page = pages.get(resolved)
+        if not page or page.get("missing") or not page.get("revisions"):
+            continue
+        content = page["revisions"][0].get("slots", {}).get("main", {}).get("content")
+        if content:
+            wikitext[title] = content
+    return wikitext, True
+
+
+async def _fetch_definitions_upstream_batch(words: list[str], lang: str) -> dict[str, tuple[list[str], bool]]:
+    parse = ru_definitions_from_wikitext if lang == "ru" else en_definitions_from_wikitext
+    results: dict[str, tuple[list[str], bool]] = {word: ([], False) for word in words}
+    # Страница есть, но викитекст ничего не дал или потерял толкование на шаблоне, который мы не раскрываем
+    unparsed: set[str] = set()
+
+    # Сначала слово как есть, затем с заглавной буквы — только для тех, что не нашлись
+    for make_title in (str, str.capitalize):
+        missing = [word for word, (definitions, _) in results.items() if not definitions]
+        titles = {make_title(word): word for word in missing}
+        if not titles:
+            break
+        title_list = list(titles)
+        chunks = [title_list[i:i + WIKTIONARY_BATCH_SIZE] for i in range(0, len(title_list), WIKTIONARY_BATCH_SIZE)]
+        DEFINITION_STATS["upstream_calls"] += len(chunks)
+        responses = await asyncio.gather(*(_query_wikitext(lang, chunk) for chunk in chunks))
+        for chunk, (wikitext, answered) in zip(chunks, responses):
+            for title in chunk:
+                word = titles[title]
+                definitions = parse(wikitext[title], word, strict=True) if title in wikitext else []
+                if title in wikitext and not definitions:
+                    unparsed.add(word)
+                results[word] = (definitions, answered or results[word][1])
+
+    # Такие слова не кэшируем как «нет определения»: их разбирает одиночный путь
+    # (prop=extracts / REST), тот же, что и при обычном запросе слова
+    retry = [word for word in unparsed if not results[word][0]]
+    fallbacks = await asyncio.gather(*(_fetch_definitions_upstream(word, lang) for word in retry))
+    for word, (definitions, _, answered) in zip(retry, fallbacks):
+        results[word] = (definitions, answered)
+    return results
+
+
+class _BatchAbandoned(Exception):
+    """The batch that claimed a word stopped before resolving it; the waiter should fetch it itself."""
+
+
+# Пачки с заявленными словами живут отдельно от вызывающих: отмена вызывающего их не трогает
+_batch_tasks: set[asyncio.Task] = set()
+
+
+async def _resolve_claimed(lang: str, claimed: dict[str, asyncio.Future]) -> dict[str, list[str]]:
+    results: dict[str, list[str]] = {}
+    try:
+        local = await _load_local_definitions(lang, list(claimed))
+        remote_words = [word for word in claimed if word not in local]
+        fetched = await _fetch_definitions_upstream_batch(remote_words, lang) if remote_words else {}
+        await _save_fetched_definitions(lang, fetched)
+        for word, future in claimed.items():
+            definitions = local[word] if word in local else fetched[word][0]
+            results[word] = definitions
+            future.set_result((definitions, 0))
+    except BaseException as exc:
+        for word, future in claimed.items():
+            if future.done():
+                continue
+            # Снимаем заявку до того, как разбудить ожидающих, — их повторный запрос пойдёт сам
+            if _inflight_definitions.get((lang, word)) is future:
+                del _inflight_definitions[(lang, word)]
+            future.set_exception(exc if isinstance(exc, Exception) else _BatchAbandoned())
+        raise
+    return results
+
+
+def _on_batch_done(task: asyncio.Task) -> None:
+    _batch_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Definition batch failed: {task.exception()}")
+
+
+async def fetch_definitions_batch(words: list[str], lang: str) -> dict[str, list[str]]:
+    """Definitions for many words at once: cache, then disk and offline index, then ~N/50 API calls."""
+    normalized_words = list(dict.fromkeys(word.strip().lower() for word in words if word.strip()))
+    results: dict[str, list[str]] = {}
+    waiting: dict[str, asyncio.Future] = {}
+    claimed: dict[str, asyncio.Future] = {}
+
+    loop = asyncio.get_running_loop()
+    for word in normalized_words:
+        cache_key = (lang, word)
+        cached_definitions = await _get_cached_definitions(cache_key)
+        if cached_definitions is not None:
+            results[word] = cached_definitions
+        elif cache_key in _inflight_definitions:
+            waiting[word] = _inflight_definitions[cache_key]
+        else:
+            # Регистрируем слово как «в полёте», чтобы одиночные запросы ждали пачку
+            future = loop.create_future()
+            _inflight_definitions[cache_key] = future
+            future.add_done_callback(lambda done, key=cache_key: _forget_inflight(key, done))
+            claimed[word] = future
+
+    if claimed:
+        batch = asyncio.create_task(_resolve_claimed(lang, claimed))
+        _batch_tasks.add(batch)
+        batch.add_done_callback(_on_batch_done)
+        results.update(await asyncio.shield(batch))
+
+    for word, future in waiting.items():
+        try:
+            results[word] = (await asyncio.shield(future))[0]
+        except Exception:
+            results[word] = []
+    return results
+
+
+def _forget_inflight(cache_key: tuple[str, str], task: asyncio.Future) -> None:
+    if _inflight_definitions.get(cache_key) is task:
+        del _inflight_definitions[cache_key]
+    # Забираем исключение, даже если все ожидающие уже отменились
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug(f"Definition fetch for {cache_key} failed: {task.exception()}")
+
+
+async def fetch_definitions(word: str, lang: str) -> list[str]:
+    normalized_word = word.strip().lower()
+    cache_key = (lang, normalized_word)
+    cached_definitions = await _get_cached_definitions(cache_key)
+    if cached_definitions is not None:
+        return cached_definitions
+
+    # Single-flight: одновременные запросы одного слова ждут один общий запрос наверх.
+    # Общая задача живёт отдельно от вызывающих, поэтому отмена одного из них
+    # (shield) не отменяет запрос для остальных.
+    task = _inflight_definitions.get(cache_key)
+    is_leader = task is None
+    if is_leader:
+        task = asyncio.create_task(_load_definitions(normalized_word, lang))
+        _inflight_definitions[cache_key] = task
+        task.add_done_callback(lambda done: _forget_inflight(cache_key, done))
+    else:
+        DEFINITION_STATS["coalesced_requests"] += 1
+
+    try:
+        definitions, upstream_calls = await asyncio.shield(task)
+    except _BatchAbandoned:
+        # Пачка, за которой мы стояли, остановилась, не дойдя до слова, — запрашиваем сами
+        return await fetch_definitions(word, lang)
+    if not is_leader:
+        DEFINITION_STATS["upstream_calls_saved"] += upstream_calls
+    return definitions
+
+
+async def warm_definition_cache() -> int:
+    entries = await asyncio.to_thread(_definition_store.recent, WARM_DEFINITION_ENTRIES)
+    now = time.time()
+    warmed = 0
+    async with _definition_cache_lock:
+        # recent() отдаёт самые свежие первыми, а в LRU они должны оказаться в конце
+        for lang, word, definitions, fetched_at in reversed(entries):
+            expires_at = fetched_at + _definition_ttl(definitions)
+            if expires_at > now:
+                DEFINITION_CACHE.put((lang, word), (definitions, expires_at), cost=DEFINITION_RELOAD_COST)
+                warmed += 1
+    logger.info(f"Warmed definition cache with {warmed} entries.")
+    return warmed
+
+
+def close_definition_store() -> None:
+    _definition_store.close()
+
+
+def _metric_samples():
+    for guard in list(_host_guards.values()):
+        yield from guard.metric_samples()
+    yield "alias_definitions_inflight", "gauge", "Definition lookups in progress", {}, len(_inflight_definitions)
+    for name, value in DEFINITION_STATS.items():
+        yield "alias_definition_events_total", "counter", "Definition lookup events", {"event": name}, value
+
+
+register_collector(_metric_samples)
@@ -0,0 +1,157 @@
+import os
+import sys
+import mmap
+import struct
+from array import array
+from collections.abc import Iterable, Sequence
+
+# Компилированный словарь: заголовок, UTF-8 блоб со словами и массив смещений.
+# Файл открывается через mmap, так что слово — это один срез по двум смещениям.
+INDEX_MAGIC = b"ALIASIDX"
+INDEX_VERSION = 1
+_HEADER = struct.Struct("=8sIIqqQQQ")  # magic, version, reserved, mtime_ns, size, count, blob_start, offsets_start
+
+
+class DictionaryIndex(Sequence):
+    def __init__(self, path: str, mm: mmap.mmap, source_mtime_ns: int, source_size: int,
+                 count: int, blob_start: int, offsets_start: int):
+        self.path = path
+        self.source_mtime_ns = source_mtime_ns
+        self.source_size = source_size
+        self._mm = mm
+        self._count = count
+        self._blob_start = blob_start
+        self._offsets = memoryview(mm)[offsets_start:offsets_start + (count + 1) * 8].cast("Q")
+        # Слова, дописанные через /addword после сборки индекса: живут в памяти до следующей пересборки
+        self._tail: list[str] = []
+        # Ключи для проверки дублей, строятся при первом добавлении слов
+        self.word_keys: set[str] | None = None
+        # Строки хвоста и ключей живут в куче Python — их размер тоже идёт в nbytes
+        self._strings_nbytes = 0
+        # Корзины по длине и классу слова для фильтров (app.word_filter), строятся при загрузке
+        self.buckets = None
+
+    @classmethod
+    def open(cls, path: str) -> "DictionaryIndex":
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, _, mtime_ns, size, count, blob_start, offsets_start = _HEADER.unpack_from(mm, 0)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                raise ValueError(f"{path} is not a dictionary index")
+            if offsets_start + (count + 1) * 8 > len(mm):
+                raise ValueError(f"{path} is truncated")
+        except (ValueError, struct.error):
+            mm.close()
+            raise
+        return cls(path, mm, mtime_ns, size, count, blob_start, offsets_start)
+
+    def __len__(self) -> int:
+        return self._count + len(self._tail)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("dictionary index out of range")
+        if index >= self._count:
+            return self._tail[index - self._count]
+        start = self._blob_start + self._offsets[index]
+        end = self._blob_start + self._offsets[index + 1]
+        return self._mm[start:end].decode("utf-8")
+
+    def matches_source(self, stat: os.stat_result) -> bool:
+        return self.source_mtime_ns == stat.st_mtime_ns and self.source_size == stat.st_size
+
+    def extend(self, words: list[str], stat: os.stat_result) -> None:
+        """Adds words appended to the source file, which now has the given stat."""
+        start = len(self)
+        self._tail.extend(words)
+        self._strings_nbytes += sum(sys.getsizeof(word) for word in words)
+        if self.buckets is not None:
+            self.buckets.add(words, start)
+        self.source_mtime_ns = stat.st_mtime_ns
+        self.source_size = stat.st_size
+
+    def set_word_keys(self, keys: set[str]) -> None:
+        self.word_keys = keys
+        self._strings_nbytes += sum(sys.getsizeof(key) for key in keys)
+
+    def add_word_key(self, key: str) -> None:
+        self.word_keys.add(key)
+        self._strings_nbytes += sys.getsizeof(key)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            len(self._mm)
+            + (self.buckets.nbytes if self.buckets is not None else 0)
+            + sys.getsizeof(self._tail)
+            + (sys.getsizeof(self.word_keys) if self.word_keys is not None else 0)
+            + self._strings_nbytes
+        )
+
+
+def write_index(index_path: str, words: Iterable[str], source_mtime_ns: int = 0, source_size: int = 0) -> int:
+    directory = os.path.dirname(os.path.abspath(index_path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    offsets = array("Q", [0])
+    try:
+        with open(tmp_path, "wb") as out:
+            out.write(b"\0" * _HEADER.size)
+            position = 0
+            for word in words:
+                encoded = word.encode("utf-8")
+                out.write(encoded)
+                position += len(encoded)
+                offsets.append(position)
+
+            blob_end = _HEADER.size + position
+            padding = -blob_end % 8
+            out.write(b"\0" * padding)
+            offsets_start = blob_end + padding
+            out.write(offsets.tobytes())
+
+            out.seek(0)
+            out.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, source_mtime_ns, source_size,
+                                   len(offsets) - 1, _HEADER.size, offsets_start))
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(offsets) - 1
+
+
+def stamp_index_source(index_path: str, source_mtime_ns: int, source_size: int) -> None:
+    """Records the source file's mtime and size in an index written before the source was final."""
+    with open(index_path, "r+b") as f:
+        fields = list(_HEADER.unpack(f.read(_HEADER.size)))
+        fields[3], fields[4] = source_mtime_ns, source_size
+        f.seek(0)
+        f.write(_HEADER.pack(*fields))
+
+
+def iter_source_words(source_path: str):
+    with open(source_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped:
+                yield stripped
+
+
+def load_index(source_path: str, index_path: str) -> DictionaryIndex:
+    """Opens the compiled index for a .txt dictionary, rebuilding it if the source changed."""
+    stat = os.stat(source_path)
+    try:
+        index = DictionaryIndex.open(index_path)
+        if index.matches_source(stat):
+            return index
+    except (OSError, ValueError):
+        pass
+
+    write_index(index_path, iter_source_words(source_path), stat.st_mtime_ns, stat.st_size)
+    return DictionaryIndex.open(index_path)
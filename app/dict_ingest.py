@@ -0,0 +1,101 @@
+"""Turning an uploaded .txt into a live dictionary without exposing half-written files.
+
+The raw upload is read line by line; every word is normalized (NFC, single spaces),
+empty lines and duplicates are dropped, and the clean text and the compiled index
+are written in the same pass. The index goes into place first and the text file is
+renamed over the old one last, so readers see either the old or the new dictionary.
+"""
+import os
+import time
+import threading
+import unicodedata
+
+from .dict_index import write_index, stamp_index_source
+
+
+class IngestError(Exception):
+    """The upload cannot become a dictionary; key names the texts.py reason shown to the admin."""
+
+    def __init__(self, key: str, **params):
+        super().__init__(key, params)
+        self.key = key
+        self.params = params
+
+
+class IngestResult:
+    __slots__ = ("words", "duplicates", "empty_lines", "size")
+
+    def __init__(self, words: int, duplicates: int, empty_lines: int, size: int):
+        self.words = words
+        self.duplicates = duplicates
+        self.empty_lines = empty_lines
+        self.size = size
+
+
+def normalize_word(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def dedupe_key(word: str) -> str:
+    # «Ёж» и «ёж» в Alias — одно слово
+    return word.casefold()
+
+
+def safe_dictionary_name(filename: str) -> str | None:
+    name = os.path.basename(filename or "").strip()
+    if not name.endswith(".txt") or name.startswith(".") or len(name) <= len(".txt"):
+        return None
+    return name
+
+
+def ingest_dictionary(raw_path: str, target_path: str, index_path: str, max_bytes: int) -> IngestResult:
+    """Normalizes raw_path into target_path and its index at index_path, replacing both atomically."""
+    if os.path.getsize(raw_path) > max_bytes:
+        raise IngestError("upload_too_large", limit=f"{max_bytes / (1024 * 1024):g}")
+
+    tmp_text = f"{target_path}.{os.getpid()}.{threading.get_ident()}.ingest"
+    tmp_index = f"{index_path}.{os.getpid()}.{threading.get_ident()}.ingest"
+    seen: set[str] = set()
+    counts = {"duplicates": 0, "empty_lines": 0, "size": 0}
+
+    def clean_words(raw, out):
+        first = True
+        for line in raw:
+            word = normalize_word(line)
+            if not word:
+                counts["empty_lines"] += 1
+                continue
+            key = dedupe_key(word)
+            if key in seen:
+                counts["duplicates"] += 1
+                continue
+            seen.add(key)
+            encoded = (word if first else "\n" + word).encode("utf-8")
+            out.write(encoded)
+            counts["size"] += len(encoded)
+            first = False
+            yield word
+
+    try:
+        with open(raw_path, "r", encoding="utf-8-sig", errors="strict", newline=None) as raw, \
+                open(tmp_text, "wb") as out:
+            # Исходник ещё пишется, поэтому mtime и размер в заголовок индекса проставим после
+            count = write_index(tmp_index, clean_words(raw, out))
+            out.flush()
+            os.fsync(out.fileno())
+        if count == 0:
+            raise IngestError("upload_no_words")
+
+        mtime_ns = time.time_ns()
+        os.utime(tmp_text, ns=(mtime_ns, mtime_ns))
+        stamp_index_source(tmp_index, mtime_ns, counts["size"])
+        os.replace(tmp_index, index_path)
+        os.replace(tmp_text, target_path)
+    except UnicodeDecodeError as exc:
+        raise IngestError("upload_not_utf8", position=exc.start) from exc
+    finally:
+        for path in (tmp_text, tmp_index):
+            if os.path.exists(path):
+                os.remove(path)
+
+    return IngestResult(count, counts["duplicates"], counts["empty_lines"], counts["size"])
@@ -0,0 +1,149 @@
+"""In-memory listing of the dictionaries in DICT_PATH.
+
+The folder is rescanned in the background (one scandir, stats come with the entries),
+which catches added, removed and edited-in-place files alike. Handlers read the listing
+and metadata from memory; listeners are told which dictionaries changed.
+"""
+import os
+import asyncio
+from collections.abc import Callable
+
+from .config import DICT_PATH, DICT_WATCH_INTERVAL, logger
+from .metrics import register_collector
+
+
+class DictionaryInfo:
+    __slots__ = ("name", "size", "mtime_ns", "words", "version")
+
+    def __init__(self, name: str, size: int, mtime_ns: int):
+        self.name = name
+        self.size = size
+        self.mtime_ns = mtime_ns
+        # Число слов известно после первой загрузки индекса
+        self.words: int | None = None
+        self.version = 1
+
+
+_listing: list[str] = []
+_info: dict[str, DictionaryInfo] = {}
+_scanned = False
+_scan_lock = asyncio.Lock()
+_watch_task: asyncio.Task | None = None
+# callback(изменённые словари, поменялся ли сам список)
+_listeners: list[Callable[[set[str], bool], None]] = []
+# callback(словарь, в который дописал этот процесс): кэш слов при этом уже обновлён на месте
+_append_listeners: list[Callable[[str], None]] = []
+
+
+def add_listener(callback: Callable[[set[str], bool], None]) -> None:
+    _listeners.append(callback)
+
+
+def add_append_listener(callback: Callable[[str], None]) -> None:
+    _append_listeners.append(callback)
+
+
+def _scan() -> dict[str, os.stat_result]:
+    os.makedirs(DICT_PATH, exist_ok=True)
+    stats = {}
+    with os.scandir(DICT_PATH) as entries:
+        for entry in entries:
+            if entry.name.endswith(".txt") and entry.is_file():
+                stats[entry.name] = entry.stat()
+    return stats
+
+
+async def refresh() -> set[str]:
+    """Rescans DICT_PATH and returns the dictionaries that were added, removed or modified."""
+    global _scanned
+    async with _scan_lock:
+        stats = await asyncio.to_thread(_scan)
+        changed = set(_info) - set(stats)
+        for name in changed:
+            del _info[name]
+        for name, stat in stats.items():
+            info = _info.get(name)
+            if info is None:
+                _info[name] = DictionaryInfo(name, stat.st_size, stat.st_mtime_ns)
+                changed.add(name)
+            elif (info.size, info.mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                info.size, info.mtime_ns = stat.st_size, stat.st_mtime_ns
+                info.words = None
+                info.version += 1
+                changed.add(name)
+
+        listing = sorted(stats)
+        listing_changed = listing != _listing
+        _listing[:] = listing
+        first_scan = not _scanned
+        _scanned = True
+
+    if changed and not first_scan:
+        logger.info(f"Dictionaries changed: {', '.join(sorted(changed))}")
+        for callback in _listeners:
+            try:
+                callback(changed, listing_changed)
+            except Exception as exc:
+                logger.error(f"Dictionary listener {callback!r} failed: {exc}")
+    return changed
+
+
+async def available() -> list[str]:
+    if not _scanned:
+        await refresh()
+    return list(_listing)
+
+
+def info(name: str) -> DictionaryInfo | None:
+    return _info.get(name)
+
+
+def record_word_count(name: str, mtime_ns: int, count: int) -> None:
+    entry = _info.get(name)
+    if entry is not None and entry.mtime_ns == mtime_ns:
+        entry.words = count
+
+
+def record_append(name: str, stat: os.stat_result, count: int) -> None:
+    """Takes an append made by this process into account; only the append listeners are told."""
+    entry = _info.get(name)
+    if entry is not None:
+        entry.size, entry.mtime_ns = stat.st_size, stat.st_mtime_ns
+        entry.words = count
+        entry.version += 1
+    for callback in _append_listeners:
+        try:
+            callback(name)
+        except Exception as exc:
+            logger.error(f"Dictionary append listener {callback!r} failed: {exc}")
+
+
+async def _watch_loop() -> None:
+    while True:
+        await asyncio.sleep(DICT_WATCH_INTERVAL)
+        try:
+            await refresh()
+        except OSError as exc:
+            logger.warning(f"Could not rescan {DICT_PATH}: {exc}")
+
+
+async def start_dictionary_watch() -> None:
+    global _watch_task
+    await refresh()
+    if DICT_WATCH_INTERVAL > 0 and _watch_task is None:
+        _watch_task = asyncio.create_task(_watch_loop())
+
+
+async def stop_dictionary_watch() -> None:
+    global _watch_task
+    if _watch_task is not None:
+        _watch_task.cancel()
+        await asyncio.gather(_watch_task, return_exceptions=True)
+        _watch_task = None
+
+
+def _metric_samples():
+    yield "alias_dictionaries", "gauge", "Dictionaries in DICT_PATH", {}, len(_listing)
+
+
+register_collector(_metric_samples)
@@ -1,9 +1,18 @@
 import os
+import html
+import math
+import asyncio
+import tempfile
 from telegram import Update, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler
-from ..config import DEFAULT_LANG, DICT_PATH, is_admin
+from ..config import (DEFAULT_LANG, DICT_PATH, DATA_DIR, DICT_UPLOAD_MAX_MB, PROFILE_MAX_SECONDS,
+                      SLOW_CALLBACK_THRESHOLD, is_admin, logger)
 from ..texts import get_text
-from ..data_manager import user_language, user_selected_dict, save_data, WORDS_CACHE
+from ..metrics import render_summary
+from .. import profiler
+from ..data_manager import (user_language, user_selected_dict, save_user, reset_deck, invalidate_dictionary,
+                            dictionary_index_path)
+from ..dict_ingest import IngestError, ingest_dictionary, safe_dictionary_name
 from .ui import get_dict_selection_inline_keyboard
 
 AWAITING_WORDS, AWAITING_DICT_CHOICE = range(2)
@@ -33,6 +42,10 @@ async def dict_upload_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     await update.message.reply_text(get_text('upload_prompt', lang), reply_markup=ReplyKeyboardRemove())
 
+async def _reply_rejected(update: Update, lang: str, error: IngestError):
+    reason = get_text(error.key, lang).format(**error.params)
+    await update.message.reply_text(get_text('upload_rejected', lang).format(reason=reason))
+
 async def dict_upload_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from .common import show_main_menu_and_welcome
     user_id = update.effective_user.id
@@ -42,18 +55,86 @@ async def dict_upload_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     document = update.message.document
-    if document and document.file_name.endswith('.txt'):
-        file = await document.get_file()
-        file_path = os.path.join(DICT_PATH, document.file_name)
-        await file.download_to_drive(file_path)
-        
-        if document.file_name in WORDS_CACHE:
-            del WORDS_CACHE[document.file_name]
-            
-        user_selected_dict[user_id] = document.file_name
-        await save_data(user_language, user_selected_dict)
-        await update.message.reply_text(get_text('upload_success', lang).format(filename=document.file_name))
-        await show_main_menu_and_welcome(update, context)
-    else:
+    dict_name = safe_dictionary_name(document.file_name) if document else None
+    if dict_name is None:
         await update.message.reply_text(get_text('invalid_file_type', lang))
+        return
+    max_bytes = int(DICT_UPLOAD_MAX_MB * 1024 * 1024)
+    if document.file_size and document.file_size > max_bytes:
+        await _reply_rejected(update, lang, IngestError("upload_too_large", limit=f"{DICT_UPLOAD_MAX_MB:g}"))
+        return
+
+    # Качаем во временный файл: живой словарь подменяется только готовым, целиком
+    os.makedirs(DATA_DIR, exist_ok=True)
+    fd, raw_path = tempfile.mkstemp(prefix="upload-", suffix=".raw", dir=DATA_DIR)
+    os.close(fd)
+    try:
+        file = await document.get_file()
+        await file.download_to_drive(raw_path)
+        result = await asyncio.to_thread(
+            ingest_dictionary, raw_path, os.path.join(DICT_PATH, dict_name),
+            dictionary_index_path(dict_name), max_bytes,
+        )
+    except IngestError as exc:
+        await _reply_rejected(update, lang, exc)
+        return
+    finally:
+        os.remove(raw_path)
+
+    await invalidate_dictionary(dict_name)
+    logger.info(f"Dictionary {dict_name} uploaded by {user_id}: {result.words} words, "
+                f"{result.duplicates} duplicates, {result.empty_lines} empty lines")
+
+    user_selected_dict[user_id] = dict_name
+    reset_deck(user_id)
+    save_user(user_id)
+    await update.message.reply_text(
+        get_text('upload_success', lang).format(filename=dict_name) + "\n" +
+        get_text('upload_stats', lang).format(words=result.words, duplicates=result.duplicates,
+                                              empty_lines=result.empty_lines)
+    )
+    await show_main_menu_and_welcome(update, context)
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    lang = user_language.get(user_id, DEFAULT_LANG)
+    if not is_admin(user_id):
+        await update.message.reply_text(get_text('admin_only', lang))
+        return
+    # Лимит сообщения Telegram — 4096 символов
+    summary = render_summary()[:3900]
+    await update.message.reply_text(f"<pre>{html.escape(summary)}</pre>", parse_mode="HTML")
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    lang = user_language.get(user_id, DEFAULT_LANG)
+    if not is_admin(user_id):
+        await update.message.reply_text(get_text('admin_only', lang))
+        return
+    if profiler.is_running():
+        await update.message.reply_text(get_text('profile_busy', lang))
+        return
+    try:
+        seconds = float(context.args[0]) if context.args else 10.0
+    except ValueError:
+        seconds = 10.0
+    # float() принимает и "nan"/"inf", а их min/max не ограничивают
+    if not math.isfinite(seconds):
+        seconds = 10.0
+    seconds = min(max(seconds, 1.0), PROFILE_MAX_SECONDS)
+    await update.message.reply_text(get_text('profile_started', lang).format(seconds=f"{seconds:g}"))
+
+    async def run_and_report():
+        try:
+            report, collapsed = await profiler.profile(seconds, threshold=SLOW_CALLBACK_THRESHOLD)
+        except Exception as exc:
+            logger.error(f"Profiling failed: {exc}")
+            return
+        await update.message.reply_document(
+            report.encode(), filename="profile.txt",
+            caption=get_text('profile_done', lang).format(seconds=f"{seconds:g}"),
+        )
+        await update.message.reply_document(collapsed.encode(), filename="profile.folded")
 
+    # Профиль идёт в фоне: апдейты этого же админа не должны ждать его окончания
+    context.application.create_task(run_and_report(), update=update)
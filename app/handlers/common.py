@@ -4,6 +4,7 @@ from telegram.ext import ContextTypes
 from ..config import DEFAULT_LANG, logger
 from ..texts import get_text, TEXTS
 from ..data_manager import user_language, user_selected_dict
+from ..mixes import display_name
 from .ui import get_lang_inline_keyboard, get_main_reply_keyboard
 from .settings import handle_change_dict
 
@@ -27,7 +28,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_main_menu_and_welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     lang = user_language.get(user_id, DEFAULT_LANG)
-    active_dict = user_selected_dict.get(user_id, "N/A")
+    active_dict = display_name(user_selected_dict.get(user_id, "N/A"))
     keyboard = get_main_reply_keyboard(lang)
     reply_target = update.message or update.callback_query.message
     await reply_target.reply_html(get_text('welcome_existing', lang).format(dict=active_dict), reply_markup=keyboard)
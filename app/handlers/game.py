@@ -1,214 +1,26 @@
-import asyncio
 import html as html_lib
-import json
 import re
-import unicodedata
-from collections import OrderedDict
-import urllib.error
-import urllib.request
+from collections.abc import Callable
 from urllib.parse import quote_plus
 
 from telegram import Update
 from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
-from ..data_manager import user_language, user_selected_dict, get_words_from_dict
+from ..data_manager import user_language, user_selected_dict, user_word_filter, draw_word
+from ..definitions import fetch_definitions, peek_cached_definitions
+from ..prefetch import schedule_prefetch
+from ..tasks import definition_edits
+from ..rate_limiter import PRIORITY_BACKGROUND
 from ..texts import get_text
 from ..config import DEFAULT_LANG, logger
 
-WIKTIONARY_USER_AGENT = "AliasTelegramBot/1.0 (https://github.com/renkagod/Alias)"
-DEFINITION_TIMEOUT = 2.5
-MAX_DEFINITIONS = 3
-MAX_DEFINITION_LENGTH = 220
-MAX_DEFINITION_CACHE_SIZE = 500
-DEFINITION_CACHE: OrderedDict[tuple[str, str], list[str]] = OrderedDict()
-_definition_cache_lock = asyncio.Lock()
-
-
-def _normalize_ws(text: str) -> str:
-    return re.sub(r"\s+", " ", text).strip()
-
-
-def _normalize_for_compare(text: str) -> str:
-    normalized = unicodedata.normalize("NFD", text.lower())
-    return "".join(ch for ch in normalized if unicodedata.category(ch) != "Mn")
-
-
-def _strip_headword_prefix(definition: str, word: str) -> str:
-    definition = definition.strip()
-    if not definition:
-        return definition
-
-    normalized_def = _normalize_for_compare(definition)
-    normalized_word = _normalize_for_compare(word)
-    if not normalized_def.startswith(normalized_word):
-        return definition
-
-    if len(normalized_def) > len(normalized_word) and normalized_def[len(normalized_word)].isalnum():
-        return definition
-
-    pattern_parts: list[str] = []
-    for ch in word:
-        if ch.isspace():
-            pattern_parts.append(r"\s+")
-        else:
-            pattern_parts.append(f"{re.escape(ch)}\u0301?")
-
-    pattern = r"^\s*" + "".join(pattern_parts) + r"\s*(?:[-—–:;,]\s*)?"
-    stripped = re.sub(pattern, "", definition, flags=re.IGNORECASE)
-    stripped = stripped.strip()
-    return stripped if stripped else definition
-
-
-def _http_get_json_sync(url: str) -> tuple[int | None, dict | None]:
-    request = urllib.request.Request(url, headers={"User-Agent": WIKTIONARY_USER_AGENT})
-    try:
-        with urllib.request.urlopen(request, timeout=DEFINITION_TIMEOUT) as response:
-            status = getattr(response, "status", 200)
-            if status != 200:
-                return status, None
-            payload = response.read().decode("utf-8", errors="replace")
-            return status, json.loads(payload)
-    except urllib.error.HTTPError as exc:
-        return exc.code, None
-    except Exception as exc:
-        logger.debug(f"Definition request failed for url={url}: {exc}")
-        return None, None
-
-
-async def _http_get_json(url: str) -> tuple[int | None, dict | None]:
-    return await asyncio.to_thread(_http_get_json_sync, url)
-
-
-def _extract_ru_definitions(extract_html: str, word: str) -> list[str]:
-    heading_match = re.search(
-        r"<h[2-6][^>]*>\s*(?:<span[^>]*>\s*)?Значение\s*(?:</span>\s*)?</h[2-6]>",
-        extract_html,
-        flags=re.DOTALL,
-    )
-    if not heading_match:
-        return []
-
-    section_html = extract_html[heading_match.end():]
-    list_match = re.search(r"<ol>(.*?)</ol>", section_html, flags=re.DOTALL)
-    if not list_match:
-        return []
-
-    definitions: list[str] = []
-    for raw_item in re.findall(r"<li[^>]*>(.*?)</li>", list_match.group(1), flags=re.DOTALL):
-        text = re.sub(r"<[^>]+>", "", raw_item)
-        text = html_lib.unescape(text)
-        text = text.split("◆", 1)[0]
-        text = _normalize_ws(text)
-        if not text:
-            continue
-        if text.startswith("Отсутствует пример"):
-            continue
-
-        text = _strip_headword_prefix(text, word)
-        if _normalize_for_compare(text) == _normalize_for_compare(word):
-            continue
-
-        if len(text) > MAX_DEFINITION_LENGTH:
-            text = text[: MAX_DEFINITION_LENGTH - 1].rstrip() + "…"
-
-        if text not in definitions:
-            definitions.append(text)
-        if len(definitions) >= MAX_DEFINITIONS:
-            break
-
-    return definitions
-
-
-def _extract_en_definitions(definition_data: dict, word: str) -> list[str]:
-    lang_data = definition_data.get("en", [])
-    if not lang_data and definition_data:
-        first_value = next(iter(definition_data.values()), [])
-        if isinstance(first_value, list):
-            lang_data = first_value
-
-    definitions: list[str] = []
-    for part in lang_data:
-        if not isinstance(part, dict):
-            continue
-        for def_obj in part.get("definitions", []):
-            raw_definition = def_obj.get("definition")
-            if not raw_definition:
-                continue
-
-            text = re.sub(r"<[^>]+>", "", raw_definition)
-            text = re.sub(r"\[\[(?:[^|\]]*\|)?([^\]]+)\]\]", r"\1", text)
-            text = html_lib.unescape(text)
-            text = _normalize_ws(text)
-            if not text:
-                continue
-
-            text = _strip_headword_prefix(text, word)
-            if _normalize_for_compare(text) == _normalize_for_compare(word):
-                continue
-
-            if len(text) > MAX_DEFINITION_LENGTH:
-                text = text[: MAX_DEFINITION_LENGTH - 1].rstrip() + "…"
-
-            if text not in definitions:
-                definitions.append(text)
-            if len(definitions) >= MAX_DEFINITIONS:
-                return definitions
-
-    return definitions
-
-
-async def fetch_definitions(word: str, lang: str) -> list[str]:
-    normalized_word = word.strip().lower()
-    cache_key = (lang, normalized_word)
-    cached_definitions = None
-    async with _definition_cache_lock:
-        if cache_key in DEFINITION_CACHE:
-            DEFINITION_CACHE.move_to_end(cache_key)
-            cached_definitions = DEFINITION_CACHE[cache_key]
-    if cached_definitions is not None:
-        return cached_definitions
-
-    candidates = [normalized_word]
-    if normalized_word:
-        candidates.append(normalized_word.capitalize())
-
-    definitions: list[str] = []
-
-    if lang == "ru":
-        for candidate in candidates:
-            url = (
-                "https://ru.wiktionary.org/w/api.php"
-                f"?action=query&prop=extracts&titles={quote_plus(candidate)}&format=json"
-            )
-            status, payload = await _http_get_json(url)
-            if status != 200 or not payload:
-                continue
-
-            page = next(iter(payload.get("query", {}).get("pages", {}).values()), {})
-            extract_html = page.get("extract", "")
-            definitions = _extract_ru_definitions(extract_html, normalized_word)
-            if definitions:
-                break
-    else:
-        for candidate in candidates:
-            url = f"https://en.wiktionary.org/api/rest_v1/page/definition/{quote_plus(candidate)}"
-            status, payload = await _http_get_json(url)
-            if status != 200 or not payload:
-                continue
-            definitions = _extract_en_definitions(payload, normalized_word)
-            if definitions:
-                break
-
-    async with _definition_cache_lock:
-        cached_definitions = DEFINITION_CACHE.get(cache_key)
-        if cached_definitions is not None:
-            DEFINITION_CACHE.move_to_end(cache_key)
-            return cached_definitions
-        DEFINITION_CACHE[cache_key] = definitions
-        while len(DEFINITION_CACHE) > MAX_DEFINITION_CACHE_SIZE:
-            DEFINITION_CACHE.popitem(last=False)
-    return definitions
+# Regex to match Wiktionary labels at the start:
+# - Words ending with a dot (incl. hyphens): 'разг.', 'с.-х.'
+# - Short specific words without dots: 'сленг', 'табу', 'кино'
+# - Multi-part labels: 'вводн. сл.'
+# It matches sequences of these separated by spaces or commas.
+_LABEL_RE = re.compile(r'^((?:(?:[а-яё0-9-+]+\.|\bсленг\b|\bтабу\b|\bкино\b)\s*,?\s*)+)')
 
 
 def _build_word_message(word: str, lang: str, definitions: list[str] | None = None) -> str:
@@ -227,13 +39,7 @@ def _build_word_message(word: str, lang: str, definitions: list[str] | None = No
             # 3. Bold Wiktionary labels (e.g., 'разг.', 'физ., техн.', 'сленг', 'ж. р.')
             item_escaped = html_lib.escape(item)
             
-            # Regex to match Wiktionary labels at the start:
-            # - Words ending with a dot (incl. hyphens): 'разг.', 'с.-х.'
-            # - Short specific words without dots: 'сленг', 'табу', 'кино'
-            # - Multi-part labels: 'вводн. сл.'
-            # It matches sequences of these separated by spaces or commas.
-            label_regex = r'^((?:(?:[а-яё0-9-+]+\.|\bсленг\b|\bтабу\b|\bкино\b)\s*,?\s*)+)'
-            item_bolded = re.sub(label_regex, r'<b>\1</b>', item_escaped)
+            item_bolded = _LABEL_RE.sub(r'<b>\1</b>', item_escaped)
             
             prefix = f"{index + 1}. " if len(definitions) > 1 else "• "
             spoiler_content += f"{prefix}{item_bolded}\n\n"
@@ -244,21 +50,24 @@ def _build_word_message(word: str, lang: str, definitions: list[str] | None = No
     return message_text
 
 
-def _log_background_task(task: asyncio.Task) -> None:
-    try:
-        task.result()
-    except Exception as exc:
-        logger.error(f"Definition background task failed: {exc}")
-
-
-async def _append_definition_spoiler(message, word: str, lang: str) -> None:
+async def _append_definition_spoiler(message, word: str, lang: str,
+                                     is_current: Callable[[], bool] = lambda: True) -> None:
     definitions = await fetch_definitions(word, lang)
-    if not definitions:
+    # Пока ждали определение, в чате могло появиться новое слово — старое сообщение уже не трогаем
+    if not definitions or not is_current():
         return
 
     updated_text = _build_word_message(word, lang, definitions)
     try:
-        await message.edit_text(updated_text, parse_mode="HTML", disable_web_page_preview=True)
+        # Спойлер — фоновая правка: ответы пользователям уходят раньше неё
+        await message.get_bot().edit_message_text(
+            updated_text,
+            chat_id=message.chat_id,
+            message_id=message.message_id,
+            parse_mode="HTML",
+            disable_web_page_preview=True,
+            rate_limit_args=PRIORITY_BACKGROUND,
+        )
     except BadRequest as exc:
         if "message is not modified" not in str(exc).lower():
             logger.error(f"Failed to edit message with definition: {exc}")
@@ -273,17 +82,31 @@ async def handle_random_word(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await handle_change_dict(update, context)
         return
 
-    word = await get_words_from_dict(active_dict, 1)
-    if word:
-        word_text = word[0]
-        base_message = _build_word_message(word_text, lang)
+    word_text = await draw_word(user_id, active_dict)
+    if word_text:
+        # Если определение уже подгружено заранее — отправляем слово сразу со спойлером
+        known_definitions = peek_cached_definitions(word_text, lang)
+        base_message = _build_word_message(word_text, lang, known_definitions)
         sent_message = await update.message.reply_text(
             base_message,
             parse_mode="HTML",
             disable_web_page_preview=True,
         )
 
-        definition_task = asyncio.create_task(_append_definition_spoiler(sent_message, word_text, lang))
-        definition_task.add_done_callback(_log_background_task)
+        # Новое слово в чате делает неактуальным спойлер для предыдущего: ещё не начатый
+        # снимается из очереди, уже запущенный дождётся определения, но сообщение не тронет
+        chat_id = update.effective_chat.id
+        if known_definitions is not None:
+            definition_edits.supersede(chat_id)
+        else:
+            generation = definition_edits.submit(
+                chat_id,
+                lambda: _append_definition_spoiler(
+                    sent_message, word_text, lang,
+                    lambda: definition_edits.is_current(chat_id, generation),
+                ),
+            )
+        schedule_prefetch(user_id, active_dict, lang)
     else:
-        await update.message.reply_text(get_text('no_words_in_dict', lang))
+        empty_text = 'no_words_for_filter' if user_word_filter.get(user_id) else 'no_words_in_dict'
+        await update.message.reply_text(get_text(empty_text, lang))
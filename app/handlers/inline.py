@@ -0,0 +1,34 @@
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent, LinkPreviewOptions
+from telegram.ext import ContextTypes
+
+from ..config import DEFAULT_LANG, INLINE_RESULTS, INLINE_CACHE_TTL
+from ..data_manager import user_language
+from ..search_index import lookup
+from .game import _build_word_message
+
+
+async def handle_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.inline_query
+    lang = user_language.get(query.from_user.id, DEFAULT_LANG)
+    matches = await lookup(query.query, INLINE_RESULTS)
+
+    results = [
+        InlineQueryResultArticle(
+            id=str(number),
+            title=word,
+            description=dictionary.removesuffix(".txt"),
+            input_message_content=InputTextMessageContent(
+                _build_word_message(word, lang),
+                parse_mode="HTML",
+                link_preview_options=LinkPreviewOptions(is_disabled=True),
+            ),
+        )
+        for number, (word, dictionary) in enumerate(matches)
+    ]
+    # Пустой запрос — случайные слова, их Telegram кэшировать не должен;
+    # текст сообщения зависит от языка пользователя, поэтому ответ личный
+    await query.answer(
+        results,
+        cache_time=int(INLINE_CACHE_TTL) if query.query.strip() else 0,
+        is_personal=True,
+    )
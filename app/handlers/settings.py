@@ -1,24 +1,38 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.error import NetworkError, BadRequest
-import asyncio
-import os
-from ..config import DEFAULT_LANG, logger, DICT_PATH, is_admin
+from ..config import DEFAULT_LANG, logger, is_admin
 from ..texts import get_text
-from ..data_manager import (user_language, user_selected_dict, save_data, 
-                            WORDS_CACHE, get_available_dictionaries)
+from ..mixes import display_name
+from ..data_manager import (user_language, user_selected_dict, user_word_filter, save_user, reset_deck,
+                            add_words, get_available_dictionaries)
+from ..word_filter import LENGTH_PRESETS, make_filter
 from .ui import (get_settings_inline_keyboard, get_dict_selection_inline_keyboard, 
-                 get_lang_inline_keyboard)
+                 get_lang_inline_keyboard, get_filter_inline_keyboard)
+
+def describe_word_filter(word_filter: list | None, lang: str) -> str:
+    if not word_filter:
+        return get_text('filter_none', lang)
+    min_letters, max_letters, single_only = word_filter
+    parts = []
+    if max_letters:
+        parts.append(get_text('filter_letters', lang).format(min=min_letters, max=max_letters))
+    elif min_letters:
+        parts.append(get_text('filter_letters_min', lang).format(min=min_letters))
+    if single_only:
+        parts.append(get_text('filter_single_only', lang))
+    return ", ".join(parts)
 
 async def show_settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     lang = user_language.get(user_id, DEFAULT_LANG)
-    active_dict = user_selected_dict.get(user_id, "N/A")
+    active_dict = display_name(user_selected_dict.get(user_id, "N/A"))
     lang_name = "🇷🇺 Русский" if lang == "ru" else "🇬🇧 English"
     
     text = get_text('settings_info', lang).format(
         lang_name=lang_name,
-        dict_name=active_dict
+        dict_name=active_dict,
+        filter_desc=describe_word_filter(user_word_filter.get(user_id), lang)
     )
     keyboard = get_settings_inline_keyboard(lang)
     
@@ -30,13 +44,8 @@ async def show_settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def handle_change_dict(update: Update, context: ContextTypes.DEFAULT_TYPE, is_inline=False):
     user_id = update.effective_user.id
     lang = user_language.get(user_id, DEFAULT_LANG)
-    keyboard = await get_dict_selection_inline_keyboard("set_default_dict")
-    
     # Add a back button to settings if it's coming from settings
-    if is_inline:
-        inline_kb = list(keyboard.inline_keyboard)
-        inline_kb.append([InlineKeyboardButton(get_text('btn_back_to_game', lang), callback_data="settings_back")])
-        keyboard = InlineKeyboardMarkup(inline_kb)
+    keyboard = await get_dict_selection_inline_keyboard("set_default_dict", lang if is_inline else None, with_mixes=True)
 
     reply_target = update.message or update.callback_query.message
     if update.callback_query:
@@ -44,6 +53,27 @@ async def handle_change_dict(update: Update, context: ContextTypes.DEFAULT_TYPE,
     else:
         await reply_target.reply_text(get_text('available_dicts', lang), reply_markup=keyboard)
 
+async def handle_word_filter(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    lang = user_language.get(user_id, DEFAULT_LANG)
+    word_filter = user_word_filter.get(user_id)
+    text = get_text('filter_prompt', lang).format(filter_desc=describe_word_filter(word_filter, lang))
+    try:
+        await update.callback_query.edit_message_text(text, reply_markup=get_filter_inline_keyboard(lang, word_filter))
+    except BadRequest as exc:
+        # Повторное нажатие на уже выбранный вариант
+        if "message is not modified" not in str(exc).lower():
+            raise
+
+def _set_word_filter(user_id: int, word_filter: list | None) -> None:
+    if word_filter is None:
+        user_word_filter.pop(user_id, None)
+    else:
+        user_word_filter[user_id] = word_filter
+    # Колода строилась по старой выборке слов
+    reset_deck(user_id)
+    save_user(user_id)
+
 async def handle_change_lang(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     lang = user_language.get(user_id, DEFAULT_LANG)
@@ -77,6 +107,21 @@ async def button_callback_handler(update: Update, context: ContextTypes.DEFAULT_
         await handle_change_dict(update, context, is_inline=True)
         return
     
+    if data == "settings_filter":
+        await handle_word_filter(update, context)
+        return
+
+    if data.startswith("set_filter_len:") or data == "set_filter_single":
+        min_letters, max_letters, single_only = user_word_filter.get(user_id) or (0, 0, False)
+        if data == "set_filter_single":
+            single_only = not single_only
+        else:
+            min_letters, max_letters = LENGTH_PRESETS.get(data.split(":", 1)[1], (0, 0))
+        _set_word_filter(user_id, make_filter(min_letters, max_letters, single_only))
+        logger.info(f"User {user_id} set word filter to {user_word_filter.get(user_id)}")
+        await handle_word_filter(update, context)
+        return
+
     if data == "settings_back":
         await show_settings_menu(update, context)
         return
@@ -88,7 +133,7 @@ async def button_callback_handler(update: Update, context: ContextTypes.DEFAULT_
     if data.startswith("set_lang:"):
         lang = data.split(":")[1]
         user_language[user_id] = lang
-        await save_data(user_language, user_selected_dict)
+        save_user(user_id)
         logger.info(f"User {user_id} set language to {lang}")
         
         # If it was an initial setup, proceed to dict choice
@@ -110,25 +155,23 @@ async def button_callback_handler(update: Update, context: ContextTypes.DEFAULT_
         dict_name = data.split(":", 1)[1]
         words = context.user_data.get('words_to_add', [])
         if words:
-            def append_words_to_file():
-                with open(os.path.join(DICT_PATH, dict_name), 'a', encoding='utf-8') as f:
-                    for word in words:
-                        f.write(f"\n{word}")
-            await asyncio.to_thread(append_words_to_file)
-            
-            if dict_name in WORDS_CACHE:
-                del WORDS_CACHE[dict_name]
-
-            await query.edit_message_text(get_text('addword_success', lang).format(dict_name=dict_name))
+            added, skipped = await add_words(dict_name, words)
+            logger.info(f"User {user_id} added {len(added)} words to {dict_name}, {skipped} skipped")
+            await query.edit_message_text(
+                get_text('addword_success', lang).format(dict_name=dict_name) + "\n" +
+                get_text('addword_stats', lang).format(added=len(added), skipped=skipped)
+            )
             context.user_data.clear()
             await show_main_menu_and_welcome(update, context)
         return ConversationHandler.END
 
     if data.startswith("set_default_dict:"):
-        dict_name = data.split(":")[1]
+        # У набора в callback_data свой префикс: "set_default_dict:mix:<название>"
+        dict_name = data.split(":", 1)[1]
         user_selected_dict[user_id] = dict_name
-        await save_data(user_language, user_selected_dict)
+        reset_deck(user_id)
+        save_user(user_id)
         logger.info(f"User {user_id} set default dict to {dict_name}")
-        await query.edit_message_text(get_text('dict_changed', lang).format(dict=dict_name), parse_mode='HTML')
+        await query.edit_message_text(get_text('dict_changed', lang).format(dict=display_name(dict_name)), parse_mode='HTML')
         await show_main_menu_and_welcome(update, context)
         return
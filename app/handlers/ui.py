@@ -1,6 +1,9 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
 from ..texts import get_text
 from ..data_manager import get_available_dictionaries
+from .. import dict_registry
+from ..mixes import available_mixes
+from ..word_filter import LENGTH_PRESETS, length_preset
 
 def get_main_reply_keyboard(lang: str) -> ReplyKeyboardMarkup:
     keyboard = [
@@ -15,6 +18,7 @@ def get_settings_inline_keyboard(lang: str) -> InlineKeyboardMarkup:
             InlineKeyboardButton(get_text('btn_change_lang', lang), callback_data="settings_lang"),
             InlineKeyboardButton(get_text('btn_change_dict', lang), callback_data="settings_dict")
         ],
+        [InlineKeyboardButton(get_text('btn_word_filter', lang), callback_data="settings_filter")],
         [InlineKeyboardButton(get_text('btn_close', lang), callback_data="settings_close")]
     ]
     return InlineKeyboardMarkup(keyboard)
@@ -26,8 +30,52 @@ def get_lang_inline_keyboard(action_prefix: str = "set_lang") -> InlineKeyboardM
     ]]
     return InlineKeyboardMarkup(keyboard)
 
-async def get_dict_selection_inline_keyboard(action_prefix: str) -> InlineKeyboardMarkup:
-
-    dictionaries = await get_available_dictionaries()
-    keyboard = [[InlineKeyboardButton(d.replace('.txt', ''), callback_data=f"{action_prefix}:{d}")] for d in dictionaries]
+def get_filter_inline_keyboard(lang: str, word_filter: list | None) -> InlineKeyboardMarkup:
+    current = length_preset(word_filter)
+    single_only = bool(word_filter and word_filter[2])
+    lengths = [
+        InlineKeyboardButton(
+            ("✅ " if name == current else "") + (get_text('filter_any_length', lang) if name == "any" else name),
+            callback_data=f"set_filter_len:{name}",
+        )
+        for name in LENGTH_PRESETS
+    ]
+    keyboard = [
+        lengths,
+        [InlineKeyboardButton(("✅ " if single_only else "⬜ ") + get_text('btn_filter_single', lang),
+                              callback_data="set_filter_single")],
+        [InlineKeyboardButton(get_text('btn_back_to_game', lang), callback_data="settings_back")],
+    ]
     return InlineKeyboardMarkup(keyboard)
+
+# Готовые клавиатуры выбора словаря: (action_prefix, язык кнопки «назад» или None, с наборами) -> разметка
+_dict_keyboards: dict[tuple[str, str | None, bool], InlineKeyboardMarkup] = {}
+
+
+def _drop_dict_keyboards(changed: set[str], listing_changed: bool) -> None:
+    if listing_changed:
+        _dict_keyboards.clear()
+
+dict_registry.add_listener(_drop_dict_keyboards)
+
+
+async def get_dict_selection_inline_keyboard(action_prefix: str, back_lang: str | None = None,
+                                             with_mixes: bool = False) -> InlineKeyboardMarkup:
+    """Dictionary picker; with back_lang it ends with a "back to settings" button in that language.
+
+    with_mixes adds the weighted mixes that have at least one member dictionary available.
+    """
+    key = (action_prefix, back_lang, with_mixes)
+    keyboard = _dict_keyboards.get(key)
+    if keyboard is None:
+        dictionaries = await get_available_dictionaries()
+        rows = [[InlineKeyboardButton(d.replace('.txt', ''), callback_data=f"{action_prefix}:{d}")] for d in dictionaries]
+        if with_mixes:
+            rows += [
+                [InlineKeyboardButton(f"🔀 {mix.name}", callback_data=f"{action_prefix}:{mix.key}")]
+                for mix in available_mixes() if not set(mix.members).isdisjoint(dictionaries)
+            ]
+        if back_lang is not None:
+            rows.append([InlineKeyboardButton(get_text('btn_back_to_game', back_lang), callback_data="settings_back")])
+        keyboard = _dict_keyboards[key] = InlineKeyboardMarkup(rows)
+    return keyboard
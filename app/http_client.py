@@ -0,0 +1,60 @@
+import asyncio
+from urllib.parse import urlsplit
+
+import httpx
+
+from .config import HTTP_MAX_CONCURRENCY, HTTP_MAX_PER_HOST, HTTP_KEEPALIVE_EXPIRY, logger
+
+# Один долгоживущий клиент с keep-alive пулом на всё приложение
+_client: httpx.AsyncClient | None = None
+_global_limit: asyncio.Semaphore | None = None
+_host_limits: dict[str, asyncio.Semaphore] = {}
+
+
+def _create_client(transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONCURRENCY,
+        max_keepalive_connections=HTTP_MAX_CONCURRENCY,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(limits=limits, follow_redirects=True, transport=transport)
+
+
+async def init_http_client(transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    global _client, _global_limit
+    if _client is None:
+        _client = _create_client(transport)
+        _global_limit = asyncio.Semaphore(HTTP_MAX_CONCURRENCY)
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client, _global_limit
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _global_limit = None
+    _host_limits.clear()
+
+
+def _host_limit(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    limit = _host_limits.get(host)
+    if limit is None:
+        limit = _host_limits[host] = asyncio.Semaphore(HTTP_MAX_PER_HOST)
+    return limit
+
+
+async def get_json(url: str, timeout: float, headers: dict | None = None) -> tuple[int | None, dict | None]:
+    client = await init_http_client()
+    try:
+        # Таймаут покрывает и ожидание слота в пуле, и сам запрос
+        async with asyncio.timeout(timeout):
+            async with _global_limit, _host_limit(url):
+                response = await client.get(url, headers=headers, timeout=timeout)
+                if response.status_code != 200:
+                    return response.status_code, None
+                return response.status_code, response.json()
+    except (TimeoutError, httpx.HTTPError, ValueError) as exc:
+        logger.debug(f"HTTP request failed for url={url}: {exc!r}")
+        return None, None
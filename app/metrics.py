@@ -0,0 +1,303 @@
+"""In-process metrics with Prometheus text exposition.
+
+Updates are plain dict operations on the event loop thread, cheap enough to stay
+on in production. Values that already live elsewhere (scheduler and rate limiter
+stats) are read by collectors only when the metrics are rendered.
+"""
+import asyncio
+import functools
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+
+from .config import logger
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics: list["_Metric"] = []
+# Функции, которые при выгрузке отдают сэмплы: (имя, тип, описание, метки, значение)
+_collectors: list[Callable[[], Iterable[tuple[str, str, str, dict, float]]]] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        _metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [счётчики по корзинам (+Inf последней), сумма, количество]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def time(self, **labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def quantile(self, q: float, **labels) -> float | None:
+        """Estimate from the buckets: upper bound of the bucket holding the q-th observation."""
+        entry = self.values.get(self._key(labels))
+        if entry is None or entry[2] == 0:
+            return None
+        rank = q * entry[2]
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), entry[0]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        for key, (counts, total, count) in self.values.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+def register_collector(collector: Callable[[], Iterable[tuple[str, str, str, dict, float]]]) -> None:
+    _collectors.append(collector)
+
+
+# --- Метрики приложения ---
+
+HANDLER_LATENCY = Histogram("alias_handler_duration_seconds", "Update handler latency", ("handler",))
+HANDLER_CALLS = Counter("alias_handler_calls_total", "Update handler calls by outcome", ("handler", "status"))
+CACHE_HITS = Counter("alias_cache_hits_total", "In-memory cache hits", ("cache",))
+CACHE_MISSES = Counter("alias_cache_misses_total", "In-memory cache misses", ("cache",))
+CACHE_EVICTIONS = Counter("alias_cache_evictions_total", "In-memory cache evictions", ("cache",))
+WIKTIONARY_LATENCY = Histogram("alias_wiktionary_request_duration_seconds", "Wiktionary request latency", ("lang",))
+WIKTIONARY_RESPONSES = Counter("alias_wiktionary_responses_total", "Wiktionary responses by HTTP status", ("lang", "status"))
+SAVE_DURATION = Histogram("alias_state_save_duration_seconds", "Duration of flushing dirty users to the state backend")
+SAVED_USERS = Counter("alias_state_saved_users_total", "Users written to the state backend")
+
+
+def instrument_handler(callback):
+    """Wraps a PTB callback to record its latency and outcome under its function name."""
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await callback(update, context)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, handler=name)
+            HANDLER_CALLS.inc(handler=name, status=status)
+
+    return wrapper
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in _metrics:
+        if not metric.values:
+            continue
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in metric.samples())
+
+    described = set()
+    for collector in _collectors:
+        try:
+            samples = list(collector())
+        except Exception as exc:
+            logger.warning(f"Metrics collector {collector!r} failed: {exc}")
+            continue
+        for name, kind, help_text, labels, value in samples:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _ratio(hits: float, misses: float) -> str:
+    total = hits + misses
+    return f"{hits / total:.0%} of {int(total)}" if total else "n/a"
+
+
+def _ms(value: float | None) -> str:
+    if value is None:
+        return "-"
+    return ">10s" if value == float("inf") else f"≤{value * 1000:.0f}ms"
+
+
+def render_summary() -> str:
+    """Short human-readable digest for the /stats command."""
+    lines = ["Handlers (calls, errors, p50, p95):"]
+    for (handler,), (_, _, count) in sorted(HANDLER_LATENCY.values.items()):
+        errors = int(HANDLER_CALLS.get(handler=handler, status="error"))
+        lines.append(
+            f"  {handler}: {count}, {errors}, "
+            f"{_ms(HANDLER_LATENCY.quantile(0.5, handler=handler))}, {_ms(HANDLER_LATENCY.quantile(0.95, handler=handler))}"
+        )
+
+    lines.append("Caches (hit ratio, evictions):")
+    caches = sorted({key[0] for key in CACHE_HITS.values} | {key[0] for key in CACHE_MISSES.values})
+    for cache in caches:
+        lines.append(
+            f"  {cache}: {_ratio(CACHE_HITS.get(cache=cache), CACHE_MISSES.get(cache=cache))}, "
+            f"{int(CACHE_EVICTIONS.get(cache=cache))}"
+        )
+
+    lines.append("Wiktionary (status: count):")
+    for (lang, status), count in sorted(WIKTIONARY_RESPONSES.values.items()):
+        lines.append(f"  {lang} {status}: {int(count)}")
+    for (lang,), _ in sorted(WIKTIONARY_LATENCY.values.items()):
+        lines.append(
+            f"  {lang} p50 {_ms(WIKTIONARY_LATENCY.quantile(0.5, lang=lang))}, "
+            f"p95 {_ms(WIKTIONARY_LATENCY.quantile(0.95, lang=lang))}"
+        )
+
+    save_count = SAVE_DURATION.values.get((), [None, 0.0, 0])[2]
+    lines.append(
+        f"State saves: {save_count}, users {int(SAVED_USERS.get())}, p95 {_ms(SAVE_DURATION.quantile(0.95))}"
+    )
+
+    grouped: dict[str, list[str]] = {}
+    for collector in _collectors:
+        try:
+            samples = list(collector())
+        except Exception:
+            continue
+        for name, _, _, labels, value in samples:
+            label_text = "/".join(str(item) for item in labels.values())
+            grouped.setdefault(name.removeprefix("alias_"), []).append(
+                f"{label_text}={_format_value(value)}" if label_text else _format_value(value)
+            )
+    lines.extend(f"{name}: {', '.join(values)}" for name, values in grouped.items())
+    return "\n".join(lines)
+
+
+# --- HTTP-эндпоинт для Prometheus ---
+
+async def _handle_metrics_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        # Заголовки запроса нам не нужны, но их надо дочитать
+        while (await asyncio.wait_for(reader.readline(), 5)).strip():
+            pass
+        parts = request_line.decode(errors="replace").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/metrics", "/"):
+            body = render_prometheus().encode()
+            status = "200 OK"
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = b"not found\n"
+            status = "404 Not Found"
+            content_type = "text/plain"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+_server: asyncio.AbstractServer | None = None
+
+
+async def start_metrics_server(host: str, port: int) -> None:
+    global _server
+    if port <= 0 or _server is not None:
+        return
+    try:
+        _server = await asyncio.start_server(_handle_metrics_request, host, port)
+    except OSError as exc:
+        logger.error(f"Could not start metrics endpoint on {host}:{port}: {exc}")
+        return
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+
+
+async def stop_metrics_server() -> None:
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
@@ -0,0 +1,148 @@
+"""Named mixes of several dictionaries with weights, e.g. 50% Easy, 35% Normal, 15% Hard.
+
+A user who picked a mix has "mix:<name>" in user_selected_dict. A draw first picks the
+member dictionary from a Walker alias table (one uniform number, O(1) for any number of
+members), then a word inside that dictionary, so words are never copied into a merged
+list. The table only depends on the weights and on which members exist; it is rebuilt
+when the registry reports that a member dictionary changed. A user with a word filter
+draws from a table over the members that still have words after the filter, so an
+emptied member is never picked.
+"""
+import json
+
+from .config import DICT_MIXES_FILE, logger
+from . import dict_registry
+
+MIX_PREFIX = "mix:"
+
+
+class AliasTable:
+    """Walker's alias method (Vose's construction) over non-negative weights."""
+    __slots__ = ("probability", "alias")
+
+    def __init__(self, weights: list[float]):
+        count = len(weights)
+        total = sum(weights)
+        self.probability = [0.0] * count
+        self.alias = list(range(count))
+        if total <= 0:
+            return
+        scaled = [weight * count / total for weight in weights]
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self.probability[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+        # Остатки — ровно 1 с точностью до округления; словарь с нулевым весом не выпадает никогда
+        heaviest = max(range(count), key=weights.__getitem__)
+        for index in small + large:
+            if weights[index] > 0:
+                self.probability[index] = 1.0
+            else:
+                self.alias[index] = heaviest
+
+    def sample(self, u: float) -> int:
+        """Column from the integer part of u * n, alias or not from the fractional part."""
+        scaled = u * len(self.probability)
+        column = int(scaled)
+        return column if scaled - column < self.probability[column] else self.alias[column]
+
+
+class Mix:
+    __slots__ = ("name", "members", "weights", "_table")
+
+    def __init__(self, name: str, members: list[str], weights: list[float]):
+        self.name = name
+        self.members = members
+        self.weights = weights
+        self._table: AliasTable | None = None
+
+    @property
+    def key(self) -> str:
+        return MIX_PREFIX + self.name
+
+    def table(self) -> AliasTable | None:
+        """Alias table over the members present in DICT_PATH; None if none of them is."""
+        if self._table is None:
+            weights = [
+                weight if (info := dict_registry.info(member)) is not None and info.size > 0 else 0.0
+                for member, weight in zip(self.members, self.weights)
+            ]
+            if not any(weights):
+                return None
+            self._table = AliasTable(weights)
+        return self._table
+
+    def filtered_table(self, sizes: list[int]) -> AliasTable | None:
+        """Alias table over the members with words left after a filter; sizes are the filtered lengths."""
+        weights = [weight if size > 0 else 0.0 for weight, size in zip(self.weights, sizes)]
+        return AliasTable(weights) if any(weights) else None
+
+
+_mixes: dict[str, Mix] = {}
+
+
+def load_mixes(path: str = DICT_MIXES_FILE) -> None:
+    _mixes.clear()
+    try:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as exc:
+        logger.error(f"Could not read dictionary mixes from {path}: {exc}")
+        return
+
+    for name, members in config.items():
+        try:
+            weights = {member: float(weight) for member, weight in members.items() if float(weight) > 0}
+        except (AttributeError, TypeError, ValueError):
+            logger.warning(f"Mix {name!r} must map dictionary files to numeric weights, skipping it.")
+            continue
+        if not weights:
+            logger.warning(f"Mix {name!r} has no members with a positive weight, skipping it.")
+            continue
+        _mixes[name] = Mix(name, list(weights), list(weights.values()))
+    logger.info(f"Loaded {len(_mixes)} dictionary mixes from {path}")
+
+
+def is_mix(selection: str | None) -> bool:
+    return bool(selection) and selection.startswith(MIX_PREFIX)
+
+
+def get_mix(selection: str) -> Mix | None:
+    return _mixes.get(selection.removeprefix(MIX_PREFIX))
+
+
+def available_mixes() -> list[Mix]:
+    return [_mixes[name] for name in sorted(_mixes)]
+
+
+def mixes_with(filename: str) -> list[str]:
+    """Selection keys of the mixes that draw from this dictionary."""
+    return [mix.key for mix in _mixes.values() if filename in mix.members]
+
+
+def display_name(selection: str) -> str:
+    if is_mix(selection):
+        return f"🔀 {selection.removeprefix(MIX_PREFIX)}"
+    return selection
+
+
+def _on_dictionaries_changed(changed: set[str], listing_changed: bool) -> None:
+    for mix in _mixes.values():
+        if not changed.isdisjoint(mix.members):
+            mix._table = None
+
+
+def _on_dictionary_appended(name: str) -> None:
+    # Пустой словарь после /addword перестаёт иметь нулевой вес
+    _on_dictionaries_changed({name}, False)
+
+dict_registry.add_listener(_on_dictionaries_changed)
+dict_registry.add_append_listener(_on_dictionary_appended)
+
+load_mixes()
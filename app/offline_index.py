@@ -0,0 +1,247 @@
+"""Офлайн-индекс определений из локального дампа Викисловаря.
+
+    python -m app.offline_index --lang ru --dump ruwiktionary-latest-pages-articles.xml.bz2
+
+Дамп читается потоково (XML MediaWiki или JSONL, можно .bz2/.gz), разбираются
+только страницы со словами из установленных словарей.
+"""
+import os
+import bz2
+import gzip
+import json
+import time
+import argparse
+import multiprocessing
+import xml.etree.ElementTree as ET
+from bisect import bisect_left
+from collections import deque
+
+from .config import DICT_PATH, OFFLINE_DEFINITIONS_FILE, logger
+from .dict_index import DictionaryIndex, write_index, iter_source_words
+from .wiktionary import (ru_definitions_from_wikitext, en_definitions_from_wikitext,
+                         _extract_ru_definitions, _extract_en_definitions)
+
+# Запись индекса: "lang\x1fword\x1fdef1\x1edef2...", записи отсортированы по "lang\x1fword"
+_FIELD_SEP = "\x1f"
+_DEF_SEP = "\x1e"
+
+
+def _entry_key(entry: str) -> str:
+    return entry[:entry.index(_FIELD_SEP, entry.index(_FIELD_SEP) + 1)]
+
+
+class OfflineDefinitionIndex:
+    def __init__(self, index: DictionaryIndex, mtime_ns: int):
+        self._index = index
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def open(cls, path: str) -> "OfflineDefinitionIndex":
+        mtime_ns = os.stat(path).st_mtime_ns
+        return cls(DictionaryIndex.open(path), mtime_ns)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, lang: str, word: str) -> list[str] | None:
+        key = f"{lang}{_FIELD_SEP}{word}"
+        position = bisect_left(self._index, key, key=_entry_key)
+        if position < len(self._index):
+            entry = self._index[position]
+            if _entry_key(entry) == key:
+                return entry[len(key) + 1:].split(_DEF_SEP)
+        return None
+
+    def entries(self):
+        return iter(self._index)
+
+
+def refresh_offline_index(path: str, current: OfflineDefinitionIndex | None) -> OfflineDefinitionIndex | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if current is not None and current.mtime_ns == stat.st_mtime_ns:
+        return current
+    try:
+        return OfflineDefinitionIndex.open(path)
+    except (OSError, ValueError) as exc:
+        logger.error(f"Failed to open offline definition index {path}: {exc}")
+        return current
+
+
+# --- Чтение дампа ---
+
+def _open_dump(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def iter_xml_pages(stream):
+    context = ET.iterparse(stream, events=("start", "end"))
+    _, root = next(context)
+    title = namespace = text = None
+    for event, elem in context:
+        if event != "end":
+            continue
+        tag = elem.tag.rsplit("}", 1)[-1]
+        if tag == "title":
+            title = elem.text
+        elif tag == "ns":
+            namespace = elem.text
+        elif tag == "text":
+            text = elem.text
+        elif tag == "page":
+            if namespace == "0" and title and text:
+                yield title, "text", text
+            title = namespace = text = None
+            # Без этого iterparse держит в памяти всё дерево дампа
+            root.clear()
+
+
+def iter_jsonl_pages(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        title = record.get("title") or record.get("word")
+        if not title:
+            continue
+        for kind in ("text", "extract", "definition", "senses"):
+            if record.get(kind):
+                yield title, kind, record[kind]
+                break
+
+
+def iter_dump_pages(path: str):
+    base_path = path.removesuffix(".bz2").removesuffix(".gz")
+    with _open_dump(path) as stream:
+        head = stream.peek(1)[:1]
+        if base_path.endswith((".jsonl", ".json")) or head == b"{":
+            yield from iter_jsonl_pages(stream)
+        else:
+            yield from iter_xml_pages(stream)
+
+
+# --- Разбор страниц (в дочерних процессах) ---
+
+def _parse_page(lang: str, kind: str, content, word: str) -> list[str]:
+    if kind == "text":
+        # Страница, где толкование целиком стоит на нераскрытом шаблоне, в индекс не попадает:
+        # такое слово разберёт онлайн-путь, а не покажет урезанный список
+        if lang == "ru":
+            return ru_definitions_from_wikitext(content, word, strict=True)
+        return en_definitions_from_wikitext(content, word, strict=True)
+    if kind == "extract":
+        return _extract_ru_definitions(content, word)
+    if kind == "definition":
+        return _extract_en_definitions(content, word)
+    # JSONL в духе wiktextract: {"word": ..., "senses": [{"glosses": [...]}]}
+    glosses = [{"definition": gloss} for sense in content for gloss in sense.get("glosses", [])[:1]]
+    return _extract_en_definitions({lang: [{"definitions": glosses}]}, word)
+
+
+def _parse_batch(lang: str, batch: list[tuple[str, str, object]]) -> list[tuple[str, bool, list[str]]]:
+    parsed = []
+    for title, kind, content in batch:
+        word = title.strip().lower()
+        try:
+            definitions = _parse_page(lang, kind, content, word)
+        except Exception:
+            continue
+        definitions = [
+            item.replace(_FIELD_SEP, " ").replace(_DEF_SEP, " ") for item in definitions
+        ]
+        if definitions:
+            parsed.append((word, title.strip() == word, definitions))
+    return parsed
+
+
+def _merge(results: dict[str, tuple[bool, list[str]]], parsed) -> None:
+    for word, exact_title, definitions in parsed:
+        # Как и онлайн-запрос, предпочитаем страницу со словом в нижнем регистре
+        current = results.get(word)
+        if current is None or (exact_title and not current[0]):
+            results[word] = (exact_title, definitions)
+
+
+def _dictionary_words(dict_path: str) -> set[str]:
+    words: set[str] = set()
+    for filename in sorted(os.listdir(dict_path)):
+        if filename.endswith(".txt"):
+            words.update(word.lower() for word in iter_source_words(os.path.join(dict_path, filename)))
+    return words
+
+
+def build_offline_index(dump_path: str, lang: str, output_path: str, dict_path: str = DICT_PATH,
+                        processes: int = 1, batch_size: int = 64) -> int:
+    words = _dictionary_words(dict_path)
+    results: dict[str, tuple[bool, list[str]]] = {}
+    scanned = 0
+
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    pending = deque()
+    try:
+        batch = []
+        for title, kind, content in iter_dump_pages(dump_path):
+            scanned += 1
+            if title.strip().lower() not in words:
+                continue
+            batch.append((title, kind, content))
+            if len(batch) < batch_size:
+                continue
+            if pool is None:
+                _merge(results, _parse_batch(lang, batch))
+            else:
+                pending.append(pool.apply_async(_parse_batch, (lang, batch)))
+                # Ограничиваем число пачек в полёте, чтобы память не росла вместе с дампом
+                while len(pending) > processes * 2:
+                    _merge(results, pending.popleft().get())
+            batch = []
+        if batch:
+            _merge(results, _parse_batch(lang, batch))
+        while pending:
+            _merge(results, pending.popleft().get())
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    entries = [
+        f"{lang}{_FIELD_SEP}{word}{_FIELD_SEP}{_DEF_SEP.join(definitions)}"
+        for word, (_, definitions) in results.items()
+    ]
+    # Записи других языков из прошлого запуска сохраняем
+    existing = refresh_offline_index(output_path, None)
+    if existing is not None:
+        prefix = f"{lang}{_FIELD_SEP}"
+        entries.extend(entry for entry in existing.entries() if not entry.startswith(prefix))
+    entries.sort(key=_entry_key)
+    write_index(output_path, entries)
+    logger.info(f"Scanned {scanned} pages, indexed {len(results)} {lang} words into {output_path}.")
+    return len(results)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the offline definition index from a Wiktionary dump.")
+    parser.add_argument("--dump", required=True, help="Path to a MediaWiki XML or JSONL dump (.bz2/.gz allowed)")
+    parser.add_argument("--lang", required=True, choices=["ru", "en"], help="Language of the Wiktionary the dump comes from")
+    parser.add_argument("--output", default=OFFLINE_DEFINITIONS_FILE)
+    parser.add_argument("--dict-path", default=DICT_PATH)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    build_offline_index(args.dump, args.lang, args.output, args.dict_path, max(1, args.processes))
+    logger.info(f"Done in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
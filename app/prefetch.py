@@ -0,0 +1,48 @@
+import time
+from collections import OrderedDict
+
+from .config import PREFETCH_MAX_DEPTH, PREFETCH_HORIZON
+from .data_manager import peek_next_words
+from .definitions import fetch_definitions_batch
+from .tasks import prefetch_jobs
+
+# Интервал между запросами слов (EMA) по пользователям: user_id -> (время прошлого запроса, EMA),
+# от давно молчавших к недавним
+_request_pace: OrderedDict[int, tuple[float, float]] = OrderedDict()
+_PACE_SMOOTHING = 0.3
+# Дольше этого пауза в EMA всё равно не учитывается — такую запись можно забыть
+_PACE_WINDOW = PREFETCH_HORIZON * 4
+
+
+def record_word_request(user_id: int) -> int:
+    """Updates the user's request pace and returns how many upcoming words to prefetch."""
+    now = time.monotonic()
+    previous = _request_pace.get(user_id)
+    if previous is None:
+        interval = PREFETCH_HORIZON
+    else:
+        last_seen, pace = previous
+        interval = pace + _PACE_SMOOTHING * (min(now - last_seen, _PACE_WINDOW) - pace)
+    _request_pace[user_id] = (now, interval)
+    _request_pace.move_to_end(user_id)
+    while _request_pace:
+        oldest, (last_seen, _) = next(iter(_request_pace.items()))
+        if now - last_seen <= _PACE_WINDOW:
+            break
+        del _request_pace[oldest]
+    # Чем чаще пользователь жмёт кнопку, тем больше слов держим готовыми
+    return max(1, min(PREFETCH_MAX_DEPTH, round(PREFETCH_HORIZON / max(interval, 0.1))))
+
+
+async def _prefetch(user_id: int, filename: str, lang: str, depth: int) -> None:
+    words = await peek_next_words(user_id, filename, depth)
+    if words:
+        await fetch_definitions_batch(words, lang)
+
+
+def schedule_prefetch(user_id: int, filename: str, lang: str) -> None:
+    depth = record_word_request(user_id)
+    if PREFETCH_MAX_DEPTH <= 0:
+        return
+    # Новая предзагрузка для пользователя заменяет ещё не выполненную старую
+    prefetch_jobs.submit(user_id, lambda: _prefetch(user_id, filename, lang, depth))
@@ -0,0 +1,208 @@
+"""On-demand sampling profiler for the running bot (admin /profile command).
+
+A background thread samples the event loop thread's stack at a fixed interval,
+a heartbeat coroutine on the loop detects when the loop is blocked, and
+tracemalloc compares allocations before and after. Everything is switched off
+again when the window ends.
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+import tracemalloc
+from collections import Counter
+
+from .metrics import instrument_handler
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+# Кадр обёртки обработчика: по нему находим, какой обработчик сейчас выполняется
+_HANDLER_WRAPPER_CODE = instrument_handler(lambda update, context: None).__code__
+_labels: dict = {}
+_lock = asyncio.Lock()
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        if path.startswith(_REPO_ROOT):
+            path = path[len(_REPO_ROOT):]
+        elif "site-packages" + os.sep in path:
+            path = path.split("site-packages" + os.sep, 1)[1]
+        else:
+            path = os.path.basename(path)
+        label = _labels[code] = f"{path}:{code.co_name}"
+    return label
+
+
+def _is_idle(label: str) -> bool:
+    # Цикл ждёт событий в селекторе — это простой, а не работа
+    return label.startswith("selectors.py:") and label.rsplit(":", 1)[1] in ("select", "poll", "_poll")
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id: int, interval: float, threshold: float):
+        super().__init__(name="alias-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.threshold = threshold
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.last_beat = time.perf_counter()
+        self.slow: list[dict] = []
+        self._blocked: dict | None = None
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+        self._finish_block()
+
+    def _walk(self, frame) -> tuple[list[str], str | None, bool]:
+        labels = []
+        handler = None
+        child = None
+        while frame is not None:
+            code = frame.f_code
+            if code is _HANDLER_WRAPPER_CODE and handler is None and child is not None:
+                handler = child.f_code.co_name
+            labels.append(_label(code))
+            child = frame
+            frame = frame.f_back
+        labels.reverse()
+        return labels, handler, _is_idle(labels[-1])
+
+    def _finish_block(self) -> None:
+        if self._blocked is not None:
+            self.slow.append(self._blocked)
+            self._blocked = None
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels, handler, idle = self._walk(frame)
+            del frame
+            self.samples += 1
+            self.stacks[";".join(labels)] += 1
+            if idle:
+                self.idle_samples += 1
+
+            # Сердцебиение не обновлялось дольше порога — цикл чем-то занят
+            lag = time.perf_counter() - self.last_beat - self.interval
+            if lag > self.threshold and not idle:
+                if self._blocked is None:
+                    app_frames = [label for label in labels if label.startswith(("app", "main"))]
+                    self._blocked = {
+                        "duration": lag,
+                        "handler": handler,
+                        "where": app_frames[-1] if app_frames else labels[-1],
+                        "leaf": labels[-1],
+                    }
+                else:
+                    self._blocked["duration"] = lag
+                    self._blocked["handler"] = self._blocked["handler"] or handler
+            else:
+                self._finish_block()
+
+
+async def _heartbeat(sampler: _Sampler) -> None:
+    while True:
+        sampler.last_beat = time.perf_counter()
+        await asyncio.sleep(sampler.interval)
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    # Собственные аллокации профилировщика в отчёт не попадают
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, threading.__file__),
+    ))
+
+
+def is_running() -> bool:
+    return _lock.locked()
+
+
+async def profile(seconds: float, interval: float = 0.005, threshold: float = 0.1,
+                  top: int = 25) -> tuple[str, str]:
+    """Profiles the event loop for `seconds` and returns (text report, collapsed stacks)."""
+    async with _lock:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            # Один кадр на аллокацию: для сравнения по строкам больше не нужно, а накладные расходы ниже
+            tracemalloc.start(1)
+        before = _snapshot()
+
+        sampler = _Sampler(threading.get_ident(), interval, threshold)
+        heartbeat = asyncio.create_task(_heartbeat(sampler))
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            await asyncio.to_thread(sampler.stop)
+            elapsed = time.perf_counter() - started
+            after = _snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+
+    return _report(sampler, elapsed, before, after, top), _collapsed(sampler)
+
+
+def _collapsed(sampler: _Sampler) -> str:
+    # Формат flamegraph.pl / speedscope: "кадр;кадр;кадр число"
+    return "".join(f"{stack} {count}\n" for stack, count in sampler.stacks.most_common())
+
+
+def _report(sampler: _Sampler, elapsed: float, before, after, top: int) -> str:
+    busy = sampler.samples - sampler.idle_samples
+    lines = [
+        f"Profile window: {elapsed:.1f}s, {sampler.samples} samples every {sampler.interval * 1000:.0f}ms",
+        f"Event loop busy: {busy / sampler.samples:.0%} of samples" if sampler.samples else "No samples taken",
+        "",
+    ]
+
+    self_time: Counter = Counter()
+    total_time: Counter = Counter()
+    for stack, count in sampler.stacks.items():
+        frames = stack.split(";")
+        if _is_idle(frames[-1]):
+            continue
+        self_time[frames[-1]] += count
+        for frame in set(frames):
+            total_time[frame] += count
+
+    lines.append(f"Top {top} by own time (busy samples):")
+    for label, count in self_time.most_common(top):
+        lines.append(f"  {count / max(busy, 1):6.1%}  {label}")
+    lines.append("")
+    lines.append(f"Top {top} by total time, app code only:")
+    app_frames = [(label, count) for label, count in total_time.most_common() if label.startswith(("app", "main"))]
+    for label, count in app_frames[:top]:
+        lines.append(f"  {count / max(busy, 1):6.1%}  {label}")
+    lines.append("")
+
+    lines.append(f"Event loop blocked longer than {sampler.threshold * 1000:.0f}ms: {len(sampler.slow)} times")
+    for block in sorted(sampler.slow, key=lambda item: item["duration"], reverse=True)[:top]:
+        lines.append(
+            f"  ~{block['duration'] * 1000:.0f}ms  handler={block['handler'] or '-'}  "
+            f"in {block['where']}  (leaf {block['leaf']})"
+        )
+    lines.append("")
+
+    lines.append(f"Top {top} allocation growth (tracemalloc):")
+    for stat in after.compare_to(before, "lineno")[:top]:
+        if stat.size_diff <= 0:
+            continue
+        frame = stat.traceback[0]
+        filename = frame.filename[len(_REPO_ROOT):] if frame.filename.startswith(_REPO_ROOT) else frame.filename
+        lines.append(f"  {stat.size_diff / 1024:+9.1f} KiB  {stat.count_diff:+7d} blocks  {filename}:{frame.lineno}")
+    return "\n".join(lines) + "\n"
+
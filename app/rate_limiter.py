@@ -0,0 +1,245 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from .config import logger
+
+# Приоритеты исходящих запросов (меньше — важнее)
+PRIORITY_USER = 0
+PRIORITY_BACKGROUND = 1
+
+_FLOOD_RECOVERY_INTERVAL = 10.0
+_CHAT_BURST = 3
+_MAX_CHAT_BUCKETS = 5000
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Takes a token and returns how long to wait until it is actually available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class _EditSlot:
+    __slots__ = ("future", "newer")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.newer: "_EditSlot | None" = None
+
+
+class _Waiter:
+    __slots__ = ("future", "superseded")
+
+    def __init__(self, future: asyncio.Future, superseded: Callable[[], bool]):
+        self.future = future
+        self.superseded = superseded
+
+
+def _seconds(value) -> float:
+    return value.total_seconds() if hasattr(value, "total_seconds") else float(value)
+
+
+class OutboundRateLimiter(BaseRateLimiter[int]):
+    """Throttles Bot API calls to Telegram's global and per-chat limits.
+
+    Requests wait in a priority heap (user-facing replies before background edits),
+    queued edits of the same message collapse into the latest one, and a flood-wait
+    pauses everything and halves the global rate until it recovers.
+    """
+
+    def __init__(self, overall_per_second: float, private_per_second: float,
+                 group_per_minute: float, max_retries: int = 2):
+        self._max_overall_rate = overall_per_second
+        self._global = _TokenBucket(overall_per_second, overall_per_second)
+        self._private_rate = private_per_second
+        self._group_rate = group_per_minute / 60
+        self._max_retries = max_retries
+        self._chat_buckets: dict[int | str, _TokenBucket] = {}
+        self._heap: list[tuple[int, int, _Waiter]] = []
+        self._heap_ready: asyncio.Event | None = None
+        self._sequence = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+        self._paused_until = 0.0
+        self._last_flood = float("-inf")
+        self._latest_edit: dict[tuple, _EditSlot] = {}
+        self.stats = {
+            "requests": 0,
+            "coalesced_edits": 0,
+            "flood_waits": 0,
+            "retries": 0,
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._heap)
+
+    @property
+    def overall_rate(self) -> float:
+        return self._global.rate
+
+    async def initialize(self) -> None:
+        # PTB вызывает initialize и из Bot, и из Application — диспетчер уже ждёт на этом событии
+        if self._dispatcher is None:
+            self._heap_ready = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        # Оставшиеся в очереди запросы отпускаем без ограничений
+        while self._heap:
+            _, _, waiter = heapq.heappop(self._heap)
+            if not waiter.future.done():
+                waiter.future.set_result(True)
+
+    async def _dispatch(self) -> None:
+        while True:
+            while not self._heap:
+                self._heap_ready.clear()
+                await self._heap_ready.wait()
+            _, _, waiter = heapq.heappop(self._heap)
+            if waiter.future.done():
+                continue
+            if waiter.superseded():
+                waiter.future.set_result(False)
+                continue
+
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            self._recover_rate()
+            delay = self._global.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if not waiter.future.done():
+                waiter.future.set_result(True)
+
+    async def _acquire(self, priority: int, superseded: Callable[[], bool]) -> bool:
+        if self._dispatcher is None:
+            return True
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._sequence), _Waiter(future, superseded)))
+        self._heap_ready.set()
+        return await future
+
+    def _recover_rate(self) -> None:
+        if self._global.rate >= self._max_overall_rate:
+            return
+        if time.monotonic() - self._last_flood >= _FLOOD_RECOVERY_INTERVAL:
+            self._global.rate = min(self._max_overall_rate, self._global.rate + 1)
+            self._last_flood = time.monotonic()
+
+    def _on_flood_wait(self, retry_after: float) -> None:
+        now = time.monotonic()
+        self.stats["flood_waits"] += 1
+        self._paused_until = max(self._paused_until, now + retry_after)
+        self._last_flood = now
+        self._global.rate = max(1.0, self._global.rate / 2)
+        logger.warning(
+            f"Flood wait for {retry_after:.1f}s, outbound rate lowered to {self._global.rate:.1f}/s"
+        )
+
+    async def _wait_for_chat(self, chat_id: int | str) -> None:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= _MAX_CHAT_BUCKETS:
+                now = time.monotonic()
+                for idle_chat in [key for key, value in self._chat_buckets.items() if value.idle(now)]:
+                    del self._chat_buckets[idle_chat]
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self._group_rate if is_group else self._private_rate
+            bucket = self._chat_buckets[chat_id] = _TokenBucket(rate, _CHAT_BURST)
+        delay = bucket.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, bool | dict[str, Any] | list[dict[str, Any]]]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: int | None,
+    ) -> bool | dict[str, Any] | list[dict[str, Any]]:
+        self.stats["requests"] += 1
+        priority = PRIORITY_USER if rate_limit_args is None else rate_limit_args
+        chat_id = data.get("chat_id")
+
+        # Правки одного и того же сообщения: отправляем только последнюю из ожидающих
+        edit_key = None
+        slot = None
+        if endpoint.startswith("editMessage") and chat_id is not None and data.get("message_id"):
+            edit_key = (endpoint, chat_id, data["message_id"])
+            slot = _EditSlot(asyncio.get_running_loop().create_future())
+            slot.future.add_done_callback(lambda done: done.cancelled() or done.exception())
+            previous = self._latest_edit.get(edit_key)
+            if previous is not None:
+                previous.newer = slot
+            self._latest_edit[edit_key] = slot
+
+        def superseded() -> bool:
+            return slot is not None and slot.newer is not None
+
+        try:
+            attempt = 0
+            while True:
+                if not await self._acquire(priority, superseded):
+                    # Ответ на устаревшую правку — результат более новой
+                    self.stats["coalesced_edits"] += 1
+                    result = await asyncio.shield(slot.newer.future)
+                else:
+                    if chat_id is not None:
+                        await self._wait_for_chat(chat_id)
+                    try:
+                        result = await callback(*args, **kwargs)
+                    except RetryAfter as exc:
+                        self._on_flood_wait(_seconds(exc.retry_after))
+                        if attempt >= self._max_retries:
+                            raise
+                        attempt += 1
+                        self.stats["retries"] += 1
+                        continue
+                if slot is not None and not slot.future.done():
+                    slot.future.set_result(result)
+                return result
+        except BaseException as exc:
+            if slot is not None and not slot.future.done():
+                if isinstance(exc, asyncio.CancelledError):
+                    slot.future.cancel()
+                else:
+                    slot.future.set_exception(exc)
+            raise
+        finally:
+            if edit_key is not None and self._latest_edit.get(edit_key) is slot:
+                del self._latest_edit[edit_key]
+
+    def snapshot(self) -> dict[str, float]:
+        return {**self.stats, "queue_depth": self.queue_depth, "overall_rate": self.overall_rate}
+
+    def metric_samples(self):
+        for name, value in self.stats.items():
+            yield "alias_outbound_events_total", "counter", "Outbound Bot API requests and throttling events", {"event": name}, value
+        yield "alias_outbound_queue_depth", "gauge", "Bot API requests waiting for the rate limiter", {}, self.queue_depth
+        yield "alias_outbound_rate", "gauge", "Current outbound request rate limit per second", {}, self.overall_rate
@@ -0,0 +1,158 @@
+"""Guarding calls to a flaky upstream: circuit breaker, adaptive timeout, hedging.
+
+Each host gets its own breaker and latency window. The timeout follows the observed
+p99 (capped by the caller's maximum), a second request is sent when the first runs
+past the p95, and after a run of failures the host is skipped until a probe succeeds.
+"""
+import asyncio
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+
+from .config import logger
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Пока замеров мало, работаем с максимальным таймаутом и без хеджирования
+_MIN_SAMPLES = 20
+_LATENCY_WINDOW = 200
+_TIMEOUT_FACTOR = 1.5
+_MIN_TIMEOUT = 0.3
+
+
+class CircuitOpenError(Exception):
+    """The host's circuit is open; the request was not sent."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.state = HALF_OPEN
+        # Полуоткрыт: пропускаем один пробный запрос, остальные сразу отказ
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def release(self) -> None:
+        # Пробный запрос отменили, не дождавшись ответа — пусть попробует следующий
+        self._probing = False
+
+    def record(self, ok: bool) -> None:
+        self._probing = False
+        if ok:
+            self.state = CLOSED
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class HostGuard:
+    def __init__(self, host: str, max_timeout: float, failure_threshold: int, cooldown: float, hedge: bool,
+                 hedge_ratio: float):
+        self.host = host
+        self.max_timeout = max_timeout
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self.hedge = hedge
+        self.hedge_ratio = hedge_ratio
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self._sorted: list[float] | None = None
+        self.stats = {"requests": 0, "rejected": 0, "timeouts": 0, "hedges": 0, "hedge_wins": 0}
+
+    def _quantile(self, q: float) -> float | None:
+        if len(self._latencies) < _MIN_SAMPLES:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._latencies)
+        return self._sorted[min(len(self._sorted) - 1, int(q * len(self._sorted)))]
+
+    def _observe(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+        self._sorted = None
+
+    def timeout(self) -> float:
+        p99 = self._quantile(0.99)
+        if p99 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(_MIN_TIMEOUT, p99 * _TIMEOUT_FACTOR))
+
+    def hedge_delay(self) -> float | None:
+        if not self.hedge or self.breaker.state != CLOSED:
+            return None
+        # Не больше hedge_ratio дополнительных запросов от общего числа
+        if self.stats["hedges"] >= self.hedge_ratio * self.stats["requests"]:
+            return None
+        return self._quantile(0.95)
+
+    async def _timed(self, request: Callable[[float], Awaitable[tuple[int | None, object]]], timeout: float):
+        started = time.monotonic()
+        status, payload = await request(timeout)
+        # Таймаут тоже идёт в окно: иначе при деградации оценка застрянет на старых быстрых ответах
+        self._observe(time.monotonic() - started if status is not None else timeout)
+        if status is None:
+            self.stats["timeouts"] += 1
+        return status, payload
+
+    async def call(self, request: Callable[[float], Awaitable[tuple[int | None, object]]]):
+        """Runs request(timeout) under the breaker; raises CircuitOpenError when the host is skipped."""
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(self.host)
+        self.stats["requests"] += 1
+        timeout = self.timeout()
+        delay = self.hedge_delay()
+
+        first = asyncio.ensure_future(self._timed(request, timeout))
+        pending = {first}
+        try:
+            if delay is not None and delay < timeout:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    self.stats["hedges"] += 1
+                    pending.add(asyncio.ensure_future(self._timed(request, timeout)))
+            result = (None, None)
+            while pending and result[0] is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result[0] is not None:
+                        if task is not first:
+                            self.stats["hedge_wins"] += 1
+                        break
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        finally:
+            for task in pending:
+                task.cancel()
+
+        status = result[0]
+        ok = status is not None and status < 500 and status != 429
+        previous_state = self.breaker.state
+        self.breaker.record(ok)
+        if self.breaker.state != previous_state:
+            logger.warning(f"Circuit for {self.host} is now {self.breaker.state}")
+        return result
+
+    def metric_samples(self):
+        labels = {"host": self.host}
+        yield "alias_upstream_circuit_state", "gauge", "Circuit breaker state: 0 closed, 1 half-open, 2 open", labels, _STATE_VALUES[self.breaker.state]
+        yield "alias_upstream_timeout_seconds", "gauge", "Current adaptive request timeout", labels, self.timeout()
+        for name, value in self.stats.items():
+            yield "alias_upstream_events_total", "counter", "Guarded upstream request events", {**labels, "event": name}, value
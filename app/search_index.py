@@ -0,0 +1,181 @@
+"""Prefix search over all dictionaries in DICT_PATH, for inline queries.
+
+Every word is keyed by the form _normalize_for_compare produces (lower case, accents
+and the diaeresis stripped, so "ё" is found by "е"). The keys are kept in one sorted
+list: a query is a bisect plus a walk over the matching run. The index is rebuilt in a
+thread when a dictionary's registry version changes; until then queries are answered
+from the previous one. Answers are cached per normalized query for INLINE_CACHE_TTL.
+
+The index lives in the "search" segment of the shared cache, so it counts against
+CACHE_MEMORY_BUDGET_MB like the dictionaries it is built from; if it is evicted, the
+next inline query builds it again.
+"""
+import sys
+import time
+import random
+import asyncio
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from .cache import cache_manager
+from .config import INLINE_CACHE_TTL, logger
+from . import dict_registry
+from .data_manager import get_words_from_dict
+from .metrics import register_collector
+from .wiktionary import _normalize_for_compare
+
+_QUERY_CACHE_SIZE = 2048
+SEARCH_CACHE = cache_manager.segment("search")
+_INDEX_KEY = "index"
+
+
+class SearchIndex:
+    __slots__ = ("keys", "words", "sources", "dictionaries", "versions", "nbytes")
+
+    def __init__(self, keys: list[str], words: list[str], sources: array, dictionaries: list[str],
+                 versions: dict[str, int]):
+        self.keys = keys
+        self.words = words
+        # Номер словаря в dictionaries, из которого слово попало в индекс
+        self.sources = sources
+        self.dictionaries = dictionaries
+        self.versions = versions
+        # Ключ, совпавший со словом, — тот же объект строки, его не считаем дважды
+        self.nbytes = (
+            sys.getsizeof(keys) + sys.getsizeof(words) + sources.itemsize * len(sources)
+            + sum(sys.getsizeof(word) for word in words)
+            + sum(sys.getsizeof(key) for key, word in zip(keys, words) if key is not word)
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def prefix(self, key: str, limit: int) -> list[int]:
+        """Positions of up to limit words whose key starts with the (normalized) key."""
+        position = bisect_left(self.keys, key)
+        end = min(position + limit, len(self.keys))
+        matches = []
+        while position < end and self.keys[position].startswith(key):
+            matches.append(position)
+            position += 1
+        return matches
+
+    def sample(self, limit: int) -> list[int]:
+        return random.sample(range(len(self.keys)), min(limit, len(self.keys)))
+
+
+_build_task: asyncio.Task | None = None
+# Версии словарей, индекс по которым не поместился в бюджет: не пересобираем его на каждый запрос
+_rejected_versions: dict[str, int] | None = None
+# normalized query -> (истекает, позиции); очищается при каждой новой сборке индекса
+_query_cache: OrderedDict[str, tuple[float, list[int]]] = OrderedDict()
+
+
+def _build(snapshot: list[tuple[str, object]], versions: dict[str, int]) -> SearchIndex:
+    # Без lru_cache: десятки тысяч слов за раз вытеснили бы кэш парсера толкований
+    normalize = _normalize_for_compare.__wrapped__
+    entries: dict[str, tuple[str, int]] = {}
+    for source, (_, words) in enumerate(snapshot):
+        for word in words:
+            if word not in entries:
+                key = normalize(word)
+                entries[word] = (word if key == word else key, source)
+    ordered = sorted((key, word, source) for word, (key, source) in entries.items())
+    return SearchIndex(
+        [key for key, _, _ in ordered],
+        [word for _, word, _ in ordered],
+        array("I", (source for _, _, source in ordered)),
+        [name for name, _ in snapshot],
+        versions,
+    )
+
+
+async def _rebuild(versions: dict[str, int]) -> None:
+    global _rejected_versions
+    started = time.perf_counter()
+    try:
+        snapshot = [(name, await get_words_from_dict(name)) for name in versions]
+        index = await asyncio.to_thread(_build, snapshot, versions)
+    except Exception as exc:
+        logger.error(f"Failed to build the search index: {exc}")
+        return
+    elapsed = time.perf_counter() - started
+    _query_cache.clear()
+    if not SEARCH_CACHE.put(_INDEX_KEY, index, size=index.nbytes, cost=elapsed):
+        _rejected_versions = versions
+        logger.warning(f"Search index ({index.nbytes / 1024 / 1024:.1f} MB) does not fit into "
+                       f"CACHE_MEMORY_BUDGET_MB, inline search is disabled until the dictionaries change.")
+        return
+    _rejected_versions = None
+    logger.info(f"Search index: {len(index)} words from {len(versions)} dictionaries "
+                f"({index.nbytes / 1024 / 1024:.1f} MB) in {elapsed:.2f}s")
+
+
+async def _current_versions() -> dict[str, int]:
+    return {
+        name: info.version
+        for name in await dict_registry.available()
+        if (info := dict_registry.info(name)) is not None
+    }
+
+
+def _start_rebuild(versions: dict[str, int]) -> asyncio.Task:
+    global _build_task
+    if _build_task is None or _build_task.done():
+        _build_task = asyncio.create_task(_rebuild(versions))
+    return _build_task
+
+
+async def get_search_index() -> SearchIndex | None:
+    """The current index; the first one is awaited, later rebuilds happen in the background."""
+    versions = await _current_versions()
+    index = SEARCH_CACHE.get(_INDEX_KEY)
+    if (index is None or index.versions != versions) and versions != _rejected_versions:
+        task = _start_rebuild(versions)
+        if index is None:
+            await asyncio.shield(task)
+            index = SEARCH_CACHE.peek(_INDEX_KEY)
+    return index
+
+
+async def lookup(query: str, limit: int) -> list[tuple[str, str]]:
+    """(word, dictionary) pairs: prefix matches for a query, random words for an empty one."""
+    index = await get_search_index()
+    if index is None:
+        return []
+    key = _normalize_for_compare(query.strip()) if query.strip() else ""
+    if not key:
+        positions = index.sample(limit)
+    else:
+        now = time.monotonic()
+        cached = _query_cache.get(key)
+        if cached is not None and cached[0] > now:
+            _query_cache.move_to_end(key)
+            positions = cached[1]
+        else:
+            positions = index.prefix(key, limit)
+            _query_cache[key] = (now + INLINE_CACHE_TTL, positions)
+            _query_cache.move_to_end(key)
+            if len(_query_cache) > _QUERY_CACHE_SIZE:
+                _query_cache.popitem(last=False)
+    return [(index.words[position], index.dictionaries[index.sources[position]]) for position in positions]
+
+
+async def warm_search_index() -> None:
+    """Starts building the index in the background so the first inline query does not wait."""
+    if _INDEX_KEY not in SEARCH_CACHE:
+        _start_rebuild(await _current_versions())
+
+
+async def stop_search_index() -> None:
+    if _build_task is not None and not _build_task.done():
+        _build_task.cancel()
+        await asyncio.gather(_build_task, return_exceptions=True)
+
+
+def _metric_samples():
+    yield "alias_search_index_words", "gauge", "Words in the inline search index", {}, len(SEARCH_CACHE.peek(_INDEX_KEY) or ())
+    yield "alias_search_query_cache_entries", "gauge", "Cached inline query answers", {}, len(_query_cache)
+
+register_collector(_metric_samples)
@@ -0,0 +1,129 @@
+"""Running the bot as several worker processes.
+
+The main process only receives updates (polling or webhook) and forwards each one
+to a worker chosen by chat id, so a chat always lands on the same worker: its ordering
+and Telegram's per-chat limits are handled in one place, and the global limit is split
+evenly between the workers. A private chat's id is the user's id, so each worker
+preloads the users whose private chats it serves; a user seen in a group served by
+another worker is read from the state backend there. Every worker writes its changes
+back to the backend and re-reads a user after USER_STATE_TTL (data_manager.refresh_user_state).
+Workers learn about dictionary changes from the backend's version counters.
+"""
+import os
+import signal
+import asyncio
+import multiprocessing
+
+from telegram import Update
+from telegram.ext import Application, ApplicationBuilder, TypeHandler
+
+from .config import logger
+
+# spawn: воркеры не наследуют открытые соединения с базами из главного процесса
+_mp = multiprocessing.get_context("spawn")
+
+
+def shard_for(update: Update, count: int) -> int:
+    if update.effective_chat is not None:
+        key = update.effective_chat.id
+    elif update.effective_user is not None:
+        key = update.effective_user.id
+    else:
+        key = update.update_id
+    return key % count
+
+
+def _worker_main(index: int, count: int, queue) -> None:
+    # Ctrl+C получает вся группа процессов; воркеры останавливает главный процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve_worker(queue))
+
+
+async def _serve_worker(queue) -> None:
+    from main import build_application, application_builder
+
+    application = build_application(application_builder().updater(None))
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    try:
+        while True:
+            data = await asyncio.to_thread(queue.get)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+    finally:
+        await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+
+class WorkerPool:
+    def __init__(self, count: int):
+        self.count = count
+        self._queues = [_mp.Queue() for _ in range(count)]
+        self._processes: list = [None] * count
+        self.stats = {"forwarded": 0, "restarts": 0}
+
+    def _spawn(self, index: int) -> None:
+        process = _mp.Process(
+            target=_worker_main, args=(index, self.count, self._queues[index]),
+            name=f"alias-worker-{index}", daemon=False,
+        )
+        # Конфиг читается при импорте, ещё до _worker_main, поэтому номер воркера передаём через окружение
+        previous = os.environ.get("WORKER_INDEX")
+        os.environ["WORKER_INDEX"] = str(index)
+        os.environ["BOT_WORKERS"] = str(self.count)
+        try:
+            process.start()
+        finally:
+            if previous is None:
+                os.environ.pop("WORKER_INDEX", None)
+            else:
+                os.environ["WORKER_INDEX"] = previous
+        self._processes[index] = process
+
+    def start(self) -> None:
+        for index in range(self.count):
+            self._spawn(index)
+        logger.info(f"Started {self.count} worker processes.")
+
+    def forward(self, update: Update) -> None:
+        index = shard_for(update, self.count)
+        process = self._processes[index]
+        if process is None or not process.is_alive():
+            logger.error(f"Worker {index} is not running (exit code {getattr(process, 'exitcode', None)}), restarting.")
+            self.stats["restarts"] += 1
+            self._spawn(index)
+        self._queues[index].put(update.to_dict())
+        self.stats["forwarded"] += 1
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        for queue in self._queues:
+            queue.put(None)
+        for process in self._processes:
+            if process is None:
+                continue
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop in {timeout}s, terminating.")
+                process.terminate()
+
+
+def build_router_application(workers: int, builder: ApplicationBuilder) -> Application:
+    """Application for the main process: receives updates and hands them to the workers."""
+    pool = WorkerPool(workers)
+
+    async def on_startup(application: Application) -> None:
+        pool.start()
+
+    async def on_shutdown(application: Application) -> None:
+        await pool.stop()
+
+    async def forward(update: Update, context) -> None:
+        pool.forward(update)
+
+    application = builder.post_init(on_startup).post_shutdown(on_shutdown).build()
+    application.add_handler(TypeHandler(Update, forward))
+    application.bot_data["worker_pool"] = pool
+    return application
@@ -0,0 +1,340 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+from .config import logger
+from .resp import RespClient
+
+
+class UserStateBackend:
+    """Persistent per-user state. Every method is blocking and is called from a worker thread."""
+
+    def load_all(self) -> dict[int, dict]:
+        raise NotImplementedError
+
+    def load_user(self, user_id: int) -> dict | None:
+        raise NotImplementedError
+
+    def write_users(self, rows: dict[int, dict]) -> None:
+        raise NotImplementedError
+
+    def is_empty(self) -> bool:
+        raise NotImplementedError
+
+    # Счётчики версий общих данных (например, словарей): по ним воркеры узнают,
+    # что другой процесс что-то поменял, и сбрасывают свои кэши
+    def bump_version(self, name: str) -> int:
+        raise NotImplementedError
+
+    def read_versions(self) -> dict[str, int]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+def _connect_sqlite(path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(os.path.abspath(path))
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # Базу могут одновременно писать несколько воркеров
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+class SQLiteUserStateBackend(UserStateBackend):
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = _connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+        )
+
+    def load_all(self) -> dict[int, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id, data FROM users").fetchall()
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def load_user(self, user_id: int) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def write_users(self, rows: dict[int, dict]) -> None:
+        if not rows:
+            return
+        payload = [(user_id, json.dumps(state, ensure_ascii=False)) for user_id, state in rows.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO users (user_id, data) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data",
+                    payload,
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+
+    def bump_version(self, name: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "INSERT INTO versions (name, version) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET version = version + 1 RETURNING version",
+                (name,),
+            ).fetchone()[0]
+
+    def read_versions(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT name, version FROM versions").fetchall())
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisUserStateBackend(UserStateBackend):
+    """User state in a Redis-protocol server, shared by all workers and hosts."""
+
+    def __init__(self, url: str, prefix: str):
+        self._client = RespClient(url)
+        self._users_key = f"{prefix}users"
+        self._versions_key = f"{prefix}versions"
+
+    def load_all(self) -> dict[int, dict]:
+        flat = self._client.execute("HGETALL", self._users_key) or []
+        return {int(flat[i]): json.loads(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+    def load_user(self, user_id: int) -> dict | None:
+        data = self._client.execute("HGET", self._users_key, user_id)
+        return json.loads(data) if data is not None else None
+
+    def write_users(self, rows: dict[int, dict]) -> None:
+        if not rows:
+            return
+        command = ["HSET", self._users_key]
+        for user_id, state in rows.items():
+            command += [user_id, json.dumps(state, ensure_ascii=False)]
+        self._client.execute(*command)
+
+    def is_empty(self) -> bool:
+        return self._client.execute("HLEN", self._users_key) == 0
+
+    def bump_version(self, name: str) -> int:
+        return self._client.execute("HINCRBY", self._versions_key, name, 1)
+
+    def read_versions(self) -> dict[str, int]:
+        flat = self._client.execute("HGETALL", self._versions_key) or []
+        return {flat[i]: int(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class DefinitionBackend:
+    """Persistent definition cache. Entries are (definitions, fetched_at); an empty list is a negative result."""
+
+    def get(self, lang: str, word: str) -> tuple[list[str], float] | None:
+        raise NotImplementedError
+
+    def put(self, lang: str, word: str, definitions: list[str], fetched_at: float) -> None:
+        raise NotImplementedError
+
+    def recent(self, limit: int) -> list[tuple[str, str, list[str], float]]:
+        raise NotImplementedError
+
+    def get_many(self, lang: str, words: list[str]) -> dict[str, tuple[list[str], float]]:
+        found = {}
+        for word in words:
+            entry = self.get(lang, word)
+            if entry is not None:
+                found[word] = entry
+        return found
+
+    def put_many(self, lang: str, entries: dict[str, list[str]], fetched_at: float) -> None:
+        for word, definitions in entries.items():
+            self.put(lang, word, definitions, fetched_at)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteDefinitionBackend(DefinitionBackend):
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = _connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS definitions ("
+            "lang TEXT NOT NULL, word TEXT NOT NULL, data TEXT NOT NULL, "
+            "fetched_at REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (lang, word))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS definitions_last_used ON definitions (last_used)")
+
+    def get(self, lang: str, word: str) -> tuple[list[str], float] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, fetched_at FROM definitions WHERE lang = ? AND word = ?", (lang, word)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE definitions SET last_used = ? WHERE lang = ? AND word = ?", (time.time(), lang, word)
+            )
+        return json.loads(row[0]), row[1]
+
+    def put(self, lang: str, word: str, definitions: list[str], fetched_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO definitions (lang, word, data, fetched_at, last_used) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(lang, word) DO UPDATE SET data = excluded.data, "
+                "fetched_at = excluded.fetched_at, last_used = excluded.last_used",
+                (lang, word, json.dumps(definitions, ensure_ascii=False), fetched_at, fetched_at),
+            )
+
+    def put_many(self, lang: str, entries: dict[str, list[str]], fetched_at: float) -> None:
+        if not entries:
+            return
+        payload = [
+            (lang, word, json.dumps(definitions, ensure_ascii=False), fetched_at, fetched_at)
+            for word, definitions in entries.items()
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO definitions (lang, word, data, fetched_at, last_used) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(lang, word) DO UPDATE SET data = excluded.data, "
+                    "fetched_at = excluded.fetched_at, last_used = excluded.last_used",
+                    payload,
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def recent(self, limit: int) -> list[tuple[str, str, list[str], float]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT lang, word, data, fetched_at FROM definitions ORDER BY last_used DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [(lang, word, json.loads(data), fetched_at) for lang, word, data, fetched_at in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisDefinitionBackend(DefinitionBackend):
+    """Definitions in one hash ("lang\x1fword" -> [definitions, fetched_at]), recency in a sorted set."""
+
+    def __init__(self, url: str, prefix: str):
+        self._client = RespClient(url)
+        self._data_key = f"{prefix}definitions"
+        self._used_key = f"{prefix}definitions:used"
+
+    @staticmethod
+    def _field(lang: str, word: str) -> str:
+        return f"{lang}\x1f{word}"
+
+    def get(self, lang: str, word: str) -> tuple[list[str], float] | None:
+        return self.get_many(lang, [word]).get(word)
+
+    def get_many(self, lang: str, words: list[str]) -> dict[str, tuple[list[str], float]]:
+        if not words:
+            return {}
+        fields = [self._field(lang, word) for word in words]
+        values = self._client.execute("HMGET", self._data_key, *fields)
+        found = {}
+        touched = ["ZADD", self._used_key]
+        now = time.time()
+        for word, field, value in zip(words, fields, values):
+            if value is None:
+                continue
+            definitions, fetched_at = json.loads(value)
+            found[word] = (definitions, fetched_at)
+            touched += [now, field]
+        if found:
+            self._client.execute(*touched)
+        return found
+
+    def put(self, lang: str, word: str, definitions: list[str], fetched_at: float) -> None:
+        self.put_many(lang, {word: definitions}, fetched_at)
+
+    def put_many(self, lang: str, entries: dict[str, list[str]], fetched_at: float) -> None:
+        if not entries:
+            return
+        data = ["HSET", self._data_key]
+        used = ["ZADD", self._used_key]
+        for word, definitions in entries.items():
+            field = self._field(lang, word)
+            data += [field, json.dumps([definitions, fetched_at], ensure_ascii=False)]
+            used += [fetched_at, field]
+        self._client.pipeline([tuple(data), tuple(used)])
+
+    def recent(self, limit: int) -> list[tuple[str, str, list[str], float]]:
+        fields = self._client.execute("ZREVRANGE", self._used_key, 0, limit - 1)
+        if not fields:
+            return []
+        values = self._client.execute("HMGET", self._data_key, *fields)
+        entries = []
+        for field, value in zip(fields, values):
+            if value is None:
+                continue
+            lang, word = field.split("\x1f", 1)
+            definitions, fetched_at = json.loads(value)
+            entries.append((lang, word, definitions, fetched_at))
+        return entries
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def import_legacy_json(backend: UserStateBackend, json_path: str) -> int:
+    """One-time migration of the old user_data.json into an empty backend."""
+    if not os.path.isfile(json_path) or not backend.is_empty():
+        return 0
+    try:
+        with open(json_path, 'r') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as exc:
+        logger.warning(f"Could not import legacy user data from {json_path}: {exc}")
+        return 0
+
+    rows: dict[int, dict] = {}
+    for field, key in (("language", "user_language"), ("selected_dict", "user_selected_dict")):
+        for user_id, value in data.get(key, {}).items():
+            rows.setdefault(int(user_id), {})[field] = value
+    backend.write_users(rows)
+    os.replace(json_path, json_path + ".imported")
+    logger.info(f"Imported {len(rows)} users from {json_path} into the state backend.")
+    return len(rows)
+
+
+def create_user_state_backend(kind: str, path: str, redis_url: str = "", redis_prefix: str = "") -> UserStateBackend:
+    if kind == "sqlite":
+        return SQLiteUserStateBackend(path)
+    if kind == "redis":
+        return RedisUserStateBackend(redis_url, redis_prefix)
+    raise ValueError(f"Unknown STATE_BACKEND: {kind}")
+
+
+def create_definition_backend(kind: str, path: str, redis_url: str = "", redis_prefix: str = "") -> DefinitionBackend:
+    if kind == "sqlite":
+        return SQLiteDefinitionBackend(path)
+    if kind == "redis":
+        return RedisDefinitionBackend(redis_url, redis_prefix)
+    raise ValueError(f"Unknown DEFINITION_BACKEND: {kind}")
@@ -0,0 +1,145 @@
+import asyncio
+import itertools
+from collections.abc import Awaitable, Callable, Hashable
+
+from .config import (BACKGROUND_WORKERS, BACKGROUND_QUEUE_SIZE, PREFETCH_CONCURRENCY,
+                     PREFETCH_QUEUE_SIZE, logger)
+from .metrics import register_collector
+
+
+class BackgroundScheduler:
+    """Fixed worker pool over a bounded queue.
+
+    Jobs are keyed (e.g. per chat): submitting a new job for a key makes queued older
+    ones stale, so only the latest queued job per key starts. A job that is already
+    running is left to finish — cancelling it would also cancel shared work (e.g. a
+    definition lookup) that other callers are waiting on — but it can ask is_current
+    with the generation submit returned and skip its visible effect once superseded.
+    """
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self._workers_count = max(1, workers)
+        self._queue: asyncio.Queue = asyncio.Queue(max(1, max_queue))
+        self._generations: dict[Hashable, int] = {}
+        # Сквозной счётчик: номер не повторяется, даже когда ключ уже удалён из _generations
+        self._sequence = itertools.count(1)
+        self._running: set[asyncio.Task] = set()
+        self._workers: list[asyncio.Task] = []
+        self.stats = {
+            "submitted": 0,
+            "dropped": 0,
+            "stale": 0,
+            "interrupted": 0,
+            "completed": 0,
+            "failed": 0,
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def submit(self, key: Hashable, job: Callable[[], Awaitable]) -> int:
+        """Queues the job and returns its generation for is_current; 0 if the queue is full."""
+        previous = self._generations.get(key)
+        generation = next(self._sequence)
+        self._generations[key] = generation
+
+        try:
+            self._queue.put_nowait((key, generation, job))
+        except asyncio.QueueFull:
+            # Backpressure: очередь полна — задачу не берём, а ждущая в очереди старая остаётся актуальной
+            self.stats["dropped"] += 1
+            if previous is None:
+                del self._generations[key]
+            else:
+                self._generations[key] = previous
+            return 0
+        self.stats["submitted"] += 1
+        return generation
+
+    def supersede(self, key: Hashable) -> None:
+        """Marks the key's queued and running jobs as outdated without submitting a new one."""
+        self._generations.pop(key, None)
+
+    def is_current(self, key: Hashable, generation: int) -> bool:
+        """False once a newer job was submitted for the key."""
+        return self._generations.get(key) == generation
+
+    def _finish(self, key: Hashable, generation: int) -> None:
+        if self._generations.get(key) == generation:
+            del self._generations[key]
+
+    async def _worker(self) -> None:
+        while True:
+            key, generation, job = await self._queue.get()
+            try:
+                if not self.is_current(key, generation):
+                    self.stats["stale"] += 1
+                    continue
+
+                task = asyncio.create_task(job())
+                self._running.add(task)
+                try:
+                    await task
+                    self.stats["completed"] += 1
+                except asyncio.CancelledError:
+                    if asyncio.current_task().cancelling():
+                        task.cancel()
+                        raise
+                    # Задачу отменил не планировщик — например, её ожидание отменили в другом месте
+                    self.stats["interrupted"] += 1
+                    logger.warning(f"Background task in {self.name} for {key!r} was cancelled")
+                except Exception as exc:
+                    self.stats["failed"] += 1
+                    logger.error(f"Background task in {self.name} failed: {exc}")
+                finally:
+                    self._running.discard(task)
+                    self._finish(key, generation)
+            finally:
+                self._queue.task_done()
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self._workers_count)]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+# Правки сообщений со спойлером-определением: ключ — чат
+definition_edits = BackgroundScheduler("definition_edits", BACKGROUND_WORKERS, BACKGROUND_QUEUE_SIZE)
+# Низкоприоритетная предзагрузка определений: ключ — пользователь
+prefetch_jobs = BackgroundScheduler("prefetch", PREFETCH_CONCURRENCY, PREFETCH_QUEUE_SIZE)
+SCHEDULERS = (definition_edits, prefetch_jobs)
+
+
+def start_schedulers() -> None:
+    for scheduler in SCHEDULERS:
+        scheduler.start()
+
+
+async def stop_schedulers() -> None:
+    for scheduler in SCHEDULERS:
+        await scheduler.stop()
+
+
+def _metric_samples():
+    for scheduler in SCHEDULERS:
+        labels = {"scheduler": scheduler.name}
+        for outcome, value in scheduler.stats.items():
+            yield "alias_background_tasks_total", "counter", "Background jobs by outcome", {**labels, "outcome": outcome}, value
+    for scheduler in SCHEDULERS:
+        yield "alias_background_queue_depth", "gauge", "Background jobs waiting", {"scheduler": scheduler.name}, scheduler.queue_depth
+    for scheduler in SCHEDULERS:
+        yield "alias_background_running", "gauge", "Background jobs running", {"scheduler": scheduler.name}, scheduler.running
+
+
+register_collector(_metric_samples)
@@ -23,16 +23,34 @@ Looks like you're new here. Please choose your language:""",
         'definition_title': "Definition",
         'choose_lang_prompt': "Please choose your language:",
         'settings_menu_prompt': "⚙️ Settings Menu",
-        'settings_info': "<b>Current Settings:</b>\n🌐 Language: {lang_name}\n📚 Dictionary: {dict_name}",
+        'settings_info': "<b>Current Settings:</b>\n🌐 Language: {lang_name}\n📚 Dictionary: {dict_name}\n🔤 Words: {filter_desc}",
+        'btn_word_filter': "🔤 Word Filter",
+        'filter_prompt': "🔤 Words: {filter_desc}\n\nChoose the word length in letters:",
+        'filter_none': "all",
+        'filter_any_length': "Any",
+        'filter_letters': "{min}–{max} letters",
+        'filter_letters_min': "{min}+ letters",
+        'filter_single_only': "single words only",
+        'btn_filter_single': "Single words only",
+        'no_words_for_filter': "No words in this dictionary match your word filter. Change it in Settings.",
         'upload_prompt': "Send me a `.txt` file with words, each on a new line.",
 
         'upload_success': "✅ Dictionary `{filename}` uploaded and set as active.",
+        'upload_stats': "Words: {words}. Duplicates removed: {duplicates}, empty lines skipped: {empty_lines}.",
+        'upload_rejected': "⛔ Dictionary was not uploaded: {reason}.",
+        'upload_too_large': "the file is larger than {limit} MB",
+        'upload_no_words': "there are no words in the file",
+        'upload_not_utf8': "the file is not valid UTF-8 (byte {position})",
         'addword_prompt': "Send me the word(s) you want to add.",
         'addword_choose_dict': "Which dictionary to add the word(s) to?",
         'addword_success': "✅ Word(s) added to `{dict_name}`.",
+        'addword_stats': "New: {added}, already in the dictionary or empty: {skipped}.",
         'admin_only': "⛔ This command is only for administrators.",
         'action_canceled': "Action canceled.",
         'invalid_file_type': "Please send a `.txt` file.",
+        'profile_started': "⏱ Profiling for {seconds}s, the report will follow.",
+        'profile_busy': "A profile is already running, try again later.",
+        'profile_done': "Profile report for {seconds}s. The .folded file is collapsed stacks for flamegraph.pl or speedscope.",
     },
     'ru': {
 
@@ -56,16 +74,34 @@ Looks like you're new here. Please choose your language:""",
         'definition_title': "Определение",
         'choose_lang_prompt': "Пожалуйста, выберите язык:",
         'settings_menu_prompt': "⚙️ Меню настроек",
-        'settings_info': "<b>Текущие настройки:</b>\n🌐 Язык: {lang_name}\n📚 Словарь: {dict_name}",
+        'settings_info': "<b>Текущие настройки:</b>\n🌐 Язык: {lang_name}\n📚 Словарь: {dict_name}\n🔤 Слова: {filter_desc}",
+        'btn_word_filter': "🔤 Фильтр слов",
+        'filter_prompt': "🔤 Слова: {filter_desc}\n\nВыбери длину слова в буквах:",
+        'filter_none': "все",
+        'filter_any_length': "Любая",
+        'filter_letters': "{min}–{max} букв",
+        'filter_letters_min': "от {min} букв",
+        'filter_single_only': "только одиночные слова",
+        'btn_filter_single': "Только одиночные слова",
+        'no_words_for_filter': "В этом словаре нет слов под твой фильтр. Его можно поменять в настройках.",
         'upload_prompt': "Отправьте мне файл `.txt` со словами, каждое на новой строке.",
 
         'upload_success': "✅ Словарь `{filename}` загружен и установлен как активный.",
+        'upload_stats': "Слов: {words}. Убрано повторов: {duplicates}, пустых строк: {empty_lines}.",
+        'upload_rejected': "⛔ Словарь не загружен: {reason}.",
+        'upload_too_large': "файл больше {limit} МБ",
+        'upload_no_words': "в файле нет ни одного слова",
+        'upload_not_utf8': "файл не в кодировке UTF-8 (байт {position})",
         'addword_prompt': "Отправьте мне слово (или слова), которые нужно добавить.",
         'addword_choose_dict': "В какой словарь добавить слова?",
         'addword_success': "✅ Слова добавлены в словарь `{dict_name}`.",
+        'addword_stats': "Новых: {added}, уже были в словаре или пустые: {skipped}.",
         'admin_only': "⛔ Эта команда доступна только администраторам.",
         'action_canceled': "Действие отменено.",
         'invalid_file_type': "Пожалуйста, отправьте файл формата `.txt`.",
+        'profile_started': "⏱ Профилирую {seconds} с, отчёт пришлю следом.",
+        'profile_busy': "Профилирование уже идёт, попробуйте позже.",
+        'profile_done': "Отчёт профилировщика за {seconds} с. Файл .folded — свёрнутые стеки для flamegraph.pl или speedscope.",
     }
 }
 
@@ -0,0 +1,301 @@
+import html as html_lib
+import re
+import unicodedata
+from functools import lru_cache
+
+MAX_DEFINITIONS = 3
+MAX_DEFINITION_LENGTH = 220
+
+# Все выражения компилируются один раз при импорте
+_TAG_RE = re.compile(r"<[^>]+>")
+_WIKILINK_RE = re.compile(r"\[\[(?:[^|\]]*\|)?([^\]]+)\]\]")
+_RU_MEANING_HEADING_RE = re.compile(
+    r"<h[2-6][^>]*>\s*(?:<span[^>]*>\s*)?Значение\s*(?:</span>\s*)?</h[2-6]>",
+    flags=re.DOTALL,
+)
+_LIST_ITEM_RE = re.compile(r"<li[^>]*>(.*?)</li>", flags=re.DOTALL)
+
+
+def _normalize_ws(text: str) -> str:
+    return " ".join(text.split())
+
+
+@lru_cache(maxsize=8192)
+def _normalize_for_compare(text: str) -> str:
+    text = text.lower()
+    if text.isascii():
+        return text
+    normalized = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in normalized if unicodedata.category(ch) != "Mn")
+
+
+@lru_cache(maxsize=4096)
+def _headword_prefix_re(word: str) -> re.Pattern:
+    # Заголовок в начале толкования, возможно с ударением после любой буквы
+    pattern_parts: list[str] = []
+    for ch in word:
+        if ch.isspace():
+            pattern_parts.append(r"\s+")
+        else:
+            pattern_parts.append(f"{re.escape(ch)}\u0301?")
+    return re.compile(r"^\s*" + "".join(pattern_parts) + r"\s*(?:[-—–:;,]\s*)?", flags=re.IGNORECASE)
+
+
+def _strip_headword_prefix(definition: str, word: str) -> str:
+    definition = definition.strip()
+    if not definition:
+        return definition
+
+    normalized_def = _normalize_for_compare(definition)
+    normalized_word = _normalize_for_compare(word)
+    if not normalized_def.startswith(normalized_word):
+        return definition
+
+    if len(normalized_def) > len(normalized_word) and normalized_def[len(normalized_word)].isalnum():
+        return definition
+
+    stripped = _headword_prefix_re(word).sub("", definition, count=1).strip()
+    return stripped if stripped else definition
+
+
+def _clean_definition(text: str, word: str, normalized_word: str) -> str | None:
+    """Common tail of both parsers: headword prefix, self-reference check, length cap."""
+    text = _strip_headword_prefix(text, word)
+    if _normalize_for_compare(text) == normalized_word:
+        return None
+    if len(text) > MAX_DEFINITION_LENGTH:
+        text = text[: MAX_DEFINITION_LENGTH - 1].rstrip() + "…"
+    return text
+
+
+def _extract_ru_definitions(extract_html: str, word: str) -> list[str]:
+    # Один проход вперёд: заголовок «Значение», первый <ol> после него и его пункты
+    heading_match = _RU_MEANING_HEADING_RE.search(extract_html)
+    if not heading_match:
+        return []
+    list_start = extract_html.find("<ol>", heading_match.end())
+    if list_start < 0:
+        return []
+    list_start += len("<ol>")
+    list_end = extract_html.find("</ol>", list_start)
+    if list_end < 0:
+        return []
+
+    normalized_word = _normalize_for_compare(word)
+    definitions: list[str] = []
+    for item in _LIST_ITEM_RE.finditer(extract_html, list_start, list_end):
+        text = html_lib.unescape(_TAG_RE.sub("", item.group(1)))
+        text = _normalize_ws(text.split("◆", 1)[0])
+        if not text or text.startswith("Отсутствует пример"):
+            continue
+
+        text = _clean_definition(text, word, normalized_word)
+        if text is not None and text not in definitions:
+            definitions.append(text)
+            if len(definitions) >= MAX_DEFINITIONS:
+                break
+
+    return definitions
+
+
+def _extract_en_definitions(definition_data: dict, word: str) -> list[str]:
+    lang_data = definition_data.get("en", [])
+    if not lang_data and definition_data:
+        first_value = next(iter(definition_data.values()), [])
+        if isinstance(first_value, list):
+            lang_data = first_value
+
+    normalized_word = _normalize_for_compare(word)
+    definitions: list[str] = []
+    for part in lang_data:
+        if not isinstance(part, dict):
+            continue
+        for def_obj in part.get("definitions", []):
+            raw_definition = def_obj.get("definition")
+            if not raw_definition:
+                continue
+
+            text = _WIKILINK_RE.sub(r"\1", _TAG_RE.sub("", raw_definition))
+            text = _normalize_ws(html_lib.unescape(text))
+            if not text:
+                continue
+
+            text = _clean_definition(text, word, normalized_word)
+            if text is not None and text not in definitions:
+                definitions.append(text)
+                if len(definitions) >= MAX_DEFINITIONS:
+                    return definitions
+
+    return definitions
+
+
+# --- Викитекст (дампы и action=query&prop=revisions) ---
+
+_WIKI_HEADING_RE = re.compile(r"^(=+)\s*(.*?)\s*\1\s*$")
+_WIKI_TEMPLATE_RE = re.compile(r"\{\{([^{}]*)\}\}")
+_WIKI_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_WIKI_REF_RE = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL)
+_WIKI_QUOTES_RE = re.compile(r"'{2,}")
+_EN_LINK_TEMPLATES = {"l", "m", "link", "mention"}
+_EN_SECTION_RE = re.compile(r"^==\s*English\s*==\s*$", flags=re.MULTILINE)
+_LANGUAGE_SECTION_RE = re.compile(r"^==[^=].*?==\s*$", flags=re.MULTILINE)
+
+
+# Справочные шаблоны: в HTML-выдаче раскрываются в готовое толкование
+_RU_REFERENCE_TEMPLATES = {
+    "=": "то же, что {}",
+    "действие": "действие по значению гл. {}",
+    "свойство": "свойство по значению прил. {}",
+    "состояние": "состояние по значению гл. {}",
+}
+
+
+def _template_args(parts: list[str]) -> tuple[list[str], dict[str, str]]:
+    args: list[str] = []
+    named: dict[str, str] = {}
+    for part in parts:
+        key, sep, value = part.partition("=")
+        if sep:
+            named[key.strip()] = value.strip()
+        else:
+            args.append(part)
+    return args, named
+
+
+def _render_ru_template(match: re.Match) -> str:
+    parts = [part.strip() for part in match.group(1).split("|")]
+    name = parts[0]
+    # {{пример|...}} в HTML-выдаче уходит после «◆», его отрезает _extract_ru_definitions
+    if name == "пример":
+        return " ◆ "
+    if name in ("помета", "помета.") and len(parts) > 1:
+        return parts[1]
+    if name in _RU_REFERENCE_TEMPLATES:
+        args, _ = _template_args(parts[1:])
+        return _RU_REFERENCE_TEMPLATES[name].format(args[0]) if args and args[0] else ""
+    if name.endswith(".") and " " not in name:
+        return f"{name} "
+    return ""
+
+
+def _render_en_place(args: list[str]) -> str:
+    # {{place|en|capital city|c/France}}: тип места, затем «вид/название» вышестоящих
+    placetype = args[1].split("/")[-1]
+    holders = [arg.split("/", 1)[-1] for arg in args[2:] if arg]
+    if placetype.startswith("capital") and holders:
+        return f"The {placetype} of {holders[0]}"
+    article = "An" if placetype[:1].lower() in "aeiou" else "A"
+    if holders:
+        return f"{article} {placetype} in {', '.join(holders)}"
+    return f"{article} {placetype}"
+
+
+def _render_en_template(match: re.Match) -> str:
+    parts = [part.strip() for part in match.group(1).split("|")]
+    name = parts[0]
+    args, named = _template_args(parts[1:])
+    if name in ("lb", "lbl", "label") and len(args) > 1:
+        return "(" + ", ".join(args[1:]) + ") "
+    if name in ("w", "vern", "taxlink") and args:
+        return args[-1]
+    if name in _EN_LINK_TEMPLATES and args:
+        # {{l|en|target|display}}
+        return args[2] if len(args) > 2 and args[2] else args[min(1, len(args) - 1)]
+    if name == "gloss" and args:
+        return f"({args[0]})"
+    if name == "place" and len(args) > 1 and args[1]:
+        return _render_en_place(args)
+    if name in ("given name", "surname") and args:
+        gender = args[1] if name == "given name" and len(args) > 1 else ""
+        text = f"A {gender} {name}" if gender else f"A {name}"
+        return f"{text} from {named['from']}" if named.get("from") else text
+    if name == "form of" and len(args) > 2:
+        # {{form of|en|tag|target|display}}
+        return f"{args[1]} of {args[3] if len(args) > 3 and args[3] else args[2]}"
+    if name.endswith(" of") and len(args) > 1:
+        # {{plural of|en|target|display}}, {{alternative form of|...}} и прочие «... of»
+        return f"{name} {args[2] if len(args) > 2 and args[2] else args[1]}"
+    return ""
+
+
+def _wikitext_section_lines(wikitext: str, heading_matches) -> list[str]:
+    """Definition lines ("# ...") under the first heading accepted by heading_matches."""
+    lines: list[str] = []
+    inside = False
+    for line in wikitext.splitlines():
+        heading = _WIKI_HEADING_RE.match(line.strip())
+        if heading:
+            if inside and lines:
+                break
+            inside = heading_matches(heading.group(2))
+            continue
+        if inside and line.startswith("#") and not line.startswith(("#:", "#*", "##")):
+            lines.append(line.lstrip("#").strip())
+    return lines
+
+
+def _has_text(text: str) -> bool:
+    # От строки из одних нераскрытых шаблонов остаётся пунктуация вроде «.» — это не толкование
+    return any(ch.isalnum() for ch in text)
+
+
+def _clean_wikitext(text: str, render_template) -> tuple[str, bool]:
+    """Rendered text and whether some template rendered to nothing."""
+    text = _WIKI_COMMENT_RE.sub("", text)
+    text = _WIKI_REF_RE.sub("", text)
+    dropped = False
+
+    def render(match: re.Match) -> str:
+        nonlocal dropped
+        rendered = render_template(match)
+        if not rendered:
+            dropped = True
+        return rendered
+
+    # Вложенные шаблоны раскрываем изнутри наружу
+    previous = None
+    while previous != text:
+        previous = text
+        text = _WIKI_TEMPLATE_RE.sub(render, text)
+    return _WIKI_QUOTES_RE.sub("", text), dropped
+
+
+def ru_definitions_from_wikitext(wikitext: str, word: str, strict: bool = False) -> list[str]:
+    """strict: a definition line made only of templates we can't render voids the whole page."""
+    lines = _wikitext_section_lines(wikitext, lambda title: title == "Значение")
+    if not lines:
+        return []
+    # Собираем тот же HTML, что отдаёт prop=extracts, и прогоняем через общий парсер
+    items = []
+    for line in lines:
+        text, dropped = _clean_wikitext(line, _render_ru_template)
+        text = _WIKILINK_RE.sub(r"\1", text)
+        if _has_text(text.split("◆", 1)[0]):
+            items.append(f"<li>{html_lib.escape(text)}</li>")
+        elif dropped and strict:
+            return []
+    return _extract_ru_definitions(f"<h4>Значение</h4><ol>{''.join(items)}</ol>", word)
+
+
+def en_definitions_from_wikitext(wikitext: str, word: str, strict: bool = False) -> list[str]:
+    """strict: as for ru_definitions_from_wikitext."""
+    english = wikitext
+    match = _EN_SECTION_RE.search(wikitext)
+    if match:
+        english = wikitext[match.end():]
+        next_language = _LANGUAGE_SECTION_RE.search(english)
+        if next_language:
+            english = english[:next_language.start()]
+    elif "==" in wikitext:
+        return []
+
+    definitions = []
+    for line in english.splitlines():
+        if line.startswith("# ") or (line.startswith("#") and line[1:2] not in (":", "*", "#")):
+            text, dropped = _clean_wikitext(line.lstrip("#").strip(), _render_en_template)
+            if not _has_text(text):
+                if dropped and strict:
+                    return []
+                continue
+            definitions.append({"definition": html_lib.escape(text, quote=False)})
+    return _extract_en_definitions({"en": [{"definitions": definitions}]}, word)
@@ -0,0 +1,101 @@
+"""Per-user word filters (length in letters, single words only) served from bucket indexes.
+
+When a dictionary is loaded its word positions are grouped by (letters, multi-word);
+a filter becomes the list of matching buckets with cumulative sizes. The filtered view
+is a Sequence over the dictionary, so the deck and random draws work on it unchanged:
+item i is found with a bisect over the few buckets, not by scanning the words.
+"""
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterable, Sequence
+
+# Пресеты длины в настройках: название -> (минимум букв, максимум букв или 0 — без ограничения)
+LENGTH_PRESETS = {
+    "any": (0, 0),
+    "3-5": (3, 5),
+    "4-8": (4, 8),
+    "6-10": (6, 10),
+    "9+": (9, 0),
+}
+
+
+def letter_count(word: str) -> int:
+    return sum(ch.isalpha() for ch in word)
+
+
+def is_multiword(word: str) -> bool:
+    return len(word.split()) > 1
+
+
+def make_filter(min_letters: int, max_letters: int, single_only: bool) -> list | None:
+    """Filter as stored in user state; None when it lets every word through."""
+    if not min_letters and not max_letters and not single_only:
+        return None
+    return [min_letters, max_letters, single_only]
+
+
+def length_preset(word_filter: list | None) -> str:
+    bounds = tuple(word_filter[:2]) if word_filter else (0, 0)
+    return next((name for name, preset in LENGTH_PRESETS.items() if preset == bounds), "any")
+
+
+class FilteredWords(Sequence):
+    __slots__ = ("_words", "_buckets", "_ends")
+
+    def __init__(self, words: Sequence[str], buckets: list[array], ends: list[int]):
+        self._words = words
+        self._buckets = buckets
+        self._ends = ends
+
+    def __len__(self) -> int:
+        return self._ends[-1] if self._ends else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("filtered dictionary index out of range")
+        bucket = bisect_right(self._ends, index)
+        start = self._ends[bucket - 1] if bucket else 0
+        return self._words[self._buckets[bucket][index - start]]
+
+
+class WordBuckets:
+    """Positions of a dictionary's words grouped by letter count and multi-word flag."""
+
+    def __init__(self, words: Sequence[str]):
+        self._words = words
+        self._buckets: dict[tuple[int, bool], array] = {}
+        self._views: dict[tuple, FilteredWords] = {}
+        self.add(words, 0)
+
+    def add(self, words: Iterable[str], start: int) -> None:
+        """Buckets words that sit at positions start, start + 1, ... of the dictionary."""
+        for position, word in enumerate(words, start):
+            key = (letter_count(word), is_multiword(word))
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = array("I")
+            bucket.append(position)
+        self._views.clear()
+
+    def view(self, word_filter: list) -> FilteredWords:
+        key = tuple(word_filter)
+        view = self._views.get(key)
+        if view is None:
+            min_letters, max_letters, single_only = word_filter
+            buckets, ends, total = [], [], 0
+            for (letters, multiword), positions in sorted(self._buckets.items()):
+                if letters < min_letters or (max_letters and letters > max_letters) or (single_only and multiword):
+                    continue
+                total += len(positions)
+                buckets.append(positions)
+                ends.append(total)
+            view = self._views[key] = FilteredWords(self._words, buckets, ends)
+        return view
+
+    @property
+    def nbytes(self) -> int:
+        return sum(positions.itemsize * len(positions) for positions in self._buckets.values())
@@ -0,0 +1,164 @@
+"""In-process stand-ins for the Telegram Bot API and Wiktionary used by the benchmarks."""
+import asyncio
+import itertools
+import json
+import time
+import zlib
+from collections.abc import Callable
+
+import httpx
+import tornado.httpserver
+import tornado.web
+from telegram.request import BaseRequest, RequestData
+
+BOT_USER = {
+    "id": 100000,
+    "is_bot": True,
+    "first_name": "Alias",
+    "username": "alias_benchmark_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+
+class FakeBotAPI(BaseRequest):
+    """Answers Bot API methods without a network, with an optional simulated round-trip."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: dict[str, int] = {}
+        # Вызывается на каждый запрос: (method, parameters, monotonic time)
+        self.listeners: list[Callable[[str, dict, float], None]] = []
+        self._message_ids = itertools.count(1)
+        # Очередь апдейтов для getUpdates (режим polling)
+        self._updates: list[dict] = []
+        self._updates_ready = asyncio.Event()
+
+    def push_update(self, update: dict) -> None:
+        self._updates.append(update)
+        self._updates_ready.set()
+
+    @property
+    def read_timeout(self) -> float:
+        return 5.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _message(self, params: dict, message_id=None) -> dict:
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": int(message_id or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+
+    async def _respond(self, method: str, params: dict):
+        if method == "getMe":
+            return BOT_USER
+        if method == "getUpdates":
+            offset = int(params.get("offset", 0) or 0)
+            self._updates = [update for update in self._updates if update["update_id"] >= offset]
+            if not self._updates:
+                self._updates_ready.clear()
+                try:
+                    await asyncio.wait_for(self._updates_ready.wait(), min(float(params.get("timeout", 0) or 0), 1.0))
+                except TimeoutError:
+                    return []
+            return self._updates[:int(params.get("limit", 100) or 100)]
+        if method in ("sendMessage", "sendDocument"):
+            return self._message(params)
+        if method.startswith("editMessage"):
+            return self._message(params, params.get("message_id"))
+        return True
+
+    async def do_request(self, url: str, method: str, request_data: RequestData | None = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        self.calls[api_method] = self.calls.get(api_method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        result = await self._respond(api_method, params)
+        now = time.monotonic()
+        for listener in self.listeners:
+            listener(api_method, params, now)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+class _BotAPIHandler(tornado.web.RequestHandler):
+    def initialize(self, api: FakeBotAPI) -> None:
+        self.api = api
+
+    async def post(self, token: str, method: str) -> None:
+        params = {name: values[-1].decode() for name, values in self.request.body_arguments.items()}
+        if self.request.headers.get("Content-Type", "").startswith("application/json") and self.request.body:
+            params = json.loads(self.request.body)
+        status, body = await self.api.do_request(f"{self.request.path}", "POST", _Parameters(params))
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.finish(body)
+
+    get = post
+
+
+class _Parameters:
+    def __init__(self, parameters: dict):
+        self.parameters = parameters
+
+
+def start_fake_bot_api_server(api: FakeBotAPI, port: int, host: str = "127.0.0.1") -> tornado.httpserver.HTTPServer:
+    """Serves api over HTTP for bots in other processes (BOT_API_BASE_URL=http://host:port/bot)."""
+    app = tornado.web.Application([(r"/bot([^/]+)/(\w+)", _BotAPIHandler, {"api": api})])
+    server = tornado.httpserver.HTTPServer(app)
+    server.listen(port, host)
+    return server
+
+
+def _is_missing(word: str, missing_ratio: float) -> bool:
+    return zlib.crc32(word.encode()) % 100 < missing_ratio * 100
+
+
+def fake_wiktionary_transport(latency: float = 0.0, missing_ratio: float = 0.1) -> httpx.AsyncBaseTransport:
+    """Wiktionary answers with one synthetic sense per word; about missing_ratio of words are not found."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if latency:
+            await asyncio.sleep(latency)
+        params = request.url.params
+        if request.url.path.startswith("/api/rest_v1/page/definition/"):
+            word = request.url.path.rsplit("/", 1)[-1]
+            if _is_missing(word, missing_ratio):
+                return httpx.Response(404)
+            return httpx.Response(200, json={"en": [{"definitions": [{"definition": f"A sense of {word}."}]}]})
+
+        titles = params.get("titles", "").split("|")
+        if params.get("prop") == "revisions":
+            # formatversion=2: страницы списком, текст в slots.main.content
+            english = request.url.host.startswith("en.")
+            pages = []
+            for title in titles:
+                if _is_missing(title, missing_ratio):
+                    pages.append({"title": title, "missing": True})
+                    continue
+                if english:
+                    content = f"==English==\n===Noun===\n{{{{en-noun}}}}\n# A sense of {title}.\n"
+                else:
+                    content = f"= {{{{-ru-}}}} =\n==== Значение ====\n# толкование слова «{title}» ◆\n"
+                pages.append({"title": title, "revisions": [{"slots": {"main": {"content": content}}}]})
+            return httpx.Response(200, json={"query": {"pages": pages}})
+
+        title = titles[0]
+        if _is_missing(title, missing_ratio):
+            return httpx.Response(200, json={"query": {"pages": {"-1": {"title": title, "missing": ""}}}})
+        extract = f"<h4>Значение</h4><ol><li>толкование слова «{title}»</li></ol>"
+        return httpx.Response(200, json={"query": {"pages": {"1": {"title": title, "extract": extract}}}})
+
+    return httpx.MockTransport(handler)
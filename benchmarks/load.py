@@ -0,0 +1,262 @@
+"""Load test driving the real handlers with synthetic user traffic.
+
+    python -m benchmarks.load --users 500 --sessions 5000 --mix 85 10 5
+
+Builds the Application from main.py against the in-process fake Bot API and a fake
+Wiktionary, then replays sessions of N users: "random word" presses, a walk through
+the settings menu (settings -> change dictionary -> pick one) and the admin /addword
+conversation. Each session runs its steps in order, like a user waiting for the reply;
+sessions of different users run concurrently.
+
+Word popularity follows a Zipf distribution: the benchmark dictionaries repeat popular
+words proportionally, so the deck (and the definition cache) sees a realistic skew.
+Reports throughput, per-handler p50/p95/p99 from update arrival to the end of
+processing, Bot API call counts and peak RSS.
+"""
+import os
+import sys
+import math
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import time
+import itertools
+from collections import defaultdict
+
+# Настройки окружения — до импорта приложения
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SOURCE_DICTS = os.path.join(_ROOT, "dictionaries")
+_DATA_DIR = tempfile.mkdtemp(prefix="alias-load-")
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+os.environ.setdefault("DATA_DIR", _DATA_DIR)
+os.environ.setdefault("DICT_PATH", os.path.join(_DATA_DIR, "dictionaries"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("RATE_LIMIT_OVERALL", "1000000")
+os.environ.setdefault("RATE_LIMIT_PRIVATE_PER_SECOND", "1000000")
+# Первые ADMIN_USERS пользователей — админы, им доступен /addword
+ADMIN_USERS = 10
+os.environ.setdefault("ADMIN_IDS", ",".join(str(user_id) for user_id in range(1, ADMIN_USERS + 1)))
+
+from telegram import Update
+from telegram.ext import Application
+
+sys.path.insert(0, _ROOT)
+
+from main import build_application
+from app.config import BOT_TOKEN, DICT_PATH
+from app.texts import TEXTS
+from app.dict_index import iter_source_words
+from app.data_manager import user_language, user_selected_dict
+from app.http_client import init_http_client
+from benchmarks.fakes import BOT_USER, FakeBotAPI, fake_wiktionary_transport
+
+# Исходный словарь -> словарь бенчмарка с Zipf-повторами
+BENCH_DICTIONARIES = {
+    "Alias 2017 (Easy).txt": "bench-easy.txt",
+    "Alias 2017 (Normal).txt": "bench-normal.txt",
+}
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _zipf_weights(count: int, exponent: float) -> list[float]:
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def prepare_dictionaries(vocabulary: int, exponent: float, top_repeats: int, seed: int) -> list[str]:
+    """Writes benchmark dictionaries where a word of popularity rank r appears ~top_repeats / r^s times."""
+    rng = random.Random(seed)
+    os.makedirs(DICT_PATH, exist_ok=True)
+    for source, target in BENCH_DICTIONARIES.items():
+        words = list(dict.fromkeys(iter_source_words(os.path.join(_SOURCE_DICTS, source))))
+        rng.shuffle(words)
+        words = words[:vocabulary]
+        lines = []
+        for rank, word in enumerate(words, start=1):
+            lines.extend([word] * max(1, math.ceil(top_repeats / rank ** exponent)))
+        rng.shuffle(lines)
+        with open(os.path.join(DICT_PATH, target), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+    return sorted(BENCH_DICTIONARIES.values())
+
+
+class TrafficGenerator:
+    """Builds update payloads for scripted user sessions."""
+
+    def __init__(self, users: int, dictionaries: list[str], addword_vocabulary: list[str],
+                 exponent: float, seed: int):
+        self.users = users
+        self.dictionaries = dictionaries
+        self.rng = random.Random(seed)
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._addword_vocabulary = addword_vocabulary
+        self._addword_weights = list(itertools.accumulate(_zipf_weights(len(addword_vocabulary), exponent)))
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "language_code": "ru"}
+
+    def message(self, user_id: int, text: str) -> dict:
+        return {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": self._user(user_id),
+                "text": text,
+            },
+        }
+
+    def command(self, user_id: int, command: str) -> dict:
+        update = self.message(user_id, f"/{command}")
+        update["message"]["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command) + 1}]
+        return update
+
+    def callback(self, user_id: int, data: str) -> dict:
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._message_ids)),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": BOT_USER,
+                    "text": "…",
+                },
+            },
+        }
+
+    def session(self, kind: str) -> tuple[int, list[tuple[str, dict]]]:
+        """Returns (user id, [(handler name, update payload), ...]) for one session."""
+        if kind == "addword":
+            user_id = self.rng.randint(1, min(ADMIN_USERS, self.users))
+            words = self.rng.choices(self._addword_vocabulary, cum_weights=self._addword_weights,
+                                     k=self.rng.randint(1, 5))
+            return user_id, [
+                ("addword_start", self.command(user_id, "addword")),
+                ("addword_receive_words", self.message(user_id, "\n".join(words))),
+                ("addword_to_dict", self.callback(user_id, f"addword_to_dict:{self.rng.choice(self.dictionaries)}")),
+            ]
+
+        user_id = self.rng.randint(1, self.users)
+        if kind == "settings":
+            return user_id, [
+                ("show_settings_menu", self.message(user_id, TEXTS["ru"]["btn_settings"])),
+                ("settings_dict", self.callback(user_id, "settings_dict")),
+                ("set_default_dict", self.callback(user_id, f"set_default_dict:{self.rng.choice(self.dictionaries)}")),
+            ]
+        return user_id, [("handle_random_word", self.message(user_id, TEXTS["ru"]["btn_random_word"]))]
+
+
+async def run(args) -> dict:
+    dictionaries = prepare_dictionaries(args.vocabulary, args.zipf, args.top_repeats, args.seed)
+    addword_vocabulary = [f"слово{index}" for index in range(1, args.vocabulary + 1)]
+    traffic = TrafficGenerator(args.users, dictionaries, addword_vocabulary, args.zipf, args.seed)
+
+    bot_api = FakeBotAPI(latency=args.api_latency)
+    application: Application = build_application(
+        Application.builder().token(BOT_TOKEN).request(bot_api).get_updates_request(FakeBotAPI()),
+        concurrent_updates=args.concurrency,
+    )
+    # Клиент создаётся один раз: post_init подхватит уже готовый с фейковой Википедией
+    await init_http_client(fake_wiktionary_transport(latency=args.wiki_latency, missing_ratio=args.missing_ratio))
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    for user_id in range(1, args.users + 1):
+        user_language[user_id] = "ru"
+        user_selected_dict[user_id] = dictionaries[user_id % len(dictionaries)]
+
+    kinds = traffic.rng.choices(["random_word", "settings", "addword"], weights=args.mix, k=args.sessions)
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    # Один пользователь ведёт не больше одной сессии — иначе шаги диалогов перемешаются
+    user_locks: dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+    in_flight = asyncio.Semaphore(args.in_flight)
+    processor = application.update_processor
+
+    async def play(kind: str) -> None:
+        user_id, steps = traffic.session(kind)
+        async with in_flight, user_locks[user_id]:
+            for name, payload in steps:
+                update = Update.de_json(payload, application.bot)
+                started = time.perf_counter()
+                try:
+                    # Тот же путь, что у апдейтов из очереди Application: процессор + хендлеры
+                    await processor.process_update(update, application.process_update(update))
+                except Exception:
+                    errors[name] += 1
+                latencies[name].append(time.perf_counter() - started)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    await asyncio.gather(*(play(kind) for kind in kinds))
+    elapsed = time.perf_counter() - started
+    # Фоновые правки со спойлерами дожидаться не обязательно, но их стоит учесть в вызовах API
+    await asyncio.sleep(args.wiki_latency * 2 + 0.1)
+
+    await application.stop()
+    await application.shutdown()
+    await application.post_shutdown(application)
+
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "elapsed": elapsed,
+        "updates": total,
+        "throughput": total / elapsed if elapsed else 0.0,
+        "handlers": {
+            name: {
+                "count": len(values),
+                "errors": errors.get(name, 0),
+                "p50": _percentile(values, 0.50) * 1000,
+                "p95": _percentile(values, 0.95) * 1000,
+                "p99": _percentile(values, 0.99) * 1000,
+            }
+            for name, values in sorted(latencies.items())
+        },
+        "api_calls": dict(sorted(bot_api.calls.items())),
+        # ru_maxrss в Linux — в килобайтах
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rss_before_mb": rss_before / 1024,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Load test the bot's handlers with synthetic traffic.")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--mix", type=float, nargs=3, default=[85, 10, 5], metavar=("WORD", "SETTINGS", "ADDWORD"),
+                        help="Relative weights of random-word, settings and addword sessions")
+    parser.add_argument("--concurrency", type=int, default=16, help="Updates processed concurrently by the bot")
+    parser.add_argument("--in-flight", type=int, default=256, help="Sessions running at the same time")
+    parser.add_argument("--vocabulary", type=int, default=2000, help="Distinct words per benchmark dictionary")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of word popularity")
+    parser.add_argument("--top-repeats", type=int, default=50, help="Copies of the most popular word")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="Simulated Bot API round-trip, seconds")
+    parser.add_argument("--wiki-latency", type=float, default=0.05, help="Simulated Wiktionary round-trip, seconds")
+    parser.add_argument("--missing-ratio", type=float, default=0.1, help="Share of words Wiktionary does not know")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    print(f"{result['updates']} updates in {result['elapsed']:.2f}s: {result['throughput']:.1f} upd/s")
+    print(f"{'handler':<24} {'count':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, row in result["handlers"].items():
+        print(f"{name:<24} {row['count']:>7} {row['errors']:>7} {row['p50']:>8.1f} {row['p95']:>8.1f} {row['p99']:>8.1f}")
+    print("Bot API calls: " + ", ".join(f"{method}={count}" for method, count in result["api_calls"].items()))
+    print(f"Peak RSS: {result['peak_rss_mb']:.1f} MiB (before traffic {result['rss_before_mb']:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Microbenchmarks for the hot paths, with an optional regression check.
+
+    python -m benchmarks.micro                        # print timings
+    python -m benchmarks.micro --save baseline.json   # remember them
+    python -m benchmarks.micro --compare baseline.json --tolerance 0.25
+
+With --compare the exit code is 1 when any benchmark got slower than the baseline
+by more than the tolerance, so it can gate a change locally or in CI.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="alias-micro-"))
+os.environ.setdefault("DICT_PATH", os.path.join(_ROOT, "dictionaries"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, _ROOT)
+
+from app import data_manager
+from app.wiktionary import _extract_ru_definitions
+from app.handlers.game import _build_word_message
+
+DICTIONARY = "Alias 2017 (Normal).txt"
+
+# Типичная выдача extracts для русского слова: несколько значений с пометами и примерами
+RU_EXTRACT = (
+    "<h2><span>Русский</span></h2><h3>Морфологические и синтаксические свойства</h3>"
+    "<p>соба́ка</p><p>Существительное, одушевлённое, женский род, 1-е склонение.</p>"
+    "<h4><span>Значение</span></h4><ol>"
+    "<li><i>зоол.</i> домашнее животное семейства псовых ◆ <i>Собака лаяла всю ночь.</i></li>"
+    "<li><i>перен., разг., неодобр.</i> о злом, грубом человеке ◆ Отсутствует пример употребления.</li>"
+    "<li><i>жарг.</i> символ @ в адресе электронной почты ◆ <i>Пиши на почту через собаку.</i></li>"
+    "<li><i>техн.</i> зажимное приспособление на токарном станке</li>"
+    "</ol><h4>Синонимы</h4><ol><li>пёс</li></ol>"
+)
+DEFINITIONS = [
+    "зоол. домашнее животное семейства псовых",
+    "перен., разг., неодобр. о злом, грубом человеке",
+    "жарг. символ @ в адресе электронной почты",
+]
+
+
+def _measure(function, repeat: int, number: int) -> dict:
+    """Best-of and median per-call time in microseconds over `repeat` rounds of `number` calls."""
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        rounds.append((time.perf_counter() - started) / number * 1e6)
+    return {"best_us": min(rounds), "median_us": statistics.median(rounds), "calls": number}
+
+
+def _measure_async(loop: asyncio.AbstractEventLoop, make_coroutine, repeat: int, number: int) -> dict:
+    async def batch():
+        for _ in range(number):
+            await make_coroutine()
+
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        loop.run_until_complete(batch())
+        rounds.append((time.perf_counter() - started) / number * 1e6)
+    return {"best_us": min(rounds), "median_us": statistics.median(rounds), "calls": number}
+
+
+def run_benchmarks(repeat: int, scale: float) -> dict[str, dict]:
+    def calls(count: int) -> int:
+        return max(1, int(count * scale))
+
+    results = {}
+    loop = asyncio.new_event_loop()
+    try:
+        # Прогреваем индекс словаря, дальше меряем горячий путь из кэша
+        loop.run_until_complete(data_manager.get_words_from_dict(DICTIONARY))
+        results["get_words_from_dict (cached)"] = _measure_async(
+            loop, lambda: data_manager.get_words_from_dict(DICTIONARY), repeat, calls(20000))
+        results["get_words_from_dict (sample 10)"] = _measure_async(
+            loop, lambda: data_manager.get_words_from_dict(DICTIONARY, 10), repeat, calls(5000))
+
+        def cold():
+            data_manager.clear_cache(DICTIONARY)
+            return data_manager.get_words_from_dict(DICTIONARY)
+
+        results["get_words_from_dict (cold)"] = _measure_async(loop, cold, repeat, calls(200))
+
+        results["_extract_ru_definitions"] = _measure(
+            lambda: _extract_ru_definitions(RU_EXTRACT, "собака"), repeat, calls(5000))
+        results["_build_word_message (3 defs)"] = _measure(
+            lambda: _build_word_message("собака", "ru", DEFINITIONS), repeat, calls(10000))
+        results["_build_word_message (plain)"] = _measure(
+            lambda: _build_word_message("собака", "ru"), repeat, calls(20000))
+
+        # save_data: пачка из 500 изменённых пользователей за один сброс
+        rng = random.Random(1)
+
+        async def save_batch():
+            for user_id in range(1, 501):
+                data_manager.user_language[user_id] = "ru"
+                data_manager.user_selected_dict[user_id] = DICTIONARY
+                data_manager.user_deck[user_id] = [rng.getrandbits(32), rng.randrange(1000)]
+                data_manager._dirty_users.add(user_id)
+            await data_manager.save_data()
+
+        results["save_data (500 users)"] = _measure_async(loop, save_batch, repeat, calls(20))
+        loop.run_until_complete(data_manager.close_data())
+    finally:
+        loop.close()
+    return results
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    regressions = []
+    for name, row in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = row["best_us"] / previous["best_us"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: {previous['best_us']:.1f}us -> {row['best_us']:.1f}us ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the bot's hot paths.")
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds per benchmark; the best one is compared")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the number of calls per round")
+    parser.add_argument("--save", metavar="FILE", help="Write results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="Fail if slower than this JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown for --compare, 0.25 = 25%%")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.repeat, args.scale)
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"{'benchmark':<34} {'best us':>10} {'median us':>10} {'baseline':>10}")
+    for name, row in results.items():
+        previous = baseline.get(name, {}).get("best_us")
+        previous_text = f"{previous:.1f}" if previous is not None else "-"
+        print(f"{name:<34} {row['best_us']:>10.1f} {row['median_us']:>10.1f} {previous_text:>10}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
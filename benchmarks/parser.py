@@ -0,0 +1,165 @@
+"""Definition parser: equivalence check and speed against the frozen reference.
+
+    python -m benchmarks.parser                       # check outputs, print timings
+    python -m benchmarks.parser --record dog кошка    # append live responses to the fixtures
+
+Every fixture in benchmarks/fixtures/wiktionary.json is parsed by app.wiktionary and by
+benchmarks/parser_reference.py (the parser as it was before the single-pass rewrite),
+and the Telegram message is built from the result by both versions. Any difference in
+the output is printed and the exit code is 1. Timings are reported with the
+normalization caches warm (repeated words, as in a game) and cleared before every pass.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import tempfile
+import urllib.request
+from urllib.parse import quote_plus
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="alias-parser-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, _ROOT)
+
+from app import wiktionary
+from app.definitions import WIKTIONARY_USER_AGENT, _revisions_url
+from app.handlers.game import _build_word_message
+from benchmarks import parser_reference as reference
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "wiktionary.json")
+_LANG = {"ru_extract": "ru", "ru_wikitext": "ru", "en_definition": "en", "en_wikitext": "en"}
+
+
+def _payload(kind: str, response: dict):
+    """The part of a fixture response that app.definitions hands to the parser."""
+    if kind == "ru_extract":
+        page = next(iter(response.get("query", {}).get("pages", {}).values()), {})
+        return page.get("extract", "")
+    if kind == "en_definition":
+        return response
+    pages = response.get("query", {}).get("pages", [])
+    if not pages or not pages[0].get("revisions"):
+        return ""
+    return pages[0]["revisions"][0].get("slots", {}).get("main", {}).get("content", "")
+
+
+def _parsers(module) -> dict:
+    return {
+        "ru_extract": module._extract_ru_definitions,
+        "en_definition": module._extract_en_definitions,
+        "ru_wikitext": module.ru_definitions_from_wikitext,
+        "en_wikitext": module.en_definitions_from_wikitext,
+    }
+
+
+def load_corpus(path: str) -> list[tuple[str, str, object]]:
+    with open(path, encoding="utf-8") as f:
+        records = json.load(f)["records"]
+    return [(record["kind"], record["word"], _payload(record["kind"], record["response"])) for record in records]
+
+
+def check(corpus) -> list[str]:
+    current, frozen = _parsers(wiktionary), _parsers(reference)
+    mismatches = []
+    for kind, word, payload in corpus:
+        expected = frozen[kind](payload, word)
+        actual = current[kind](payload, word)
+        if actual != expected:
+            mismatches.append(f"{kind} {word!r}: {expected!r} != {actual!r}")
+            continue
+        lang = _LANG[kind]
+        if _build_word_message(word, lang, actual) != reference._build_word_message(word, lang, expected):
+            mismatches.append(f"{kind} {word!r}: message differs")
+    return mismatches
+
+
+def _time_pass(corpus, parsers, build_message, repeat: int, number: int, before_pass=None) -> dict:
+    """Best-of and median time of one pass over the corpus, in microseconds."""
+    rounds = []
+    for _ in range(repeat):
+        elapsed = 0.0
+        for _ in range(number):
+            if before_pass is not None:
+                before_pass()
+            started = time.perf_counter()
+            for kind, word, payload in corpus:
+                build_message(word, _LANG[kind], parsers[kind](payload, word))
+            elapsed += time.perf_counter() - started
+        rounds.append(elapsed / number * 1e6)
+    return {"best_us": min(rounds), "median_us": statistics.median(rounds)}
+
+
+def _clear_caches() -> None:
+    wiktionary._normalize_for_compare.cache_clear()
+    wiktionary._headword_prefix_re.cache_clear()
+
+
+def run_benchmarks(corpus, repeat: int, number: int) -> dict[str, tuple[dict, dict]]:
+    current, frozen = _parsers(wiktionary), _parsers(reference)
+    results = {}
+    for label, clear in (("warm caches", None), ("cold caches", _clear_caches)):
+        results[label] = (
+            _time_pass(corpus, frozen, reference._build_word_message, repeat, number),
+            _time_pass(corpus, current, _build_word_message, repeat, number, clear),
+        )
+    return results
+
+
+def record(words: list[str], path: str) -> None:
+    """Fetches the same endpoints as app.definitions and appends the raw responses."""
+    def get(url: str) -> dict:
+        request = urllib.request.Request(url, headers={"User-Agent": WIKTIONARY_USER_AGENT})
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.load(response)
+
+    with open(path, encoding="utf-8") as f:
+        fixtures = json.load(f)
+    for word in words:
+        lang = "ru" if any("а" <= ch.lower() <= "я" or ch.lower() == "ё" for ch in word) else "en"
+        if lang == "ru":
+            extract_url = ("https://ru.wiktionary.org/w/api.php"
+                           f"?action=query&prop=extracts&titles={quote_plus(word)}&format=json")
+            fixtures["records"].append({"kind": "ru_extract", "word": word, "response": get(extract_url)})
+        else:
+            definition_url = f"https://en.wiktionary.org/api/rest_v1/page/definition/{quote_plus(word)}"
+            fixtures["records"].append({"kind": "en_definition", "word": word, "response": get(definition_url)})
+        fixtures["records"].append({"kind": f"{lang}_wikitext", "word": word, "response": get(_revisions_url(lang, [word]))})
+        print(f"recorded {word} ({lang})")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixtures, f, ensure_ascii=False, indent=1)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare the definition parser with its frozen reference.")
+    parser.add_argument("--fixtures", default=FIXTURES, help="Wiktionary responses (JSON)")
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds per benchmark; the best one is compared")
+    parser.add_argument("--number", type=int, default=200, help="Passes over the corpus per round")
+    parser.add_argument("--record", nargs="+", metavar="WORD", help="Fetch live responses for these words and exit")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record(args.record, args.fixtures)
+        return
+
+    corpus = load_corpus(args.fixtures)
+    mismatches = check(corpus)
+    print(f"{len(corpus)} fixtures, {len(mismatches)} mismatches")
+    for line in mismatches:
+        print(f"  {line}")
+
+    print(f"{'pass over the corpus':<22} {'reference us':>13} {'current us':>11} {'speedup':>8}")
+    for label, (before, after) in run_benchmarks(corpus, args.repeat, args.number).items():
+        speedup = before["best_us"] / after["best_us"]
+        print(f"{label:<22} {before['best_us']:>13.1f} {after['best_us']:>11.1f} {speedup:>7.2f}x")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
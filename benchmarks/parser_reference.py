@@ -0,0 +1,260 @@
+"""Frozen copy of the definition parser and message builder before the single-pass rewrite.
+
+benchmarks/parser.py runs both versions over the recorded fixtures: outputs must be
+identical, and the timings show the speedup. Do not edit to match app changes.
+"""
+import html as html_lib
+import re
+import unicodedata
+from urllib.parse import quote_plus
+
+from app.texts import get_text
+
+MAX_DEFINITIONS = 3
+MAX_DEFINITION_LENGTH = 220
+
+
+def _normalize_ws(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _normalize_for_compare(text: str) -> str:
+    normalized = unicodedata.normalize("NFD", text.lower())
+    return "".join(ch for ch in normalized if unicodedata.category(ch) != "Mn")
+
+
+def _strip_headword_prefix(definition: str, word: str) -> str:
+    definition = definition.strip()
+    if not definition:
+        return definition
+
+    normalized_def = _normalize_for_compare(definition)
+    normalized_word = _normalize_for_compare(word)
+    if not normalized_def.startswith(normalized_word):
+        return definition
+
+    if len(normalized_def) > len(normalized_word) and normalized_def[len(normalized_word)].isalnum():
+        return definition
+
+    pattern_parts: list[str] = []
+    for ch in word:
+        if ch.isspace():
+            pattern_parts.append(r"\s+")
+        else:
+            pattern_parts.append(f"{re.escape(ch)}\u0301?")
+
+    pattern = r"^\s*" + "".join(pattern_parts) + r"\s*(?:[-—–:;,]\s*)?"
+    stripped = re.sub(pattern, "", definition, flags=re.IGNORECASE)
+    stripped = stripped.strip()
+    return stripped if stripped else definition
+
+
+def _extract_ru_definitions(extract_html: str, word: str) -> list[str]:
+    heading_match = re.search(
+        r"<h[2-6][^>]*>\s*(?:<span[^>]*>\s*)?Значение\s*(?:</span>\s*)?</h[2-6]>",
+        extract_html,
+        flags=re.DOTALL,
+    )
+    if not heading_match:
+        return []
+
+    section_html = extract_html[heading_match.end():]
+    list_match = re.search(r"<ol>(.*?)</ol>", section_html, flags=re.DOTALL)
+    if not list_match:
+        return []
+
+    definitions: list[str] = []
+    for raw_item in re.findall(r"<li[^>]*>(.*?)</li>", list_match.group(1), flags=re.DOTALL):
+        text = re.sub(r"<[^>]+>", "", raw_item)
+        text = html_lib.unescape(text)
+        text = text.split("◆", 1)[0]
+        text = _normalize_ws(text)
+        if not text:
+            continue
+        if text.startswith("Отсутствует пример"):
+            continue
+
+        text = _strip_headword_prefix(text, word)
+        if _normalize_for_compare(text) == _normalize_for_compare(word):
+            continue
+
+        if len(text) > MAX_DEFINITION_LENGTH:
+            text = text[: MAX_DEFINITION_LENGTH - 1].rstrip() + "…"
+
+        if text not in definitions:
+            definitions.append(text)
+        if len(definitions) >= MAX_DEFINITIONS:
+            break
+
+    return definitions
+
+
+def _extract_en_definitions(definition_data: dict, word: str) -> list[str]:
+    lang_data = definition_data.get("en", [])
+    if not lang_data and definition_data:
+        first_value = next(iter(definition_data.values()), [])
+        if isinstance(first_value, list):
+            lang_data = first_value
+
+    definitions: list[str] = []
+    for part in lang_data:
+        if not isinstance(part, dict):
+            continue
+        for def_obj in part.get("definitions", []):
+            raw_definition = def_obj.get("definition")
+            if not raw_definition:
+                continue
+
+            text = re.sub(r"<[^>]+>", "", raw_definition)
+            text = re.sub(r"\[\[(?:[^|\]]*\|)?([^\]]+)\]\]", r"\1", text)
+            text = html_lib.unescape(text)
+            text = _normalize_ws(text)
+            if not text:
+                continue
+
+            text = _strip_headword_prefix(text, word)
+            if _normalize_for_compare(text) == _normalize_for_compare(word):
+                continue
+
+            if len(text) > MAX_DEFINITION_LENGTH:
+                text = text[: MAX_DEFINITION_LENGTH - 1].rstrip() + "…"
+
+            if text not in definitions:
+                definitions.append(text)
+            if len(definitions) >= MAX_DEFINITIONS:
+                return definitions
+
+    return definitions
+
+
+# --- Викитекст (дампы и action=query&prop=revisions) ---
+
+_WIKI_HEADING_RE = re.compile(r"^(=+)\s*(.*?)\s*\1\s*$")
+_WIKI_TEMPLATE_RE = re.compile(r"\{\{([^{}]*)\}\}")
+_WIKI_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_WIKI_REF_RE = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL)
+_WIKI_QUOTES_RE = re.compile(r"'{2,}")
+_EN_LINK_TEMPLATES = {"l", "m", "link", "mention"}
+
+
+def _render_ru_template(match: re.Match) -> str:
+    parts = [part.strip() for part in match.group(1).split("|")]
+    name = parts[0]
+    # {{пример|...}} в HTML-выдаче уходит после «◆», его отрезает _extract_ru_definitions
+    if name == "пример":
+        return " ◆ "
+    if name in ("помета", "помета.") and len(parts) > 1:
+        return parts[1]
+    if name.endswith(".") and " " not in name:
+        return f"{name} "
+    return ""
+
+
+def _render_en_template(match: re.Match) -> str:
+    parts = [part.strip() for part in match.group(1).split("|")]
+    name = parts[0]
+    args = [part for part in parts[1:] if "=" not in part]
+    if name in ("lb", "lbl", "label") and len(args) > 1:
+        return "(" + ", ".join(args[1:]) + ") "
+    if name in ("w", "vern", "taxlink") and args:
+        return args[-1]
+    if name in _EN_LINK_TEMPLATES and args:
+        # {{l|en|target|display}}
+        return args[2] if len(args) > 2 and args[2] else args[min(1, len(args) - 1)]
+    if name == "gloss" and args:
+        return f"({args[0]})"
+    return ""
+
+
+def _wikitext_section_lines(wikitext: str, heading_matches) -> list[str]:
+    """Definition lines ("# ...") under the first heading accepted by heading_matches."""
+    lines: list[str] = []
+    inside = False
+    for line in wikitext.splitlines():
+        heading = _WIKI_HEADING_RE.match(line.strip())
+        if heading:
+            if inside and lines:
+                break
+            inside = heading_matches(heading.group(2))
+            continue
+        if inside and line.startswith("#") and not line.startswith(("#:", "#*", "##")):
+            lines.append(line.lstrip("#").strip())
+    return lines
+
+
+def _clean_wikitext(text: str, render_template) -> str:
+    text = _WIKI_COMMENT_RE.sub("", text)
+    text = _WIKI_REF_RE.sub("", text)
+    # Вложенные шаблоны раскрываем изнутри наружу
+    previous = None
+    while previous != text:
+        previous = text
+        text = _WIKI_TEMPLATE_RE.sub(render_template, text)
+    return _WIKI_QUOTES_RE.sub("", text)
+
+
+def ru_definitions_from_wikitext(wikitext: str, word: str) -> list[str]:
+    lines = _wikitext_section_lines(wikitext, lambda title: title == "Значение")
+    if not lines:
+        return []
+    # Собираем тот же HTML, что отдаёт prop=extracts, и прогоняем через общий парсер
+    items = []
+    for line in lines:
+        text = _clean_wikitext(line, _render_ru_template)
+        text = re.sub(r"\[\[(?:[^|\]]*\|)?([^\]]+)\]\]", r"\1", text)
+        items.append(f"<li>{html_lib.escape(text)}</li>")
+    return _extract_ru_definitions(f"<h4>Значение</h4><ol>{''.join(items)}</ol>", word)
+
+
+def en_definitions_from_wikitext(wikitext: str, word: str) -> list[str]:
+    english = wikitext
+    match = re.search(r"^==\s*English\s*==\s*$", wikitext, flags=re.MULTILINE)
+    if match:
+        english = wikitext[match.end():]
+        next_language = re.search(r"^==[^=].*?==\s*$", english, flags=re.MULTILINE)
+        if next_language:
+            english = english[:next_language.start()]
+    elif "==" in wikitext:
+        return []
+
+    definitions = []
+    for line in english.splitlines():
+        if line.startswith("# ") or (line.startswith("#") and line[1:2] not in (":", "*", "#")):
+            text = _clean_wikitext(line.lstrip("#").strip(), _render_en_template)
+            definitions.append({"definition": html_lib.escape(text, quote=False)})
+    return _extract_en_definitions({"en": [{"definitions": definitions}]}, word)
+
+
+# --- app/handlers/game.py ---
+
+def _build_word_message(word: str, lang: str, definitions: list[str] | None = None) -> str:
+    dictionary_link = f"https://{lang}.wiktionary.org/wiki/{quote_plus(word)}"
+    safe_word = html_lib.escape(word)
+    message_text = f"{get_text('random_word_title', lang)} <a href='{dictionary_link}'><b>{safe_word}</b></a>"
+
+    if definitions:
+        title = html_lib.escape(get_text("definition_title", lang))
+        # 1. Title is OUTSIDE the spoiler
+        message_text += f"\n\n📖 <b>{title}:</b>\n<tg-spoiler>"
+        
+        # 2. Each definition on a new line with double newline for better spacing
+        spoiler_content = ""
+        for index, item in enumerate(definitions):
+            # 3. Bold Wiktionary labels (e.g., 'разг.', 'физ., техн.', 'сленг', 'ж. р.')
+            item_escaped = html_lib.escape(item)
+            
+            # Regex to match Wiktionary labels at the start:
+            # - Words ending with a dot (incl. hyphens): 'разг.', 'с.-х.'
+            # - Short specific words without dots: 'сленг', 'табу', 'кино'
+            # - Multi-part labels: 'вводн. сл.'
+            # It matches sequences of these separated by spaces or commas.
+            label_regex = r'^((?:(?:[а-яё0-9-+]+\.|\bсленг\b|\bтабу\b|\bкино\b)\s*,?\s*)+)'
+            item_bolded = re.sub(label_regex, r'<b>\1</b>', item_escaped)
+            
+            prefix = f"{index + 1}. " if len(definitions) > 1 else "• "
+            spoiler_content += f"{prefix}{item_bolded}\n\n"
+
+        
+        message_text += f"{spoiler_content.strip()}</tg-spoiler>"
+
+    return message_text
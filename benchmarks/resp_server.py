@@ -0,0 +1,172 @@
+"""Local in-memory stand-in for a Redis server, enough for the bot's state backends.
+
+    python -m benchmarks.resp_server --port 6390
+    STATE_BACKEND=redis REDIS_URL=redis://127.0.0.1:6390/0 BOT_WORKERS=4 python main.py
+
+Implements the subset of commands used by app.storage (hashes, sorted sets,
+PING/AUTH/SELECT). Data lives only in memory of this process.
+"""
+import asyncio
+import argparse
+
+
+class RespStandIn:
+    def __init__(self):
+        self.databases: dict[int, dict[str, dict]] = {}
+
+    def _db(self, state: dict) -> dict:
+        return self.databases.setdefault(state["db"], {})
+
+    def _hash(self, state: dict, key: str, create: bool = False) -> dict | None:
+        db = self._db(state)
+        if create:
+            return db.setdefault(key, {})
+        return db.get(key)
+
+    def execute(self, state: dict, command: list[str]):
+        name = command[0].upper()
+        args = command[1:]
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            return RuntimeError(f"ERR unknown command '{name}'")
+        try:
+            return handler(state, *args)
+        except (TypeError, ValueError):
+            return RuntimeError(f"ERR wrong arguments for '{name}'")
+
+    def cmd_ping(self, state, message=None):
+        return message if message is not None else "+PONG"
+
+    def cmd_auth(self, state, *args):
+        return "+OK"
+
+    def cmd_select(self, state, db):
+        state["db"] = int(db)
+        return "+OK"
+
+    def cmd_flushdb(self, state):
+        self._db(state).clear()
+        return "+OK"
+
+    def cmd_del(self, state, *keys):
+        db = self._db(state)
+        return sum(db.pop(key, None) is not None for key in keys)
+
+    def cmd_hset(self, state, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise ValueError
+        data = self._hash(state, key, create=True)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in data
+            data[field] = value
+        return added
+
+    def cmd_hget(self, state, key, field):
+        return (self._hash(state, key) or {}).get(field)
+
+    def cmd_hmget(self, state, key, *fields):
+        data = self._hash(state, key) or {}
+        return [data.get(field) for field in fields]
+
+    def cmd_hgetall(self, state, key):
+        data = self._hash(state, key) or {}
+        return [item for pair in data.items() for item in pair]
+
+    def cmd_hlen(self, state, key):
+        return len(self._hash(state, key) or {})
+
+    def cmd_hdel(self, state, key, *fields):
+        data = self._hash(state, key) or {}
+        return sum(data.pop(field, None) is not None for field in fields)
+
+    def cmd_hincrby(self, state, key, field, increment):
+        data = self._hash(state, key, create=True)
+        value = int(data.get(field, "0")) + int(increment)
+        data[field] = str(value)
+        return value
+
+    def cmd_zadd(self, state, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise ValueError
+        scores = self._hash(state, key, create=True)
+        added = 0
+        for score, member in zip(pairs[::2], pairs[1::2]):
+            added += member not in scores
+            scores[member] = float(score)
+        return added
+
+    def cmd_zrevrange(self, state, key, start, stop):
+        scores = self._hash(state, key) or {}
+        ordered = sorted(scores, key=lambda member: (scores[member], member), reverse=True)
+        start, stop = int(start), int(stop)
+        stop = len(ordered) + stop if stop < 0 else stop
+        return ordered[start:stop + 1]
+
+
+def _encode(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, RuntimeError):
+        return f"-{reply}\r\n".encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, str) and reply.startswith("+"):
+        return f"{reply}\r\n".encode()
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(_encode(item) for item in reply)
+    data = str(reply).encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+async def _read_command(reader: asyncio.StreamReader) -> list[str] | None:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline-команда, как из telnet
+        return line.decode().split()
+    command = []
+    for _ in range(int(line[1:-2])):
+        header = await reader.readline()
+        length = int(header[1:-2])
+        command.append((await reader.readexactly(length + 2))[:-2].decode())
+    return command
+
+
+def serve(store: RespStandIn):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        state = {"db": 0}
+        try:
+            while True:
+                command = await _read_command(reader)
+                if command is None or (command and command[0].upper() == "QUIT"):
+                    break
+                if command:
+                    writer.write(_encode(store.execute(state, command)))
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="In-memory Redis-protocol stand-in for local runs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args(argv)
+
+    server = await asyncio.start_server(serve(RespStandIn()), args.host, args.port)
+    print(f"RESP stand-in listening on {args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
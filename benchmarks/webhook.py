@@ -0,0 +1,182 @@
+"""Webhook mode benchmark against an in-process fake Bot API.
+
+    python -m benchmarks.webhook --updates 2000 --users 200 --concurrency 1 4 16 64
+
+Starts the real application with PTB's webhook server on localhost, POSTs synthetic
+"random word" updates with the secret token header and measures the time from the
+POST to the bot's sendMessage reply. Bot API and Wiktionary are faked in-process, so
+the numbers show the bot's own overhead plus the simulated latencies.
+"""
+import os
+import sys
+import socket
+import asyncio
+import argparse
+import tempfile
+import time
+import json
+import subprocess
+from collections import defaultdict, deque
+
+# Настройки окружения — до импорта приложения
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="alias-bench-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Лимиты Telegram здесь не меряем
+os.environ.setdefault("RATE_LIMIT_OVERALL", "1000000")
+os.environ.setdefault("RATE_LIMIT_PRIVATE_PER_SECOND", "1000000")
+
+import httpx
+from telegram.ext import Application
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import build_application
+from app.config import BOT_TOKEN
+from app.texts import TEXTS
+from app.data_manager import user_language, user_selected_dict, get_available_dictionaries
+from app.http_client import init_http_client
+from benchmarks.fakes import FakeBotAPI, fake_wiktionary_transport
+
+SECRET = "benchmark-secret"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _update(update_id: int, user_id: int, lang: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": TEXTS[lang]["btn_random_word"],
+        },
+    }
+
+
+async def run_once(concurrency: int, updates: int, users: int, api_latency: float,
+                   wiki_latency: float, senders: int) -> dict:
+    bot_api = FakeBotAPI(latency=api_latency)
+    application: Application = build_application(
+        Application.builder().token(BOT_TOKEN).request(bot_api).get_updates_request(FakeBotAPI()),
+        concurrent_updates=concurrency,
+    )
+    await init_http_client(fake_wiktionary_transport(latency=wiki_latency))
+
+    dictionary = (await get_available_dictionaries())[0]
+    for user_id in range(1, users + 1):
+        user_language[user_id] = "ru"
+        user_selected_dict[user_id] = dictionary
+
+    sent_at: dict[int, deque] = defaultdict(deque)
+    latencies: list[float] = []
+    done = asyncio.Event()
+
+    def on_call(method: str, params: dict, now: float) -> None:
+        if method != "sendMessage":
+            return
+        pending = sent_at.get(int(params["chat_id"]))
+        if pending:
+            latencies.append(now - pending.popleft())
+            if len(latencies) == updates:
+                done.set()
+
+    bot_api.listeners.append(on_call)
+
+    port = _free_port()
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_webhook(
+        listen="127.0.0.1", port=port, url_path="telegram", secret_token=SECRET,
+        webhook_url="https://example.invalid/telegram",
+    )
+    await application.start()
+
+    url = f"http://127.0.0.1:{port}/telegram"
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    queue: asyncio.Queue = asyncio.Queue()
+    for update_id in range(1, updates + 1):
+        queue.put_nowait(update_id)
+
+    async def sender(client: httpx.AsyncClient) -> None:
+        while not queue.empty():
+            update_id = queue.get_nowait()
+            user_id = update_id % users + 1
+            sent_at[user_id].append(time.monotonic())
+            response = await client.post(url, json=_update(update_id, user_id, "ru"), headers=headers)
+            response.raise_for_status()
+
+    started = time.monotonic()
+    async with httpx.AsyncClient(timeout=30) as client:
+        rejected = await client.post(url, json=_update(0, 1, "ru"))
+        await asyncio.gather(*(sender(client) for _ in range(senders)))
+    try:
+        await asyncio.wait_for(done.wait(), timeout=120)
+    except TimeoutError:
+        pass
+    elapsed = time.monotonic() - started
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    await application.post_shutdown(application)
+
+    return {
+        "concurrency": concurrency,
+        "replies": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": _percentile(latencies, 0.50) * 1000 if latencies else 0.0,
+        "p95": _percentile(latencies, 0.95) * 1000 if latencies else 0.0,
+        "p99": _percentile(latencies, 0.99) * 1000 if latencies else 0.0,
+        "bad_secret_status": rejected.status_code,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark webhook mode against a fake Bot API.")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--senders", type=int, default=32, help="Parallel HTTP clients posting updates")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="Simulated Bot API round-trip, seconds")
+    parser.add_argument("--wiki-latency", type=float, default=0.05, help="Simulated Wiktionary round-trip, seconds")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        result = asyncio.run(run_once(args.concurrency[0], args.updates, args.users, args.api_latency,
+                                      args.wiki_latency, args.senders))
+        print(json.dumps(result))
+        return
+
+    print(f"{'concurrency':>11} {'replies':>8} {'upd/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for concurrency in args.concurrency:
+        # Каждый прогон — в отдельном процессе с чистым DATA_DIR: хранилища живут весь процесс
+        env = {**os.environ, "DATA_DIR": tempfile.mkdtemp(prefix="alias-bench-")}
+        command = [
+            sys.executable, "-m", "benchmarks.webhook", "--child",
+            "--concurrency", str(concurrency), "--updates", str(args.updates), "--users", str(args.users),
+            "--senders", str(args.senders), "--api-latency", str(args.api_latency),
+            "--wiki-latency", str(args.wiki_latency),
+        ]
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{result['concurrency']:>11} {result['replies']:>8} {result['throughput']:>8.1f} "
+              f"{result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f}")
+        if result["bad_secret_status"] != 403:
+            print(f"  warning: update without secret token got HTTP {result['bad_secret_status']}")
+
+
+if __name__ == "__main__":
+    main()
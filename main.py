@@ -1,19 +1,87 @@
 import logging
-from telegram.ext import (Application, CommandHandler, CallbackQueryHandler, 
-                          MessageHandler, filters, ConversationHandler)
+from telegram import Update
+from telegram.ext import (Application, ApplicationBuilder, CommandHandler, CallbackQueryHandler,
+                          InlineQueryHandler, MessageHandler, TypeHandler, filters, ConversationHandler)
 
-from app.config import BOT_TOKEN, logger
+from app.config import (BOT_TOKEN, BOT_API_BASE_URL, RATE_LIMIT_OVERALL, RATE_LIMIT_PRIVATE_PER_SECOND,
+                        RATE_LIMIT_GROUP_PER_MINUTE, RATE_LIMIT_MAX_RETRIES, BOT_MODE,
+                        CONCURRENT_UPDATES, BOT_WORKERS, WORKER_INDEX, METRICS_HOST,
+                        METRICS_PORT, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH,
+                        WEBHOOK_URL, WEBHOOK_SECRET, logger)
+from app.rate_limiter import OutboundRateLimiter
+from app.metrics import instrument_handler, register_collector, start_metrics_server, stop_metrics_server
+from app.update_processor import PerUserUpdateProcessor
+from app.data_manager import close_data, start_cache_sync, refresh_user_state
+from app.dict_registry import start_dictionary_watch, stop_dictionary_watch
+from app.search_index import warm_search_index, stop_search_index
+from app.sharding import build_router_application
+from app.http_client import init_http_client, close_http_client
+from app.tasks import start_schedulers, stop_schedulers
 from app.texts import TEXTS
 from app.handlers.common import start, error_handler, cancel_conversation, show_main_menu_and_welcome
 from app.handlers.game import handle_random_word
+from app.handlers.inline import handle_inline_query
+from app.definitions import warm_definition_cache, close_definition_store
 from app.handlers.settings import (show_settings_menu, handle_change_dict, 
                                  handle_change_lang, button_callback_handler)
 from app.handlers.admin import (addword_start, addword_receive_words, 
-                              dict_upload_start, dict_upload_handler,
+                              dict_upload_start, dict_upload_handler, stats_command,
+                              profile_command,
                               AWAITING_WORDS, AWAITING_DICT_CHOICE)
 
-def main():
-    application = Application.builder().token(BOT_TOKEN).build()
+async def on_startup(application: Application):
+    await init_http_client()
+    await warm_definition_cache()
+    await start_cache_sync()
+    await start_dictionary_watch()
+    await warm_search_index()
+    start_schedulers()
+    await start_metrics_server(METRICS_HOST, METRICS_PORT + max(WORKER_INDEX, 0) if METRICS_PORT else 0)
+
+async def on_shutdown(application: Application):
+    await stop_metrics_server()
+    await stop_dictionary_watch()
+    await stop_search_index()
+    await stop_schedulers()
+    await close_http_client()
+    await close_data()
+    close_definition_store()
+
+async def refresh_state(update: Update, context) -> None:
+    if update.effective_user is not None:
+        await refresh_user_state(update.effective_user.id)
+
+def application_builder() -> ApplicationBuilder:
+    builder = Application.builder().token(BOT_TOKEN)
+    if BOT_API_BASE_URL:
+        builder = builder.base_url(BOT_API_BASE_URL)
+    return builder
+
+def build_application(builder: ApplicationBuilder | None = None,
+                      concurrent_updates: int = CONCURRENT_UPDATES) -> Application:
+    if builder is None:
+        builder = application_builder()
+    # Общий лимит Bot API делят все воркеры; лимиты чатов — нет: каждый чат обслуживает один воркер
+    overall = RATE_LIMIT_OVERALL / BOT_WORKERS if WORKER_INDEX >= 0 else RATE_LIMIT_OVERALL
+    rate_limiter = OutboundRateLimiter(
+        overall,
+        RATE_LIMIT_PRIVATE_PER_SECOND,
+        RATE_LIMIT_GROUP_PER_MINUTE,
+        RATE_LIMIT_MAX_RETRIES,
+    )
+    register_collector(rate_limiter.metric_samples)
+    application = (
+        builder
+        .concurrent_updates(PerUserUpdateProcessor(concurrent_updates))
+        .rate_limiter(rate_limiter)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
+
+    if WORKER_INDEX >= 0:
+        # Группа -1 идёт раньше хендлеров: они видят настройки, которые мог поменять другой воркер
+        application.add_handler(TypeHandler(Update, refresh_state), group=-1)
 
     # Filters for Reply Keyboard buttons
     RANDOM_WORD_FILTER = filters.Text([TEXTS['en']['btn_random_word'], TEXTS['ru']['btn_random_word']])
@@ -21,32 +89,58 @@ def main():
     BACK_TO_GAME_FILTER = filters.Text([TEXTS['en']['btn_back_to_game'], TEXTS['ru']['btn_back_to_game']])
 
     # Basic handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(MessageHandler(RANDOM_WORD_FILTER, handle_random_word))
-    application.add_handler(MessageHandler(SETTINGS_FILTER, show_settings_menu))
-    application.add_handler(MessageHandler(BACK_TO_GAME_FILTER, show_main_menu_and_welcome))
+    application.add_handler(CommandHandler("start", instrument_handler(start)))
+    application.add_handler(MessageHandler(RANDOM_WORD_FILTER, instrument_handler(handle_random_word)))
+    application.add_handler(MessageHandler(SETTINGS_FILTER, instrument_handler(show_settings_menu)))
+    application.add_handler(MessageHandler(BACK_TO_GAME_FILTER, instrument_handler(show_main_menu_and_welcome)))
 
     
     # Admin & Word addition handlers
     addword_conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("addword", addword_start)],
+        entry_points=[CommandHandler("addword", instrument_handler(addword_start))],
         states={
-            AWAITING_WORDS: [MessageHandler(filters.TEXT & ~filters.COMMAND, addword_receive_words)],
-            AWAITING_DICT_CHOICE: [CallbackQueryHandler(button_callback_handler, pattern="^addword_to_dict:")],
+            AWAITING_WORDS: [MessageHandler(filters.TEXT & ~filters.COMMAND, instrument_handler(addword_receive_words))],
+            AWAITING_DICT_CHOICE: [CallbackQueryHandler(instrument_handler(button_callback_handler), pattern="^addword_to_dict:")],
         },
-        fallbacks=[CommandHandler("cancel", cancel_conversation)],
+        fallbacks=[CommandHandler("cancel", instrument_handler(cancel_conversation))],
     )
 
     application.add_handler(addword_conv_handler)
-    application.add_handler(CommandHandler("dict_upload", dict_upload_start))
-    application.add_handler(MessageHandler(filters.Document.TXT, dict_upload_handler))
+    application.add_handler(CommandHandler("dict_upload", instrument_handler(dict_upload_start)))
+    application.add_handler(CommandHandler("stats", instrument_handler(stats_command)))
+    application.add_handler(CommandHandler("profile", instrument_handler(profile_command)))
+    application.add_handler(MessageHandler(filters.Document.TXT, instrument_handler(dict_upload_handler)))
     
+    # Inline mode: @bot <prefix> in any chat
+    application.add_handler(InlineQueryHandler(instrument_handler(handle_inline_query)))
+
     # Callback Query handler for inline buttons
-    application.add_handler(CallbackQueryHandler(button_callback_handler))
+    application.add_handler(CallbackQueryHandler(instrument_handler(button_callback_handler)))
     
     # Error handler
     application.add_error_handler(error_handler)
-    
+    return application
+
+def main():
+    if BOT_WORKERS > 1 and WORKER_INDEX < 0:
+        logger.info(f"Routing updates to {BOT_WORKERS} worker processes.")
+        application = build_router_application(BOT_WORKERS, application_builder())
+    else:
+        application = build_application()
+
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL:
+            raise ValueError("WEBHOOK_URL is required when BOT_MODE=webhook")
+        logger.info(f"Starting bot in webhook mode on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}...")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET or None,
+        )
+        return
+
     logger.info("Starting bot (modular version)...")
     application.run_polling()
 
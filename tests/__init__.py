@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Настройки — до импорта приложения: временная папка данных вместо data/
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="alias-tests-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
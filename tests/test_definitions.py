@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import unittest
+from unittest import mock
+from urllib.parse import parse_qs, unquote_plus, urlsplit
+
+from app import definitions
+
+PAIRS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "wiktionary_pairs.json")
+
+
+class BatchCancellationTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        definitions.DEFINITION_CACHE.clear()
+        definitions._inflight_definitions.clear()
+        self.upstream_started = asyncio.Event()
+        self.release_upstream = asyncio.Event()
+
+        async def slow_batch(words, lang):
+            self.upstream_started.set()
+            await self.release_upstream.wait()
+            return {word: ([f"{word} from batch"], True) for word in words}
+
+        async def no_local(lang, words):
+            return {}
+
+        async def no_save(lang, fetched):
+            return None
+
+        for target, replacement in (
+            ("_fetch_definitions_upstream_batch", slow_batch),
+            ("_load_local_definitions", no_local),
+            ("_save_fetched_definitions", no_save),
+        ):
+            patcher = mock.patch.object(definitions, target, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_cancelled_caller_does_not_fail_waiters(self):
+        batch_caller = asyncio.create_task(definitions.fetch_definitions_batch(["кот"], "ru"))
+        await self.upstream_started.wait()
+        waiter = asyncio.create_task(definitions.fetch_definitions("кот", "ru"))
+        await asyncio.sleep(0)
+
+        batch_caller.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await batch_caller
+        self.release_upstream.set()
+
+        self.assertEqual(await waiter, ["кот from batch"])
+        self.assertNotIn(("ru", "кот"), definitions._inflight_definitions)
+
+    async def test_waiter_fetches_itself_when_batch_dies(self):
+        batch_caller = asyncio.create_task(definitions.fetch_definitions_batch(["кот"], "ru"))
+        await self.upstream_started.wait()
+        waiter = asyncio.create_task(definitions.fetch_definitions("кот", "ru"))
+        await asyncio.sleep(0)
+
+        async def own_fetch(word, lang):
+            return [f"{word} fetched alone"], 1, True
+
+        with mock.patch.object(definitions, "_fetch_definitions_upstream", own_fetch):
+            for batch in list(definitions._batch_tasks):
+                batch.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await batch_caller
+            self.assertEqual(await waiter, ["кот fetched alone"])
+
+
+class FixtureWiktionary:
+    """Answers the Wiktionary URLs app.definitions builds from recorded responses."""
+
+    def __init__(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            self.records = {(record["kind"], record["word"]): record["response"] for record in json.load(f)["records"]}
+
+    def words(self, lang: str) -> list[str]:
+        single = "ru_extract" if lang == "ru" else "en_definition"
+        return [word for kind, word in self.records if kind == f"{lang}_wikitext" and (single, word) in self.records]
+
+    async def get_json(self, url: str):
+        parts = urlsplit(url)
+        lang = parts.hostname.split(".", 1)[0]
+        if parts.path.startswith("/api/rest_v1/page/definition/"):
+            response = self.records.get(("en_definition", unquote_plus(parts.path.rsplit("/", 1)[1])))
+            return (200, response) if response is not None else (404, None)
+        query = parse_qs(parts.query)
+        titles = query["titles"][0].split("|")
+        if query["prop"] == ["extracts"]:
+            response = self.records.get(("ru_extract", titles[0]))
+            return 200, response or {"query": {"pages": {"-1": {"title": titles[0], "missing": ""}}}}
+        pages = [
+            self.records[(f"{lang}_wikitext", title)]["query"]["pages"][0]
+            if (f"{lang}_wikitext", title) in self.records else {"title": title, "missing": True}
+            for title in titles
+        ]
+        return 200, {"batchcomplete": True, "query": {"pages": pages}}
+
+
+class BatchMatchesSingleLookupTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        definitions.DEFINITION_CACHE.clear()
+        definitions._inflight_definitions.clear()
+        self.wiktionary = FixtureWiktionary(PAIRS)
+        self.saved: dict[str, tuple[list[str], bool]] = {}
+
+        async def no_local(lang, words):
+            return {}
+
+        async def save(lang, fetched):
+            self.saved.update(fetched)
+
+        for target, replacement in (
+            ("_http_get_json", self.wiktionary.get_json),
+            ("_load_local_definitions", no_local),
+            ("_save_fetched_definitions", save),
+        ):
+            patcher = mock.patch.object(definitions, target, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_wikitext_batch_agrees_with_single_lookup(self):
+        for lang in ("ru", "en"):
+            for word in self.wiktionary.words(lang):
+                with self.subTest(word=word):
+                    normalized = word.lower()
+                    single, _, _ = await definitions._fetch_definitions_upstream(normalized, lang)
+                    batch = await definitions.fetch_definitions_batch([word], lang)
+                    self.assertTrue(single)
+                    self.assertEqual(batch[normalized], single)
+                    # Непустую страницу нельзя запомнить как «определения нет»
+                    self.assertEqual(self.saved[normalized][0], single)
+
+
+if __name__ == "__main__":
+    unittest.main()
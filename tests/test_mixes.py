@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app import data_manager, dict_registry, mixes
+from app.mixes import Mix
+from app.word_filter import make_filter
+
+USER_ID = 42
+
+
+class MixWithFilterTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        folder = tempfile.mkdtemp(prefix="alias-mix-")
+        with open(os.path.join(folder, "short.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(["кот", "дом", "лес", "мир"]))
+        with open(os.path.join(folder, "long.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(["велосипед", "территория", "библиотека"]))
+
+        for module in (data_manager, dict_registry):
+            patcher = mock.patch.object(module, "DICT_PATH", folder)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for patcher in (
+            mock.patch.object(data_manager, "DICT_INDEX_PATH", os.path.join(folder, "index")),
+            mock.patch.object(data_manager, "WORD_DRAW_MODE", "deck"),
+            mock.patch.object(data_manager, "save_user", lambda user_id: None),
+            mock.patch.dict(dict_registry._info, clear=True),
+            mock.patch.object(dict_registry, "_listing", []),
+            mock.patch.object(dict_registry, "_scanned", False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        data_manager.clear_cache()
+        self.addCleanup(data_manager.clear_cache)
+
+        # Короткий словарь весит больше, но фильтр «9+ букв» оставляет слова только в длинном
+        self.mix = Mix("test", ["short.txt", "long.txt"], [0.9, 0.1])
+        patcher = mock.patch.object(data_manager, "get_mix", lambda selection: self.mix)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for field in (data_manager.user_deck, data_manager.user_word_filter):
+            self.addCleanup(field.pop, USER_ID, None)
+        data_manager.user_word_filter[USER_ID] = make_filter(9, 0, False)
+
+    async def test_filter_skips_emptied_member(self):
+        peeked = await data_manager.peek_next_words(USER_ID, "mix:test", 6)
+        drawn = [await data_manager.draw_word(USER_ID, "mix:test") for _ in range(6)]
+
+        self.assertEqual(drawn, peeked)
+        self.assertTrue(all(len(word) >= 9 for word in drawn))
+        deck = data_manager.user_deck[USER_ID]
+        # Все вытягивания пришлись на длинный словарь, счётчик короткого не сдвинулся
+        self.assertEqual(deck[1:], [6, 0, 6])
+
+    async def test_filter_emptying_every_member(self):
+        data_manager.user_word_filter[USER_ID] = make_filter(20, 0, False)
+        self.assertIsNone(await data_manager.draw_word(USER_ID, "mix:test"))
+
+
+class MixAppendTest(unittest.TestCase):
+    def setUp(self):
+        self.mix = Mix("test", ["empty.txt", "full.txt"], [0.5, 0.5])
+        for patcher in (
+            mock.patch.dict(mixes._mixes, {self.mix.name: self.mix}, clear=True),
+            mock.patch.dict(dict_registry._info, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        dict_registry._info["empty.txt"] = dict_registry.DictionaryInfo("empty.txt", 0, 1)
+        dict_registry._info["full.txt"] = dict_registry.DictionaryInfo("full.txt", 100, 1)
+
+    def test_append_to_empty_member_rebuilds_weights(self):
+        self.assertEqual([self.mix.table().sample(u) for u in (0.1, 0.6, 0.9)], [1, 1, 1])
+
+        stat = mock.Mock(st_size=20, st_mtime_ns=2)
+        dict_registry.record_append("empty.txt", stat, 3)
+
+        self.assertIsNone(self.mix._table)
+        self.assertIn(0, [self.mix.table().sample(u / 10) for u in range(10)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import unittest
+
+from app import wiktionary
+from app.offline_index import _parse_batch
+from benchmarks.parser import FIXTURES, check, load_corpus
+
+PAIRS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "wiktionary_pairs.json")
+
+
+class ParserMatchesReferenceTest(unittest.TestCase):
+    def test_fixtures_parse_like_the_frozen_reference(self):
+        self.assertEqual(check(load_corpus(FIXTURES)), [])
+
+
+class WikitextMatchesExtractTest(unittest.TestCase):
+    def setUp(self):
+        self.payloads = {(kind, word): payload for kind, word, payload in load_corpus(PAIRS)}
+
+    def test_templates_render_like_the_html_answer(self):
+        for lang, single_kind, single_parse in (
+            ("ru", "ru_extract", wiktionary._extract_ru_definitions),
+            ("en", "en_definition", wiktionary._extract_en_definitions),
+        ):
+            parse = wiktionary.ru_definitions_from_wikitext if lang == "ru" else wiktionary.en_definitions_from_wikitext
+            for (kind, word), payload in self.payloads.items():
+                if kind != f"{lang}_wikitext" or word == "кот":
+                    continue
+                with self.subTest(word=word):
+                    expected = single_parse(self.payloads[(single_kind, word)], word.lower())
+                    self.assertTrue(expected)
+                    self.assertEqual(parse(payload, word.lower(), strict=True), expected)
+
+    def test_offline_index_skips_page_with_unrendered_definition(self):
+        # Вторая строка «кот» — шаблон, который мы не раскрываем: без strict она бы тихо пропала
+        page = self.payloads[("ru_wikitext", "кот")]
+        self.assertEqual(wiktionary.ru_definitions_from_wikitext(page, "кот"), ["домашнее животное"])
+        self.assertEqual(_parse_batch("ru", [("кот", "text", page)]), [])
+        self.assertEqual(_parse_batch("ru", [("пёс", "text", self.payloads[("ru_wikitext", "пёс")])]),
+                         [("пёс", True, ["то же, что собака"])])
+
+
+if __name__ == "__main__":
+    unittest.main()
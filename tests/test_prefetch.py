@@ -0,0 +1,24 @@
+import unittest
+from unittest import mock
+
+from app import prefetch
+
+
+class RequestPaceTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(prefetch, "_request_pace", prefetch.OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_idle_users_are_forgotten(self):
+        with mock.patch.object(prefetch.time, "monotonic", return_value=1000.0):
+            for user_id in range(100):
+                prefetch.record_word_request(user_id)
+        with mock.patch.object(prefetch.time, "monotonic", return_value=1000.0 + prefetch._PACE_WINDOW + 1):
+            prefetch.record_word_request(7)
+
+        self.assertEqual(list(prefetch._request_pace), [7])
+
+
+if __name__ == "__main__":
+    unittest.main()
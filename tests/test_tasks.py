@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+
+from app.tasks import BackgroundScheduler
+
+
+class StaleEditTest(unittest.IsolatedAsyncioTestCase):
+    async def test_running_jobs_skip_effect_once_superseded(self):
+        scheduler = BackgroundScheduler("test", workers=4, max_queue=10)
+        scheduler.start()
+        self.addAsyncCleanup(scheduler.stop)
+        edited = []
+
+        async def job(number, is_current):
+            # Долгий общий запрос определения: его не отменяем, но правку пропускаем
+            await asyncio.sleep(0.2)
+            if is_current():
+                edited.append(number)
+
+        def submit(number):
+            # Как в handle_random_word: поколение запоминается при постановке в очередь
+            generation = scheduler.submit("chat", lambda: job(number, lambda: scheduler.is_current("chat", generation)))
+
+        for number in range(5):
+            submit(number)
+            await asyncio.sleep(0.03)
+        await asyncio.sleep(0.3)
+
+        self.assertEqual(edited, [4])
+        self.assertEqual(scheduler.stats["completed"], 5)
+
+    async def test_supersede_without_new_job(self):
+        scheduler = BackgroundScheduler("test", workers=1, max_queue=10)
+        generation = scheduler.submit("chat", asyncio.sleep)
+        scheduler.supersede("chat")
+        self.assertFalse(scheduler.is_current("chat", generation))
+
+    async def test_rejected_submit_keeps_queued_job_current(self):
+        scheduler = BackgroundScheduler("test", workers=1, max_queue=1)
+        queued = scheduler.submit("chat", lambda: asyncio.sleep(0))
+        self.assertEqual(scheduler.submit("chat", lambda: asyncio.sleep(0)), 0)
+        self.assertTrue(scheduler.is_current("chat", queued))
+
+        other = BackgroundScheduler("test", workers=1, max_queue=1)
+        other.submit("a", lambda: asyncio.sleep(0))
+        self.assertEqual(other.submit("b", lambda: asyncio.sleep(0)), 0)
+        self.assertNotIn("b", other._generations)
+
+
+if __name__ == "__main__":
+    unittest.main()
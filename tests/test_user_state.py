@@ -0,0 +1,75 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app import data_manager
+from app.storage import SQLiteUserStateBackend
+
+HOME_USER = 10   # 10 % 2 == 0 — домашний воркер 0
+GUEST_USER = 11  # домашний воркер 1, в группе попал на воркер 0
+
+
+class ForeignUserStateTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        folder = tempfile.mkdtemp(prefix="alias-state-")
+        self.backend = SQLiteUserStateBackend(os.path.join(folder, "state.db"))
+        self.addCleanup(self.backend.close)
+        # Этот процесс — воркер 0 из двух
+        for patcher in (
+            mock.patch.object(data_manager, "_state_backend", self.backend),
+            mock.patch.object(data_manager, "WORKER_INDEX", 0),
+            mock.patch.object(data_manager, "BOT_WORKERS", 2),
+            mock.patch.object(data_manager, "USER_STATE_TTL", 0.05),
+            mock.patch.object(data_manager, "STATE_FLUSH_INTERVAL", 0.01),
+            mock.patch.object(data_manager, "_state_loaded_at", data_manager.OrderedDict()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for user_id in (HOME_USER, GUEST_USER):
+            self.addCleanup(data_manager._apply_user_state, user_id, {})
+        self.backend.write_users({HOME_USER: {"language": "ru"}, GUEST_USER: {"language": "en"}})
+
+    async def test_preloads_only_own_users(self):
+        data_manager.load_data()
+        self.assertEqual(data_manager.user_language.get(HOME_USER), "ru")
+        self.assertNotIn(GUEST_USER, data_manager.user_language)
+
+    async def test_guest_changes_are_read_and_written_through_backend(self):
+        await data_manager.refresh_user_state(GUEST_USER)
+        self.assertEqual(data_manager.user_language[GUEST_USER], "en")
+
+        data_manager.user_language[GUEST_USER] = "ru"
+        data_manager.save_user(GUEST_USER)
+        await asyncio.sleep(0.05)
+        await data_manager.save_data()
+        self.assertEqual(self.backend.load_user(GUEST_USER), {"language": "ru"})
+
+        # Домашний воркер гостя поменял настройку — после TTL её видно и здесь
+        self.backend.write_users({GUEST_USER: {"language": "en", "word_filter": [3, 5, False]}})
+        await asyncio.sleep(0.06)
+        await data_manager.refresh_user_state(GUEST_USER)
+        self.assertEqual(data_manager.user_language[GUEST_USER], "en")
+        self.assertEqual(data_manager.user_word_filter[GUEST_USER], [3, 5, False])
+
+    async def test_unsaved_changes_are_not_overwritten(self):
+        await data_manager.refresh_user_state(GUEST_USER)
+        data_manager.user_language[GUEST_USER] = "ru"
+        data_manager._dirty_users.add(GUEST_USER)
+        self.addCleanup(data_manager._dirty_users.discard, GUEST_USER)
+        await asyncio.sleep(0.06)
+        await data_manager.refresh_user_state(GUEST_USER)
+        self.assertEqual(data_manager.user_language[GUEST_USER], "ru")
+
+    async def test_idle_guests_are_unloaded(self):
+        await data_manager.refresh_user_state(GUEST_USER)
+        await data_manager.refresh_user_state(HOME_USER)
+        with mock.patch.object(data_manager, "IDLE_USER_EVICTION", 0.0):
+            data_manager._evict_idle_users(float("inf"))
+        self.assertNotIn(GUEST_USER, data_manager.user_language)
+        self.assertEqual(data_manager.user_language[HOME_USER], "ru")
+
+
+if __name__ == "__main__":
+    unittest.main()